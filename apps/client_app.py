@@ -8,13 +8,117 @@ Aug 2021
 
 Client Application Module
 """
-
+from concurrent.futures import Future
+from itertools import count
 from multiprocessing.connection import Client
-from threading import Thread
+from threading import Lock, Thread
 
+from apps.protocols import FramedProtocol
+from server.commands.splitters import BatchSplitterCommand
+from apps.transports import Transport
 from core import settings
 
 
+class PipelinedClient:
+    """
+    Client that keeps several commands in flight on the same connection using framed requests.
+    """
+
+    def __init__(self, address=('127.0.0.1', 8777), authkey=None, transport=Transport.PICKLE):
+        self._connection = transport.new_client(address, authkey=authkey or settings.AUTH_KEY.encode())
+        self._ids = count(1)
+        self._lock = Lock()
+        self._send_lock = Lock()
+        self._pending = {}
+        self._partials = {}
+        self._closed = False
+        self._reader = Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def closed(self):
+        """
+        Check if the connection was lost.
+        :return: Bool.
+        """
+        return self._closed
+
+    def submit(self, command, on_partial=None):
+        """
+        Send a command without waiting for its result.
+        :param command: Command data ('token||Command||args').
+        :param on_partial: Callable receiving (index, result) of each finished sub-command of a batch (optional).
+        :return: Future with the command result.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise ConnectionError('Connection closed.')
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            if on_partial:
+                self._partials[request_id] = on_partial
+        try:
+            with self._send_lock:
+                self._connection.send(FramedProtocol.request(request_id, command, stream=on_partial is not None))
+        except Exception:
+            with self._lock:
+                self._pending.pop(request_id, None)
+                self._partials.pop(request_id, None)
+            raise
+        return future
+
+    def submit_batch(self, token, commands, on_partial=None):
+        """
+        Send several commands of the same token in one request.
+        :param token: Token string.
+        :param commands: List of commands without the token ('Command||args').
+        :param on_partial: Callable receiving (index, result) as each command finishes (optional).
+        :return: Future with the list of results.
+        """
+        return self.submit(BatchSplitterCommand.join(token, commands), on_partial=on_partial)
+
+    def _read(self):
+        """
+        Resolve the pending Futures as the responses arrive.
+        :return: None.
+        """
+        try:
+            while True:
+                response = self._connection.recv()
+                if FramedProtocol.is_partial(response):
+                    with self._lock:
+                        on_partial = self._partials.get(response[FramedProtocol.ID])
+                    if on_partial:
+                        on_partial(response[FramedProtocol.INDEX], response[FramedProtocol.RESULT])
+                    continue
+                with self._lock:
+                    future = self._pending.pop(response[FramedProtocol.ID], None)
+                    self._partials.pop(response[FramedProtocol.ID], None)
+                if future:
+                    future.set_result(response[FramedProtocol.RESULT])
+        except (EOFError, OSError) as e:
+            with self._lock:
+                self._closed = True
+                pending, self._pending = list(self._pending.values()), {}
+            for future in pending:
+                future.set_exception(ConnectionError(str(e) or 'Connection closed.'))
+
+    def close(self):
+        """
+        Close the connection.
+        :return: None.
+        """
+        self._closed = True
+        self._connection.close()
+
+
 def connect_to_server():
     """
     Method to connect to server.
@@ -43,6 +147,27 @@ def connect_to_server():
         print(f'Operation canceled: {str(e)}.')
 
 
+def connect_to_server_pipelined():
+    """
+    Method to connect to server sending all commands at once.
+    :return:
+    """
+    commands = [
+        'user_token||SendMessage||My Group or Person||My Message!',
+        'other_token||SendMessage||My Group or Person||My Message!',
+        # 'user_token||IsConnected',
+    ]
+    try:
+        with PipelinedClient() as c:
+            futures = [c.submit(command) for command in commands]
+            for future in futures:
+                print(f'Response: {future.result()}')
+    except ConnectionRefusedError:
+        print('Operation Canceled: Server refused connection.')
+    except ConnectionError as e:
+        print(f'Operation canceled: {str(e)}.')
+
+
 if __name__ == '__main__':
     t = Thread(target=connect_to_server)
     t.start()
@@ -0,0 +1,121 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Request Protocol Module
+
+Plain requests are strings ('token||Command||args') answered in the same order they were sent.
+Framed requests are dicts carrying a correlation ID; they are answered as soon as the command is done, so several
+commands can be in flight in the same connection:
+
+request:  {'id': 1, 'command': 'token||Command||args'}
+response: {'id': 1, 'result': <command result>}
+
+A framed batch request may ask for its partial results, sent as each sub-command finishes and before the response
+with the list of results:
+
+request:  {'id': 2, 'command': 'token||Batch<RS>Command||args<RS>Command||args', 'stream': True}
+partial:  {'id': 2, 'index': 0, 'result': <sub-command result>}
+
+The command "Ping", without a token, is answered "Pong" by the server itself, without opening a session. It is the
+health check of the router.
+"""
+from concurrent.futures import Future
+
+
+class FramedProtocol:
+    """
+    Helpers to build and recognize framed messages.
+    """
+    ID = 'id'
+    COMMAND = 'command'
+    RESULT = 'result'
+    STREAM = 'stream'
+    INDEX = 'index'
+    PING = 'Ping'
+    PONG = 'Pong'
+
+    @classmethod
+    def is_ping(cls, command_data):
+        """
+        Check if the command is the health check, answered without a session.
+        :param command_data: Command data.
+        :return: Bool.
+        """
+        return command_data == cls.PING
+
+    @classmethod
+    def is_request(cls, message):
+        """
+        Check if the message is a framed request.
+        :param message: Received message.
+        :return: Bool.
+        """
+        return isinstance(message, dict) and cls.ID in message and cls.COMMAND in message
+
+    @classmethod
+    def is_partial(cls, message):
+        """
+        Check if the message is a partial result of a batch.
+        :param message: Received message.
+        :return: Bool.
+        """
+        return isinstance(message, dict) and cls.INDEX in message
+
+    @classmethod
+    def request(cls, request_id, command, stream=False):
+        """
+        Build a framed request.
+        :param request_id: Correlation ID.
+        :param command: Command data ('token||Command||args').
+        :param stream: Ask for the partial results of a batch.
+        :return: Dict.
+        """
+        request = {cls.ID: request_id, cls.COMMAND: command}
+        if stream:
+            request[cls.STREAM] = True
+        return request
+
+    @classmethod
+    def partial(cls, request_id, index, result):
+        """
+        Build a partial result of a batch.
+        :param request_id: Correlation ID.
+        :param index: Position of the sub-command in the batch.
+        :param result: Sub-command result.
+        :return: Dict.
+        """
+        return {cls.ID: request_id, cls.INDEX: index, cls.RESULT: result}
+
+    @classmethod
+    def response(cls, request_id, result):
+        """
+        Build a framed response.
+        :param request_id: Correlation ID.
+        :param result: Command result.
+        :return: Dict.
+        """
+        return {cls.ID: request_id, cls.RESULT: result}
+
+    @classmethod
+    def wrap(cls, request_id, future):
+        """
+        Turn the Future of a command result into the Future of its framed response.
+        :param request_id: Correlation ID.
+        :param future: Future of the command result.
+        :return: Future.
+        """
+        response = Future()
+
+        def done(result):
+            try:
+                response.set_result(cls.response(request_id, result.result()))
+            except Exception as e:
+                response.set_result(cls.response(request_id, str(e)))
+
+        future.add_done_callback(done)
+        return response
@@ -0,0 +1,250 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Zap Router Application Module
+"""
+from concurrent.futures import Future, wait
+from functools import partial
+from threading import Event, Lock, Thread
+
+from apps.client_app import PipelinedClient
+from apps.exceptions import ParserCommandException
+from apps.protocols import FramedProtocol
+from apps.transports import Transport
+from apps.zap_server_app import ZapServerApp
+from core import settings
+from core.utils.hashing import ConsistentHashRing
+from server.commands.splitters import SplitterCommand
+
+
+class BackendNode:
+    """
+    Zap Server node that receives the commands forwarded by the router.
+    """
+
+    def __init__(self, address, authkey, transport=Transport.PICKLE):
+        """
+        :param address: Tuple (host, port).
+        :param authkey: Bytes.
+        :param transport: Transport of the node.
+        """
+        self.address = address
+        self.name = f'{address[0]}:{address[1]}'
+        self._authkey = authkey
+        self._transport = transport
+        self._lock = Lock()
+        self._client = None
+
+    @classmethod
+    def parse(cls, value, authkey, transport=Transport.PICKLE):
+        """
+        Create a node from "host:port" or "transport://host:port".
+        :param value: Str.
+        :param authkey: Bytes.
+        :param transport: Transport of the node when the value does not inform it.
+        :return: BackendNode.
+        """
+        scheme, _, value = value.strip().rpartition('://')
+        host, _, port = value.rpartition(':')
+        return cls(address=(host or '127.0.0.1', int(port)), authkey=authkey,
+                   transport=Transport(scheme) if scheme else transport)
+
+    def _get_client(self):
+        """
+        Get the connection to the node, connecting again when it was lost.
+        :return: PipelinedClient.
+        """
+        with self._lock:
+            if self._client is None or self._client.closed:
+                self._client = PipelinedClient(address=self.address, authkey=self._authkey, transport=self._transport)
+            return self._client
+
+    def submit(self, command_data, on_partial=None):
+        """
+        Forward a command to the node.
+        :param command_data: Command Data.
+        :param on_partial: Callable receiving (index, result) of each finished sub-command of a batch (optional).
+        :return: Future with the command result.
+        """
+        return self._get_client().submit(command_data, on_partial=on_partial)
+
+    def check(self, timeout):
+        """
+        Check if the node answers a "Ping", which does not open a session.
+        :param timeout: Seconds to wait for the answer.
+        :return: Bool.
+        """
+        try:
+            self.submit(FramedProtocol.PING).result(timeout=timeout)
+            return True
+        except Exception:
+            self.close()
+            return False
+
+    def close(self):
+        """
+        Close the connection to the node.
+        :return: Self.
+        """
+        with self._lock:
+            client, self._client = self._client, None
+        if client:
+            client.close()
+        return self
+
+    def __str__(self):
+        return self.name
+
+
+class ZapRouterApp(ZapServerApp):
+    """
+    Server that forwards each command to the Zap Server node that owns the token session.
+    Tokens are mapped to the nodes by consistent hashing, so a node that joins or leaves the ring only moves the
+    sessions of its own arcs.
+    """
+
+    def __init__(self, address, authkey, backends, replicas=settings.ROUTER_REPLICAS,
+                 health_interval=settings.ROUTER_HEALTH_INTERVAL, health_timeout=settings.ROUTER_HEALTH_TIMEOUT,
+                 backend_transport=None, **kwargs):
+        """
+        :param address: Tuple (host, port) of the router.
+        :param authkey: Bytes used by the clients and by the nodes.
+        :param backends: List of "host:port" (or "transport://host:port") of the nodes.
+        :param replicas: Virtual points of each node in the ring.
+        :param health_interval: Seconds between health checks.
+        :param health_timeout: Seconds to wait for a node to answer the health check.
+        :param backend_transport: Transport of the nodes (default: the transport of the router).
+        :param kwargs: ZapServerApp arguments.
+        """
+        backend_transport = backend_transport or kwargs.get('transport', Transport(settings.SERVER_TRANSPORT))
+        self._nodes = {node.name: node for node in (
+            BackendNode.parse(value, authkey, backend_transport) for value in backends)}
+        self._ring = ConsistentHashRing(self._nodes, replicas=replicas)
+        self._health_interval = health_interval
+        self._health_timeout = health_timeout
+        self._stopped = Event()
+        self._health = None
+        self._checks = {}
+        super().__init__(address, authkey, **kwargs)
+
+    @property
+    def ring(self):
+        """
+        Nodes that are receiving commands.
+        :return: ConsistentHashRing.
+        """
+        return self._ring
+
+    def _start_sessions(self, adapter, no_headless, processes, sessions_per_process):
+        """
+        The sessions live in the nodes: start the health check instead.
+        :return: Self.
+        """
+        self._con.show(f'Routing to the nodes: {", ".join(self._nodes)}.')
+        self._health = Thread(target=self._check_nodes, name='zap-router-health', daemon=True)
+        self._health.start()
+        return self
+
+    def _close_sessions(self):
+        """
+        Stop the health check and disconnect from the nodes.
+        :return: Self.
+        """
+        self._stopped.set()
+        for node in self._nodes.values():
+            node.close()
+        return self
+
+    def _start_check(self, node):
+        """
+        Check a node in its own thread, so a node that hangs does not delay the others.
+        :param node: BackendNode.
+        :return: Future with the health of the node.
+        """
+        future = Future()
+        Thread(target=lambda: future.set_result(node.check(timeout=self._health_timeout)),
+               name=f'zap-router-health-{node}', daemon=True).start()
+        return future
+
+    def check_round(self):
+        """
+        Check every node at once and wait for them up to the health timeout. A node whose previous check is still
+        running is not checked again and counts as not answering.
+        :return: Dict {node name: bool}.
+        """
+        checks = {}
+        for node in list(self._nodes.values()):
+            check = self._checks.get(node.name)
+            if check is None or check.done():
+                check = self._checks[node.name] = self._start_check(node)
+            checks[node.name] = check
+        wait(list(checks.values()), timeout=self._health_timeout)
+        return {name: check.done() and check.result() for name, check in checks.items()}
+
+    def _check_nodes(self):
+        """
+        Take the nodes that stop answering out of the ring and put them back when they recover.
+        :return: None.
+        """
+        while not self._stopped.is_set():
+            health = self.check_round()
+            for node in [self._nodes[name] for name in health]:
+                healthy = health[node.name]
+                if healthy and node.name not in self._ring:
+                    self._con.show(f'Node {node} is back.')
+                    self._ring.add(node.name)
+                elif not healthy and node.name in self._ring:
+                    self._con.show(f'Node {node} is not answering.')
+                    self._ring.remove(node.name)
+            self._stopped.wait(self._health_interval)
+
+    def _forward(self, command_data, on_item=None):
+        """
+        Send the command to the node that owns its token.
+        :param command_data: Command Data.
+        :param on_item: Callable receiving (index, result) as each sub-command of a batch finishes (optional).
+        :return: Future with the command result.
+        """
+        future = Future()
+        if FramedProtocol.is_ping(command_data):
+            future.set_result(FramedProtocol.PONG)
+            return future
+        try:
+            token, _, _ = SplitterCommand(command_data).process().result()
+        except ParserCommandException as e:
+            future.set_result(e.message)
+            return future
+        name = self._ring.get(token)
+        while name:
+            try:
+                return self._nodes[name].submit(command_data, on_partial=on_item)
+            except (ConnectionError, EOFError, OSError) as e:
+                self._con.show(f'Node {name} is not answering: {e}')
+                self._nodes[name].close()
+                self._ring.remove(name)
+                name = self._ring.get(token)
+        future.set_result('Router Error: No Zap Server node is available.')
+        return future
+
+    def worker(self, client, command):
+        """
+        Forward a command received from a client.
+        :param client: Client connection.
+        :param command: Command data or framed request.
+        :return: Command result, or a Future of the framed response.
+        """
+        if FramedProtocol.is_request(command):
+            request_id = command[FramedProtocol.ID]
+            on_item = partial(self._send_partial, client, request_id) if command.get(FramedProtocol.STREAM) else None
+            return FramedProtocol.wrap(request_id, self._forward(command[FramedProtocol.COMMAND], on_item))
+        if FramedProtocol.is_ping(command):
+            return FramedProtocol.PONG
+        try:
+            return self._forward(command).result()
+        except Exception as e:
+            return str(e)
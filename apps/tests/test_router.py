@@ -0,0 +1,160 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Router Module
+"""
+import socket
+from threading import Thread
+from time import monotonic
+
+import pytest
+
+from apps.client_app import PipelinedClient
+from apps.protocols import FramedProtocol
+from apps.router_app import BackendNode, ZapRouterApp
+from apps.transports import Transport
+from apps.zap_server_app import ZapServerApp
+from core import settings
+from core.utils.hashing import ConsistentHashRing
+from server.factories.whatsapp import FactoryWhatsappAdapter
+from server.managers import ManagerSingleton
+
+
+def start(server):
+    """
+    Run a server in a thread.
+    :param server: ZapServerApp instance.
+    :return: Thread.
+    """
+    thread = Thread(target=server.execute, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def mock_cluster():
+    """
+    Start two mock Zap Server nodes and a router in front of them.
+    :return: Tuple (router, nodes).
+    """
+    authkey = settings.AUTH_KEY.encode()
+    nodes = [
+        ZapServerApp(address=('127.0.0.1', 0), authkey=authkey, adapter=FactoryWhatsappAdapter.MOCK, drain_timeout=5.0)
+        for _ in range(2)
+    ]
+    threads = [start(node) for node in nodes]
+    router = ZapRouterApp(
+        address=('127.0.0.1', 0), authkey=authkey, backends=[f'{host}:{port}' for host, port in
+                                                             (node.address for node in nodes)],
+        health_interval=60.0, health_timeout=5.0, drain_timeout=5.0)
+    threads.append(start(router))
+    yield router, nodes
+    for server, thread in zip(nodes + [router], threads):
+        server.stop()
+        thread.join(timeout=10.0)
+
+
+def test_ring_moves_only_the_keys_of_the_new_node():
+    """
+    Adding a node only moves keys to that node.
+    :return: None.
+    """
+    ring = ConsistentHashRing(['node_a', 'node_b', 'node_c'])
+    keys = [f'token_{index}' for index in range(2000)]
+    before = {key: ring.get(key) for key in keys}
+    ring.add('node_d')
+    moved = [key for key in keys if ring.get(key) != before[key]]
+    assert all(ring.get(key) == 'node_d' for key in moved)
+    assert 0 < len(moved) < len(keys) * 0.4
+    ring.remove('node_d')
+    assert all(ring.get(key) == before[key] for key in keys)
+
+
+def test_router_forwards_and_fails_over(mock_cluster):
+    """
+    Commands reach the nodes and tokens of a node that stopped are moved to the remaining one.
+    :param mock_cluster: Cluster fixture.
+    :return: None.
+    """
+    router, nodes = mock_cluster
+    tokens = [f'test_router_{index}' for index in range(8)]
+    with PipelinedClient(address=router.address) as client:
+        futures = [client.submit(f'{token}||GroupParticipants||Group') for token in tokens]
+        assert all(isinstance(future.result(timeout=10), list) for future in futures)
+
+        nodes[0].stop()
+        # The first batch may see the node going away, the next one must be served by the remaining node.
+        futures = [client.submit(f'{token}||GroupParticipants||Group') for token in tokens]
+        results = [future.result(timeout=10) for future in futures]
+        futures = [client.submit(f'{token}||GroupParticipants||Group') for token in tokens]
+        assert all(isinstance(future.result(timeout=10), list) for future in futures)
+    host, port = nodes[1].address
+    assert router.ring.nodes == {f'{host}:{port}'}
+    assert len(results) == len(tokens)
+
+
+def test_router_talks_to_a_binary_node():
+    """
+    A node started with the binary transport is reached by a router using the pickle transport.
+    :return: None.
+    """
+    authkey = settings.AUTH_KEY.encode()
+    assert BackendNode.parse('binary://10.0.0.1:8001', authkey)._transport == Transport.BINARY
+    assert BackendNode.parse('10.0.0.1:8001', authkey, Transport.BINARY)._transport == Transport.BINARY
+    node = ZapServerApp(address=('127.0.0.1', 0), authkey=authkey, adapter=FactoryWhatsappAdapter.MOCK,
+                        drain_timeout=5.0, transport=Transport.BINARY)
+    host, port = node.address
+    router = ZapRouterApp(address=('127.0.0.1', 0), authkey=authkey, backends=[f'binary://{host}:{port}'],
+                          health_interval=60.0, health_timeout=5.0, drain_timeout=5.0, transport=Transport.PICKLE)
+    threads = [start(node), start(router)]
+    try:
+        with PipelinedClient(address=router.address) as client:
+            assert isinstance(client.submit('test_router_binary||GroupParticipants||Group').result(timeout=10), list)
+    finally:
+        for server, thread in zip([node, router], threads):
+            server.stop()
+            thread.join(timeout=10.0)
+
+
+def test_health_check_is_parallel_and_opens_no_session(mock_cluster):
+    """
+    The nodes answer "Ping" without a session and a node that never answers does not delay the others.
+    :param mock_cluster: Cluster fixture.
+    :return: None.
+    """
+    router, nodes = mock_cluster
+    with PipelinedClient(address=nodes[0].address) as client:
+        assert client.submit(FramedProtocol.PING).result(timeout=5) == FramedProtocol.PONG
+    silent = socket.create_server(('127.0.0.1', 0))
+    try:
+        host, port = silent.getsockname()
+        router._nodes[f'{host}:{port}'] = BackendNode((host, port), settings.AUTH_KEY.encode())
+        router._health_timeout = 1.0
+        started = monotonic()
+        health = router.check_round()
+        assert monotonic() - started < 3.0
+        assert health.pop(f'{host}:{port}') is False and all(health.values())
+    finally:
+        silent.close()
+    assert not any(token == settings.ROUTER_HEALTH_TOKEN for token in ManagerSingleton()._actors)
+
+
+def test_router_streams_partial_results(mock_cluster):
+    """
+    The partial results of a batch sent by the node reach the client of the router.
+    :param mock_cluster: Cluster fixture.
+    :return: None.
+    """
+    router, _ = mock_cluster
+    partials = []
+    with PipelinedClient(address=router.address) as client:
+        future = client.submit_batch('test_router_batch', ['CheckPoint', 'GroupParticipants||Group'],
+                                     on_partial=lambda *item: partials.append(item))
+        results = future.result(timeout=20)
+    assert results[0] == 'true' and isinstance(results[1], list)
+    assert partials == list(enumerate(results))
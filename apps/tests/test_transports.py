@@ -0,0 +1,120 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Transports Module
+"""
+import base64
+import json
+import socket
+from threading import Thread
+from time import monotonic, sleep
+
+import pytest
+
+from apps.client_app import PipelinedClient
+from apps.transports import BinaryCodec, CompactResult, Transport, authenticate
+from apps.zap_server_app import ZapServerApp
+from core import settings
+from server.factories.whatsapp import FactoryWhatsappAdapter
+
+
+@pytest.fixture
+def binary_server():
+    """
+    Start a mock Zap Server with the binary transport.
+    :return: ZapServerApp instance.
+    """
+    server = ZapServerApp(
+        address=('127.0.0.1', 0), authkey=settings.AUTH_KEY.encode(), adapter=FactoryWhatsappAdapter.MOCK,
+        drain_timeout=5.0, transport=Transport.BINARY)
+    thread = Thread(target=server.execute, daemon=True)
+    thread.start()
+    yield server
+    server.stop()
+    thread.join(timeout=10.0)
+
+
+def join(buffers):
+    """
+    Join the encoded buffers.
+    :param buffers: List of buffers.
+    :return: Bytes.
+    """
+    return b''.join(bytes(buffer) for buffer in buffers)
+
+
+def test_codec_round_trip():
+    """
+    Every supported type is decoded back to the same value.
+    :return: None.
+    """
+    value = {
+        'id': 7, 'big': 2 ** 70, 'negative': -3, 'ratio': 0.5, 'ok': True, 'no': False, 'none': None,
+        'text': 'Olá', 'blob': b'\x00\xff' * 10000, 'items': ['a', 1, [2, 3]],
+    }
+    assert BinaryCodec.decode(join(BinaryCodec.encode(value))) == value
+    assert BinaryCodec.decode(join(BinaryCodec.encode(('a', 'b')))) == ['a', 'b']
+
+
+def test_qr_code_images_are_sent_raw():
+    """
+    The base64 image of a QR Code result becomes raw bytes, other results are kept.
+    :return: None.
+    """
+    png = b'\x89PNG raw image'
+    result = json.dumps({'file_name': 'qrcode.png', 'image': base64.b64encode(png).decode()})
+    assert CompactResult.compact({'id': 1, 'result': result}) == {
+        'id': 1, 'result': {'file_name': 'qrcode.png', 'image': png}}
+    assert CompactResult.compact('true') == 'true'
+
+
+def test_binary_transport(binary_server):
+    """
+    Plain and framed requests work over the binary transport.
+    :param binary_server: Server fixture.
+    :return: None.
+    """
+    connection = Transport.BINARY.new_client(binary_server.address, authkey=settings.AUTH_KEY.encode())
+    connection.send('test_binary||GroupParticipants||Group')
+    assert isinstance(connection.recv(), list)
+    connection.close()
+    with PipelinedClient(address=binary_server.address, transport=Transport.BINARY) as client:
+        futures = [client.submit(f'test_binary_{index}||GroupParticipants||Group') for index in range(4)]
+        assert all(isinstance(future.result(timeout=10), list) for future in futures)
+
+
+@pytest.mark.parametrize('transport', list(Transport))
+def test_handshake_gives_up_on_a_silent_client(transport):
+    """
+    A client that never answers the challenge is cut after the timeout; a client that authenticates in time keeps a
+    working connection after the timeout.
+    :param transport: Transport.
+    :return: None.
+    """
+    authkey = settings.AUTH_KEY.encode()
+    listener = transport.new_listener(('127.0.0.1', 0), backlog=2)
+    silent = socket.create_connection(listener.address)
+    connection = listener.accept()
+    started = monotonic()
+    with pytest.raises(TimeoutError):
+        authenticate(connection, authkey, timeout=0.3)
+    assert monotonic() - started < 2.0
+    connection.close()
+    silent.close()
+
+    clients = []
+    thread = Thread(target=lambda: clients.append(transport.new_client(listener.address, authkey)))
+    thread.start()
+    connection = authenticate(listener.accept(), authkey, timeout=0.3)
+    thread.join(timeout=5)
+    sleep(0.5)
+    clients[0].send('ping')
+    assert connection.recv() == 'ping'
+    clients[0].close()
+    connection.close()
+    listener.close()
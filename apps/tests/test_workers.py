@@ -0,0 +1,125 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Server Workers Module
+"""
+import socket
+from multiprocessing.connection import Client
+from threading import Thread
+from time import monotonic
+
+import pytest
+
+from apps.client_app import PipelinedClient
+from apps.zap_server_app import ZapServerApp
+from core import settings
+from server.factories.whatsapp import FactoryWhatsappAdapter
+
+
+@pytest.fixture
+def mock_server():
+    """
+    Start a mock Zap Server on a free port.
+    :return: ZapServerApp instance.
+    """
+    server = ZapServerApp(
+        address=('127.0.0.1', 0), authkey=settings.AUTH_KEY.encode(), adapter=FactoryWhatsappAdapter.MOCK,
+        max_workers=2, max_pending=2, max_connections=8, drain_timeout=5.0, handshake_timeout=1.0)
+    thread = Thread(target=server.execute, daemon=True)
+    thread.start()
+    yield server
+    server.stop()
+    thread.join(timeout=10.0)
+    assert not thread.is_alive()
+
+
+def new_client(server):
+    """
+    Connect a client to the server.
+    :param server: ZapServerApp instance.
+    :return: Connection.
+    """
+    return Client(server.address, authkey=settings.AUTH_KEY.encode())
+
+
+def test_many_idle_clients(mock_server):
+    """
+    Idle connections must not hold worker threads.
+    :param mock_server: Server fixture.
+    :return: None.
+    """
+    clients = [new_client(mock_server) for _ in range(6)]
+    for index, client in enumerate(reversed(clients)):
+        client.send(f'test_workers_{index}||GroupParticipants||Group')
+        assert isinstance(client.recv(), list)
+    for client in clients:
+        client.close()
+
+
+def test_silent_client_does_not_block_the_others(mock_server):
+    """
+    A client that never answers the authkey challenge does not delay the other clients and is dropped.
+    :param mock_server: Server fixture.
+    :return: None.
+    """
+    silent = [socket.create_connection(mock_server.address) for _ in range(2)]
+    started = monotonic()
+    client = new_client(mock_server)
+    client.send('test_workers_silent||GroupParticipants||Group')
+    assert isinstance(client.recv(), list)
+    assert monotonic() - started < 2.0
+    client.close()
+    for sock in silent:
+        sock.settimeout(10.0)
+        sock.recv(4096)
+        assert sock.recv(4096) == b''
+        sock.close()
+
+
+def test_connection_limit(mock_server):
+    """
+    Clients above the limit are disconnected, before or after their authentication.
+    :param mock_server: Server fixture.
+    :return: None.
+    """
+    clients = [new_client(mock_server) for _ in range(8)]
+    with pytest.raises((EOFError, OSError)):
+        extra = new_client(mock_server)
+        extra.send('test_workers||GroupParticipants||Group')
+        extra.recv()
+    for client in clients:
+        client.close()
+
+
+def test_pipelined_requests_answer_out_of_order(mock_server):
+    """
+    A slow command of one token must not delay the commands of other tokens in the same connection.
+    :param mock_server: Server fixture.
+    :return: None.
+    """
+    with PipelinedClient(address=mock_server.address) as client:
+        slow = client.submit('test_pipelined_slow||CheckPoint')
+        fast = client.submit('test_pipelined_fast||GroupParticipants||Group')
+        assert isinstance(fast.result(timeout=10), list)
+        assert not slow.done()
+        assert slow.result(timeout=10) == 'true'
+
+
+def test_batch_streams_partial_results(mock_server):
+    """
+    A batch runs its commands in order and reports each result before the list of results.
+    :param mock_server: Server fixture.
+    :return: None.
+    """
+    partials = []
+    commands = ['GroupParticipants||Group', 'CheckPoint', 'GroupParticipants||Group']
+    with PipelinedClient(address=mock_server.address) as client:
+        future = client.submit_batch('test_batch', commands, on_partial=lambda *item: partials.append(item))
+        results = future.result(timeout=20)
+    assert len(results) == 3 and results[1] == 'true'
+    assert partials == list(enumerate(results))
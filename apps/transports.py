@@ -0,0 +1,426 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Transports Module
+
+PICKLE is the multiprocessing.connection transport: every message is pickled.
+BINARY sends length-prefixed frames encoded with BinaryCodec, a compact tagged layout. Bytes travel raw, without
+base64, and are written straight from their buffers. The QR Code image returned by "GetQrCode" is sent as raw PNG
+bytes: {'file_name': str, 'image': bytes}.
+"""
+import base64
+import json
+import socket
+import struct
+from enum import Enum
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+from threading import Event, Lock, Timer
+
+
+class BinaryCodec:
+    """
+    Tagged binary layout for None, bool, int, float, str, bytes, list/tuple and dict values.
+    """
+    NONE, TRUE, FALSE, INT, BIG_INT, FLOAT, STR, BYTES, LIST, DICT = b'NTFiIdsblm'
+    _INT = struct.Struct('!q')
+    _FLOAT = struct.Struct('!d')
+    _SIZE = struct.Struct('!I')
+
+    @classmethod
+    def encode(cls, value):
+        """
+        Encode a value.
+        :param value: Value.
+        :return: List of buffers; bytes values are referenced, not copied.
+        """
+        buffers = []
+        cls._encode(value, buffers)
+        return buffers
+
+    @classmethod
+    def _encode(cls, value, buffers):
+        """
+        Append the buffers of a value.
+        :param value: Value.
+        :param buffers: List of buffers.
+        :return: None.
+        """
+        if value is None:
+            buffers.append(bytes((cls.NONE,)))
+        elif value is True or value is False:
+            buffers.append(bytes((cls.TRUE if value else cls.FALSE,)))
+        elif isinstance(value, int):
+            if -2 ** 63 <= value < 2 ** 63:
+                buffers.append(bytes((cls.INT,)) + cls._INT.pack(value))
+            else:
+                cls._encode_sized(cls.BIG_INT, str(value).encode(), buffers)
+        elif isinstance(value, float):
+            buffers.append(bytes((cls.FLOAT,)) + cls._FLOAT.pack(value))
+        elif isinstance(value, str):
+            cls._encode_sized(cls.STR, value.encode(), buffers)
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            cls._encode_sized(cls.BYTES, value, buffers)
+        elif isinstance(value, (list, tuple)):
+            buffers.append(bytes((cls.LIST,)) + cls._SIZE.pack(len(value)))
+            for item in value:
+                cls._encode(item, buffers)
+        elif isinstance(value, dict):
+            buffers.append(bytes((cls.DICT,)) + cls._SIZE.pack(len(value)))
+            for key, item in value.items():
+                cls._encode(key, buffers)
+                cls._encode(item, buffers)
+        else:
+            cls._encode(str(value), buffers)
+
+    @classmethod
+    def _encode_sized(cls, tag, data, buffers):
+        """
+        Append a tag, the size of the data and the data itself.
+        :param tag: Int.
+        :param data: Bytes-like object.
+        :param buffers: List of buffers.
+        :return: None.
+        """
+        buffers.append(bytes((tag,)) + cls._SIZE.pack(memoryview(data).nbytes))
+        buffers.append(data)
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Decode a value.
+        :param data: Bytes-like object.
+        :return: Value.
+        """
+        value, offset = cls._decode(memoryview(data), 0)
+        if offset != len(data):
+            raise ValueError('Binary frame has trailing data.')
+        return value
+
+    @classmethod
+    def _decode(cls, view, offset):
+        """
+        Decode the value that starts at the offset.
+        :param view: Memoryview of the frame.
+        :param offset: Int.
+        :return: Tuple (value, offset after the value).
+        """
+        tag = view[offset]
+        offset += 1
+        if tag == cls.NONE:
+            return None, offset
+        if tag == cls.TRUE:
+            return True, offset
+        if tag == cls.FALSE:
+            return False, offset
+        if tag == cls.INT:
+            return cls._INT.unpack_from(view, offset)[0], offset + cls._INT.size
+        if tag == cls.FLOAT:
+            return cls._FLOAT.unpack_from(view, offset)[0], offset + cls._FLOAT.size
+        if tag in (cls.STR, cls.BYTES, cls.BIG_INT):
+            size = cls._SIZE.unpack_from(view, offset)[0]
+            offset += cls._SIZE.size
+            data = view[offset:offset + size]
+            if len(data) != size:
+                raise ValueError('Binary frame is truncated.')
+            value = bytes(data) if tag == cls.BYTES else str(data, 'utf-8')
+            return int(value) if tag == cls.BIG_INT else value, offset + size
+        if tag in (cls.LIST, cls.DICT):
+            count = cls._SIZE.unpack_from(view, offset)[0]
+            offset += cls._SIZE.size
+            items = []
+            for _ in range(count * (2 if tag == cls.DICT else 1)):
+                item, offset = cls._decode(view, offset)
+                items.append(item)
+            if tag == cls.LIST:
+                return items, offset
+            return dict(zip(items[::2], items[1::2])), offset
+        raise ValueError(f'Unknown binary tag: {tag}.')
+
+
+class FrameConnection:
+    """
+    Socket connection exchanging length-prefixed BinaryCodec frames.
+    It offers the methods of multiprocessing.connection.Connection used by the server and by the clients.
+    """
+    _HEADER = struct.Struct('!I')
+    _SMALL = 4096
+    _MAX_BUFFERS = 512
+
+    def __init__(self, sock, server_side=False):
+        """
+        :param sock: Connected socket.
+        :param server_side: Send the results in their compact form.
+        """
+        self._socket = sock
+        self._server_side = server_side
+
+    def fileno(self):
+        """
+        File descriptor used by the selector.
+        :return: Int.
+        """
+        return self._socket.fileno()
+
+    @staticmethod
+    def loads(data):
+        """
+        Decode a received frame.
+        :param data: Bytes-like object.
+        :return: Value.
+        """
+        return BinaryCodec.decode(data)
+
+    def _send_buffers(self, buffers):
+        """
+        Write a frame without joining its buffers when the system has "sendmsg".
+        :param buffers: List of buffers.
+        :return: None.
+        """
+        views, small = [], []
+        for buffer in buffers:
+            view = memoryview(buffer).cast('B')
+            if view.nbytes < self._SMALL:
+                small.append(view)
+                continue
+            if small:
+                views.append(memoryview(b''.join(small)))
+                small = []
+            views.append(view)
+        if small:
+            views.append(memoryview(b''.join(small)))
+        views.insert(0, memoryview(self._HEADER.pack(sum(view.nbytes for view in views))))
+        if not hasattr(self._socket, 'sendmsg'):
+            self._socket.sendall(b''.join(views))
+            return
+        while views:
+            sent = self._socket.sendmsg(views[:self._MAX_BUFFERS])
+            while views and sent >= views[0].nbytes:
+                sent -= views.pop(0).nbytes
+            if sent:
+                views[0] = views[0][sent:]
+
+    def _recv_exact(self, size):
+        """
+        Read exactly "size" bytes.
+        :param size: Int.
+        :return: Bytearray.
+        """
+        data = bytearray(size)
+        view = memoryview(data)
+        while view.nbytes:
+            received = self._socket.recv_into(view)
+            if not received:
+                raise EOFError('Connection closed.')
+            view = view[received:]
+        return data
+
+    def send_bytes(self, data):
+        """
+        Send raw bytes as a frame.
+        :param data: Bytes-like object.
+        :return: None.
+        """
+        self._send_buffers([data])
+
+    def recv_bytes(self, maxlength=None):
+        """
+        Receive a raw frame.
+        :param maxlength: Largest frame accepted.
+        :return: Bytearray.
+        """
+        size = self._HEADER.unpack(self._recv_exact(self._HEADER.size))[0]
+        if maxlength is not None and size > maxlength:
+            raise OSError('Bad message length.')
+        return self._recv_exact(size)
+
+    def send(self, value):
+        """
+        Encode and send a value.
+        :param value: Value.
+        :return: None.
+        """
+        if self._server_side:
+            value = CompactResult.compact(value)
+        self._send_buffers(BinaryCodec.encode(value))
+
+    def recv(self):
+        """
+        Receive and decode a value.
+        :return: Value.
+        """
+        return self.loads(self.recv_bytes())
+
+    def close(self):
+        """
+        Close the socket.
+        :return: None.
+        """
+        self._socket.close()
+
+    def __str__(self):
+        return f'<FrameConnection fd={self._socket.fileno()}>'
+
+
+class CompactResult:
+    """
+    Replace the base64 images of the results with their raw bytes.
+    """
+
+    @classmethod
+    def compact(cls, value):
+        """
+        Compact a result or a framed response.
+        :param value: Result.
+        :return: Result.
+        """
+        if isinstance(value, dict) and 'result' in value:
+            return {**value, 'result': cls.compact(value['result'])}
+        if isinstance(value, str) and value.startswith('{') and '"image"' in value:
+            try:
+                image = json.loads(value)
+                image['image'] = base64.b64decode(image['image'], validate=True)
+                return image
+            except (ValueError, TypeError, KeyError):
+                pass
+        return value
+
+
+def shutdown(connection):
+    """
+    Shut the socket of a connection down, waking up the thread blocked reading it. The descriptor is left open.
+    :param connection: Connection or FrameConnection.
+    :return: None.
+    """
+    sock = socket.socket(fileno=connection.fileno())
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    finally:
+        sock.detach()
+
+
+def authenticate(connection, authkey, timeout=None):
+    """
+    Run the challenge of multiprocessing.connection on the server side of an accepted connection. A timer shuts the
+    socket down when the challenge is not done in time, so a silent client cannot hold the thread on any platform.
+    :param connection: Connection or FrameConnection.
+    :param authkey: Bytes.
+    :param timeout: Seconds allowed for the challenge (None waits forever).
+    :return: Connection.
+    """
+    lock, finished, expired = Lock(), Event(), Event()
+
+    def expire():
+        with lock:
+            if not finished.is_set():
+                expired.set()
+                shutdown(connection)
+
+    timer = Timer(timeout, expire) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+    try:
+        deliver_challenge(connection, authkey)
+        answer_challenge(connection, authkey)
+    except (EOFError, OSError) as e:
+        if expired.is_set():
+            raise TimeoutError(f'The client did not authenticate in {timeout} seconds.') from e
+        raise
+    finally:
+        with lock:
+            finished.set()
+        if timer:
+            timer.cancel()
+    return connection
+
+
+class BinaryListener:
+    """
+    TCP listener of FrameConnection clients authenticated like multiprocessing.connection.Listener.
+    Without an authkey the clients are accepted at once and must be authenticated by the caller (see authenticate).
+    """
+
+    def __init__(self, address, authkey=None, backlog=1):
+        self._socket = socket.create_server(address, backlog=backlog, family=socket.getaddrinfo(*address)[0][0])
+        self._authkey = authkey
+        self.address = self._socket.getsockname()[:2]
+
+    def accept(self):
+        """
+        Accept and authenticate a client.
+        :return: FrameConnection.
+        """
+        sock, _ = self._socket.accept()
+        sock.setblocking(True)
+        connection = FrameConnection(sock, server_side=True)
+        if self._authkey:
+            try:
+                deliver_challenge(connection, self._authkey)
+                answer_challenge(connection, self._authkey)
+            except Exception:
+                connection.close()
+                raise
+        return connection
+
+    def close(self):
+        """
+        Stop listening.
+        :return: None.
+        """
+        self._socket.close()
+
+
+def binary_client(address, authkey=None):
+    """
+    Connect to a BinaryListener.
+    :param address: Tuple (host, port).
+    :param authkey: Bytes.
+    :return: FrameConnection.
+    """
+    connection = FrameConnection(socket.create_connection(address))
+    if authkey:
+        answer_challenge(connection, authkey)
+        deliver_challenge(connection, authkey)
+    return connection
+
+
+class Transport(Enum):
+    """
+    Factory for the available transports.
+    """
+    PICKLE = 'pickle'
+    BINARY = 'binary'
+
+    def new_listener(self, address, authkey=None, backlog=1):
+        """
+        Create the server listener.
+        :param address: Tuple (host, port).
+        :param authkey: Bytes checked by "accept" (None accepts the clients at once, see authenticate).
+        :param backlog: Connections waiting to be accepted.
+        :return: Listener.
+        """
+        listener = {
+            Transport.PICKLE: Listener,
+            Transport.BINARY: BinaryListener,
+        }[self]
+        return listener(address, authkey=authkey, backlog=backlog)
+
+    def new_client(self, address, authkey):
+        """
+        Connect to a server.
+        :param address: Tuple (host, port).
+        :param authkey: Bytes.
+        :return: Connection.
+        """
+        client = {
+            Transport.PICKLE: Client,
+            Transport.BINARY: binary_client,
+        }[self]
+        return client(address, authkey=authkey)
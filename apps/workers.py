@@ -0,0 +1,395 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Server Workers Module
+"""
+import selectors
+import socket
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.reduction import ForkingPickler
+from threading import BoundedSemaphore, Condition, Lock, Thread
+
+from apps.transports import authenticate
+from core.logs import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedExecutor:
+    """
+    Thread pool that blocks the producer when too many tasks are waiting to run.
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='zap-worker')
+        self._slots = BoundedSemaphore(max_workers + max_pending)
+
+    def submit(self, fn, *args, timeout=None):
+        """
+        Schedule a task, waiting for a free slot.
+        :param fn: Callable to run.
+        :param args: Callable arguments.
+        :param timeout: Seconds to wait for a slot (None waits forever).
+        :return: Future or None if no slot was released in time.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            return None
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        """
+        Stop the pool.
+        :param wait: Wait for running tasks.
+        :return: Self.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        return self
+
+
+class ClientConnection:
+    """
+    State of one accepted client connection.
+    """
+
+    def __init__(self, connection, max_message_size):
+        self._connection = connection
+        self._loads = getattr(connection, 'loads', ForkingPickler.loads)
+        self._max_message_size = max_message_size
+        self._send_lock = Lock()
+        self.in_flight = 0
+        self.reading = False
+        self.paused = False
+
+    def fileno(self):
+        """
+        File descriptor used by the selector.
+        :return: Int.
+        """
+        return self._connection.fileno()
+
+    def authenticate(self, authkey, timeout):
+        """
+        Check the authkey of the client.
+        :param authkey: Bytes.
+        :param timeout: Seconds allowed for the challenge.
+        :return: Self.
+        """
+        authenticate(self._connection, authkey, timeout)
+        return self
+
+    def recv(self):
+        """
+        Receive one message respecting the size limit of the connection.
+        :return: Decoded message.
+        """
+        return self._loads(self._connection.recv_bytes(self._max_message_size))
+
+    def send(self, value):
+        """
+        Send one message, serializing writers of the same connection.
+        :param value: Picklable value.
+        :return: Self.
+        """
+        with self._send_lock:
+            self._connection.send(value)
+        return self
+
+    def close(self):
+        """
+        Close the connection ignoring errors.
+        :return: Self.
+        """
+        try:
+            self._connection.close()
+        except OSError:
+            pass
+        return self
+
+    def __str__(self):
+        return str(self._connection)
+
+
+class ConnectionMultiplexer:
+    """
+    Selector loop that watches every idle client and hands readable ones to a bounded executor.
+    When the handler returns a Future the connection is released to read the next request and the response is sent
+    as soon as the Future is done, so a client may keep several requests in flight.
+    New clients are authenticated by a separate pool, so a slow or silent client never blocks the accept loop.
+    """
+
+    def __init__(self, handler, max_workers, max_pending, max_connections, max_message_size, max_in_flight=1,
+                 authkey=None, handshake_timeout=5.0, handshake_workers=4):
+        """
+        :param handler: Callable receiving (client, message) that returns the response or a Future of it.
+        :param max_workers: Threads running commands.
+        :param max_pending: Requests allowed to wait for a free thread.
+        :param max_connections: Simultaneous clients.
+        :param max_message_size: Largest request accepted from a client, in bytes.
+        :param max_in_flight: Deferred responses allowed per client before it stops being read.
+        :param authkey: Bytes checked before a client is watched (None when the listener checks it).
+        :param handshake_timeout: Seconds allowed for the authkey challenge.
+        :param handshake_workers: Threads authenticating new clients.
+        """
+        self._handler = handler
+        self._executor = BoundedExecutor(max_workers=max_workers, max_pending=max_pending)
+        self._authkey = authkey
+        self._handshake_timeout = handshake_timeout
+        self._handshakes = ThreadPoolExecutor(max_workers=handshake_workers, thread_name_prefix='zap-handshake')
+        self._max_connections = max_connections
+        self._max_message_size = max_message_size
+        self._max_in_flight = max_in_flight
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self._lock = Lock()
+        self._idle = Condition(self._lock)
+        self._to_watch = []
+        self._clients = set()
+        self._busy = 0
+        self._running = False
+        self._thread = None
+
+    @property
+    def connections(self):
+        """
+        Number of connected clients.
+        :return: Int.
+        """
+        with self._lock:
+            return len(self._clients)
+
+    def start(self):
+        """
+        Start the selector loop thread.
+        :return: Self.
+        """
+        self._running = True
+        self._thread = Thread(target=self._loop, name='zap-selector', daemon=True)
+        self._thread.start()
+        return self
+
+    def add(self, connection):
+        """
+        Start watching an accepted connection, after its authentication.
+        :param connection: multiprocessing Connection.
+        :return: Bool, False when the connection limit was reached.
+        """
+        client = ClientConnection(connection, self._max_message_size)
+        with self._lock:
+            if not self._running or len(self._clients) >= self._max_connections:
+                client.close()
+                return False
+            self._clients.add(client)
+        if self._authkey:
+            try:
+                self._handshakes.submit(self._authenticate, client)
+            except RuntimeError:
+                self._drop(client)
+                return False
+        else:
+            self._watch(client)
+        return True
+
+    def _authenticate(self, client):
+        """
+        Check the authkey of a new client and start watching it.
+        :param client: ClientConnection.
+        :return: None.
+        """
+        try:
+            client.authenticate(self._authkey, self._handshake_timeout)
+        except Exception as e:
+            logger.debug(f'Authentication failed for client {client}: {e}')
+            self._drop(client)
+            return
+        self._resume(client)
+
+    def _watch(self, client):
+        """
+        Ask the selector thread to watch the client again.
+        :param client: ClientConnection.
+        :return: None.
+        """
+        with self._lock:
+            self._to_watch.append(client)
+        try:
+            self._wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def _drop(self, client):
+        """
+        Forget and close a client.
+        :param client: ClientConnection.
+        :return: None.
+        """
+        with self._lock:
+            self._clients.discard(client)
+        client.close()
+
+    def _loop(self):
+        """
+        Selector loop.
+        :return: None.
+        """
+        while self._running:
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.fileobj is self._wakeup_reader:
+                    self._consume_wakeup()
+                    continue
+                client = key.fileobj
+                self._selector.unregister(client)
+                with self._lock:
+                    client.reading = True
+                    self._busy += 1
+                future = None
+                while self._running and future is None:
+                    future = self._executor.submit(self._serve, client, timeout=1.0)
+                if future is None:
+                    self._finish(client, keep=False)
+            self._register_pending()
+
+    def _consume_wakeup(self):
+        """
+        Empty the wake-up socket.
+        :return: None.
+        """
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _register_pending(self):
+        """
+        Register clients returned by the workers.
+        :return: None.
+        """
+        with self._lock:
+            pending, self._to_watch = self._to_watch, []
+        for client in pending:
+            try:
+                self._selector.register(client, selectors.EVENT_READ)
+            except (ValueError, KeyError, OSError):
+                self._drop(client)
+
+    def _serve(self, client):
+        """
+        Read one request, run it and answer the client.
+        :param client: ClientConnection.
+        :return: None.
+        """
+        keep = False
+        try:
+            message = client.recv()
+            response = self._handler(client, message)
+            if isinstance(response, Future):
+                self._defer(client, response)
+            else:
+                client.send(response)
+            keep = True
+        except (EOFError, OSError) as e:
+            logger.debug(f'Connection closed with client {client}: {e}')
+        except Exception as e:
+            logger.exception(e)
+        finally:
+            self._finish(client, keep=keep)
+
+    def _defer(self, client, response):
+        """
+        Send the response when it is ready.
+        :param client: ClientConnection.
+        :param response: Future of the response.
+        :return: None.
+        """
+        with self._lock:
+            client.in_flight += 1
+            client.paused = client.in_flight >= self._max_in_flight
+            self._busy += 1
+        response.add_done_callback(lambda future: self._reply(client, future))
+
+    def _reply(self, client, future):
+        """
+        Send a deferred response and resume reading a paused client.
+        :param client: ClientConnection.
+        :param future: Done Future of the response.
+        :return: None.
+        """
+        alive = True
+        try:
+            client.send(future.result())
+        except Exception as e:
+            logger.debug(f'Response lost for client {client}: {e}')
+            alive = False
+        with self._lock:
+            client.in_flight -= 1
+            resume = client.paused and client.in_flight < self._max_in_flight and not client.reading
+            if client.in_flight < self._max_in_flight:
+                client.paused = False
+            self._busy -= 1
+            self._idle.notify_all()
+        if not alive:
+            self._drop(client)
+        elif resume:
+            self._resume(client)
+
+    def _resume(self, client):
+        """
+        Watch the client again if the server is still running.
+        :param client: ClientConnection.
+        :return: None.
+        """
+        if self._running:
+            self._watch(client)
+        else:
+            self._drop(client)
+
+    def _finish(self, client, keep):
+        """
+        Give the client back to the selector or drop it.
+        :param client: ClientConnection.
+        :param keep: Whether the connection is still usable.
+        :return: None.
+        """
+        with self._lock:
+            client.reading = False
+            paused = client.paused
+            self._busy -= 1
+            self._idle.notify_all()
+        if not keep:
+            self._drop(client)
+        elif not paused:
+            self._resume(client)
+
+    def drain(self, timeout):
+        """
+        Stop reading new requests and wait for the running ones.
+        :param timeout: Max seconds to wait.
+        :return: Bool, True when every request finished.
+        """
+        with self._lock:
+            self._running = False
+            drained = self._idle.wait_for(lambda: self._busy == 0, timeout=timeout)
+            clients, self._clients = list(self._clients), set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        self._handshakes.shutdown(wait=False, cancel_futures=True)
+        self._executor.shutdown(wait=drained)
+        for client in clients:
+            client.close()
+        self._selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+        return drained
@@ -10,14 +10,20 @@ Zap Server Application Module
 """
 
 import signal
+import socket
 import traceback
-from multiprocessing.connection import Listener
-from threading import Thread
+from concurrent.futures import Future
+from functools import partial
 
 from apps.names import Colossal
+from apps.protocols import FramedProtocol
+from apps.transports import Transport
+from apps.workers import ConnectionMultiplexer
+from core import settings
 from core.utils.classes import MessageConsole
 from server.factories.whatsapp import FactoryWhatsappAdapter
 from server.managers import ManagerSingleton
+from server.restorer import SessionRestorer
 
 
 class ZapServerApp:
@@ -25,62 +31,194 @@ class ZapServerApp:
     TCP Socket Server to Selenium.
     """
 
-    def __init__(self, address, authkey, adapter=FactoryWhatsappAdapter.DEFAULT, no_headless=False):
+    def __init__(self, address, authkey, adapter=FactoryWhatsappAdapter.DEFAULT, no_headless=False,
+                 processes=settings.SESSION_PROCESSES, sessions_per_process=settings.SESSIONS_PER_PROCESS,
+                 max_workers=settings.SERVER_MAX_WORKERS, max_pending=settings.SERVER_MAX_PENDING,
+                 max_connections=settings.SERVER_MAX_CONNECTIONS, max_message_size=settings.SERVER_MAX_MESSAGE_SIZE,
+                 max_in_flight=settings.SERVER_MAX_IN_FLIGHT, drain_timeout=settings.SERVER_DRAIN_TIMEOUT,
+                 transport=Transport(settings.SERVER_TRANSPORT), restore=settings.SESSION_RESTORE,
+                 backlog=settings.SERVER_LISTEN_BACKLOG, handshake_timeout=settings.SERVER_HANDSHAKE_TIMEOUT):
         Colossal.show()
         self._con = MessageConsole()
         self._con.show('Authorizing...')
-        self._serv = Listener(address, authkey=authkey)
-        self._con.show(f'Zap Server Application: Host [{address[0]}], Port[{address[1]}].')
-        self._con.show('Instantiating the Manager...')
-        self._manager = ManagerSingleton().set_adapter(adapter).set_no_headless(no_headless)
+        self._serv = transport.new_listener(address, backlog=backlog)
+        self._address = self._serv.address
+        self._con.show(f'Zap Server Application: Host [{address[0]}], Port[{address[1]}], '
+                       f'Transport [{transport.value}].')
+        self._manager = None
+        self._restorer = None
+        self._start_sessions(
+            adapter=adapter, no_headless=no_headless, processes=processes, sessions_per_process=sessions_per_process)
+        self._multiplexer = ConnectionMultiplexer(
+            handler=self.worker, max_workers=max_workers, max_pending=max_pending,
+            max_connections=max_connections, max_message_size=max_message_size, max_in_flight=max_in_flight,
+            authkey=authkey, handshake_timeout=handshake_timeout, handshake_workers=settings.SERVER_HANDSHAKE_WORKERS)
+        self._drain_timeout = drain_timeout
+        self._con.show(f'Workers [{max_workers}], Pending [{max_pending}], Connections [{max_connections}].')
+        if restore:
+            self._restore_sessions()
         self._con.show('Initialization is Complete...')
-        self._worker_thread = None
         self._running = True
 
         signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+    def _start_sessions(self, adapter, no_headless, processes, sessions_per_process):
+        """
+        Prepare the manager that runs the commands.
+        :param adapter: FactoryWhatsappAdapter used by the sessions.
+        :param no_headless: Show the browser window.
+        :param processes: Number of session processes.
+        :param sessions_per_process: Sessions assigned to each process.
+        :return: Self.
+        """
+        self._con.show('Instantiating the Manager...')
+        self._manager = ManagerSingleton().set_adapter(adapter).set_no_headless(no_headless)
+        if processes:
+            self._con.show(f'Starting {processes} session processes...')
+            self._manager.set_processes(processes=processes, sessions_per_process=sessions_per_process)
+        self._manager.start_browser_pool().set_eviction()
+        return self
+
+    def _restore_sessions(self):
+        """
+        Open the recently active sessions in background.
+        :return: Self.
+        """
+        self._restorer = SessionRestorer(self._manager).start()
+        self._con.show(f'Restoring the sessions of the last {settings.SESSION_RESTORE_HOURS:g} hours, '
+                       f'{settings.SESSION_RESTORE_CONCURRENCY} at a time...')
+        return self
+
+    def _close_sessions(self):
+        """
+        Quit the sessions after the running commands were drained.
+        :return: Self.
+        """
+        if self._restorer:
+            self._restorer.stop(timeout=self._drain_timeout)
+        self._con.show('Closing the sessions...')
+        self._manager.shutdown(timeout=self._drain_timeout)
+        return self
+
+    @property
+    def address(self):
+        """
+        Address the server is listening on.
+        :return: Tuple (host, port).
+        """
+        return self._address
 
     def _signal_handler(self, signum, frame):
-        self._con.show('Received SIGINT. Stopping the worker thread...')
+        self._con.show(f'Received {signal.Signals(signum).name}. Stopping the server...')
+        self.stop()
+
+    def stop(self):
+        """
+        Stop accepting new clients. The running commands are drained by "execute".
+        :return: Self.
+        """
         self._running = False
-        if self._worker_thread and self._worker_thread.is_alive():
-            self._worker_thread.join()
-        self._con.show('Worker thread stopped. Exiting...')
-        exit(0)
+        if self._manager:
+            self._manager.stopping()
+        self._wake_listener()
+        return self
+
+    def _wake_listener(self):
+        """
+        Unblock the "accept" call with a dummy connection.
+        :return: None.
+        """
+        host, port = self._address
+        host = {'': '127.0.0.1', '0.0.0.0': '127.0.0.1', '::': '::1'}.get(host, host)
+        try:
+            socket.create_connection((host, port), timeout=1.0).close()
+        except OSError:
+            pass
+
+    def worker(self, client, command):
+        """
+        Execute a command received from a client.
+        :param client: Client connection.
+        :param command: Command data or framed request.
+        :return: Command result, or a Future of the framed response.
+        """
+        if FramedProtocol.is_request(command):
+            return self._submit(client, command)
+        if FramedProtocol.is_ping(command):
+            return FramedProtocol.PONG
+        self._con.show(f'Executing command: {command}...')
+        if self._manager:
+            result = self._manager.run_command(command_data=command)
+        else:
+            result = f'Echo: {command}'
+        self._con.show(f'Command executed {command}...')
+        self._con.show(f'Output Value [{result}]...')
+        return result
+
+    def _submit(self, client, request):
+        """
+        Schedule a framed request, answered when the command is done.
+        :param client: Client connection.
+        :param request: Framed request.
+        :return: Future of the framed response.
+        """
+        request_id, command = request[FramedProtocol.ID], request[FramedProtocol.COMMAND]
+        if FramedProtocol.is_ping(command):
+            future = Future()
+            future.set_result(FramedProtocol.PONG)
+            return FramedProtocol.wrap(request_id, future)
+        self._con.show(f'Scheduling command [{request_id}]: {command}...')
+        on_item = partial(self._send_partial, client, request_id) if request.get(FramedProtocol.STREAM) else None
+        if self._manager:
+            future = self._manager.submit_command(command_data=command, on_item=on_item)
+        else:
+            future = Future()
+            future.set_result(f'Echo: {command}')
+        future.add_done_callback(
+            lambda done: self._con.show(f'Command executed [{request_id}], Output Value [{done.result()}]...'))
+        return FramedProtocol.wrap(request_id, future)
 
-    def worker(self, client):
+    def _send_partial(self, client, request_id, index, result):
         """
-        Waiting for client action.
-        :param client: Thread accepted.
-        :return:
+        Send the result of a sub-command of a batch.
+        :param client: Client connection.
+        :param request_id: Correlation ID.
+        :param index: Position of the sub-command in the batch.
+        :param result: Sub-command result.
+        :return: None.
         """
         try:
-            while self._running:
-                command = client.recv()
-                if command:
-                    self._con.show(f'Executing command: {command}...')
-                    if self._manager:
-                        result = self._manager.run_command(command_data=command)
-                    else:
-                        result = f'Echo: {command}'
-                    self._con.show(f'Command executed {command}...')
-                    client.send(result)
-                    self._con.show(f'Output Value [{result}]...')
-        except EOFError as e:
-            self._con.show(e)
-            self._con.show('Connection Closed with Client.')
+            client.send(FramedProtocol.partial(request_id, index, result))
+        except OSError as e:
+            self._con.show(f'Partial result lost [{request_id}]: {e}')
 
     def execute(self):
         """
         Start workers and wait client connections.
         :return: None
         """
+        self._multiplexer.start()
         while self._running:
             try:
                 self._con.show('Waiting for client connection.')
                 client = self._serv.accept()
-                self._con.show(f'Connected by{client}.')
-                self._worker_thread = Thread(target=self.worker, args=(client,))
-                self._worker_thread.start()
+                if not self._running:
+                    client.close()
+                    break
+                if self._multiplexer.add(client):
+                    self._con.show(f'Connected by{client}.')
+                else:
+                    self._con.show(f'Connection refused for {client}: client limit reached.')
             except Exception as e:
+                if not self._running:
+                    break
                 self._con.show(e)
                 traceback.print_exc()
+        self._serv.close()
+        self._con.show('Draining the running commands...')
+        if self._multiplexer.drain(timeout=self._drain_timeout):
+            self._con.show('Worker threads stopped.')
+        else:
+            self._con.show('Drain timeout: pending commands were cancelled.')
+        self._close_sessions()
@@ -19,6 +19,8 @@ BASE_DIR = os.path.normpath(os.path.dirname(os.path.dirname(os.path.abspath(__fi
 AUTH_KEY = os.environ.get('AUTH_KEY')
 
 ELEMENTS_DATA_FILE = os.path.normpath(os.path.join(f'{BASE_DIR}/data/', 'elements_data.pkl'))
+ELEMENTS_CHECK_INTERVAL = float(os.environ.get('ELEMENTS_CHECK_INTERVAL', default=5.0))
+ELEMENTS_STATS_INTERVAL = float(os.environ.get('ELEMENTS_STATS_INTERVAL', default=300.0))
 SETTINGS_TYPE = os.environ.get('SETTINGS_TYPE', default='PRD')
 
 OS_WEB_DRIVER = platform.system()
@@ -29,6 +31,56 @@ else:
     CHROME_WEB_DRIVER = os.path.normpath(os.path.join(f'{BASE_DIR}/contrib/drivers/linux/', 'chromedriver'))
     FIREFOX_WEB_DRIVER = os.path.normpath(os.path.join(f'{BASE_DIR}/contrib/drivers/linux/', 'geckodriver'))
 
+# Selenium
+UI_POLL_INTERVAL = float(os.environ.get('UI_POLL_INTERVAL', default=0.05))
+HUMAN_JITTER_MIN = float(os.environ.get('HUMAN_JITTER_MIN', default=0.0))
+HUMAN_JITTER_MAX = float(os.environ.get('HUMAN_JITTER_MAX', default=0.0))
+UI_PUSH_WAITS = os.environ.get('UI_PUSH_WAITS', default='1') == '1'
+UI_FAST_COMPOSE = os.environ.get('UI_FAST_COMPOSE', default='1') == '1'
+UNREAD_SCAN_TIMEOUT = float(os.environ.get('UNREAD_SCAN_TIMEOUT', default=300.0))
+PARTICIPANTS_EXPORT_TIMEOUT = float(os.environ.get('PARTICIPANTS_EXPORT_TIMEOUT', default=120.0))
+PARTICIPANTS_CACHE_TTL = float(os.environ.get('PARTICIPANTS_CACHE_TTL', default=300.0))
+
+# Server
+SERVER_MAX_WORKERS = int(os.environ.get('SERVER_MAX_WORKERS', default=32))
+SERVER_MAX_PENDING = int(os.environ.get('SERVER_MAX_PENDING', default=256))
+SERVER_MAX_CONNECTIONS = int(os.environ.get('SERVER_MAX_CONNECTIONS', default=4096))
+SERVER_MAX_IN_FLIGHT = int(os.environ.get('SERVER_MAX_IN_FLIGHT', default=64))
+SERVER_MAX_MESSAGE_SIZE = int(os.environ.get('SERVER_MAX_MESSAGE_SIZE', default=16 * 1024 * 1024))
+SERVER_TRANSPORT = os.environ.get('SERVER_TRANSPORT', default='pickle')
+SERVER_DRAIN_TIMEOUT = float(os.environ.get('SERVER_DRAIN_TIMEOUT', default=30.0))
+SERVER_LISTEN_BACKLOG = int(os.environ.get('SERVER_LISTEN_BACKLOG', default=128))
+SERVER_HANDSHAKE_TIMEOUT = float(os.environ.get('SERVER_HANDSHAKE_TIMEOUT', default=5.0))
+SERVER_HANDSHAKE_WORKERS = int(os.environ.get('SERVER_HANDSHAKE_WORKERS', default=4))
+SESSION_PROCESSES = int(os.environ.get('SESSION_PROCESSES', default=0))
+SESSIONS_PER_PROCESS = int(os.environ.get('SESSIONS_PER_PROCESS', default=8))
+SESSION_MAX = int(os.environ.get('SESSION_MAX', default=0))
+SESSION_IDLE_TIMEOUT = float(os.environ.get('SESSION_IDLE_TIMEOUT', default=0.0))
+SESSION_MEMORY_BUDGET_MB = int(os.environ.get('SESSION_MEMORY_BUDGET_MB', default=0))
+SESSION_EVICTION_INTERVAL = float(os.environ.get('SESSION_EVICTION_INTERVAL', default=30.0))
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', default=0))
+BROWSER_POOL_REFILL_INTERVAL = float(os.environ.get('BROWSER_POOL_REFILL_INTERVAL', default=5.0))
+BROWSER_POOL_MAX_USES = int(os.environ.get('BROWSER_POOL_MAX_USES', default=20))
+BROWSER_DENSE = os.environ.get('BROWSER_DENSE', default='0') == '1'
+BROWSER_PROFILES = os.environ.get('BROWSER_PROFILES', default='0') == '1'
+BROWSER_PROFILES_DIR = os.environ.get('BROWSER_PROFILES_DIR', default=os.path.join(BASE_DIR, 'server', '.profiles'))
+SESSION_STORE = os.environ.get('SESSION_STORE', default='0') == '1'
+SESSION_STORE_FILE = os.environ.get(
+    'SESSION_STORE_FILE', default=os.path.join(BASE_DIR, 'server', '.temp', 'sessions.db'))
+STORAGE_SNAPSHOT_INTERVAL = float(os.environ.get('STORAGE_SNAPSHOT_INTERVAL', default=300.0))
+SESSION_RESTORE = os.environ.get('SESSION_RESTORE', default='0') == '1'
+SESSION_RESTORE_CONCURRENCY = int(os.environ.get('SESSION_RESTORE_CONCURRENCY', default=2))
+SESSION_RESTORE_HOURS = float(os.environ.get('SESSION_RESTORE_HOURS', default=24.0))
+SESSION_RESTORE_MAX = int(os.environ.get('SESSION_RESTORE_MAX', default=0))
+SESSION_RESTORE_TIMEOUT = float(os.environ.get('SESSION_RESTORE_TIMEOUT', default=60.0))
+
+# Router
+ROUTER_BACKENDS = os.environ.get('ROUTER_BACKENDS', default='')
+ROUTER_REPLICAS = int(os.environ.get('ROUTER_REPLICAS', default=160))
+ROUTER_HEALTH_TOKEN = os.environ.get('ROUTER_HEALTH_TOKEN', default='zap_router_health')
+ROUTER_HEALTH_INTERVAL = float(os.environ.get('ROUTER_HEALTH_INTERVAL', default=15.0))
+ROUTER_HEALTH_TIMEOUT = float(os.environ.get('ROUTER_HEALTH_TIMEOUT', default=60.0))
+
 SITE_ROOT = os.environ.get('SITE_ROOT')
 URL_MEDIA_GROUPS = os.environ.get('URL_MEDIA_GROUPS', default=f'https://{SITE_ROOT}/media/images/groups')
 # SMTP
@@ -11,15 +11,21 @@ Browsers Module
 import os
 import pickle
 from abc import ABCMeta
+from collections import deque
 from enum import Enum
+from threading import Event, Lock, Thread
 
 from selenium import webdriver
 from selenium.webdriver import DesiredCapabilities
 from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.firefox.options import Options as FirefoxOptions
 
-from core.settings import BASE_DIR, CHROME_WEB_DRIVER, FIREFOX_WEB_DRIVER
+from core.settings import BASE_DIR, BROWSER_DENSE, BROWSER_PROFILES_DIR, CHROME_WEB_DRIVER, FIREFOX_WEB_DRIVER, \
+    SESSION_STORE
 from core.logs import logging
+from core.singletons.singleton_meta import Singleton
+from core.utils.browsers.sessions import SessionStore
+from core.utils.processes import ProcessTree
 
 logger = logging.getLogger(__name__)
 
@@ -32,19 +38,20 @@ class BrowserType(Enum):
     CHROME = 1
     FIREFOX = 2
 
-    def new_instance(self, token=None, save_cookies=False, no_headless=False):
+    def new_instance(self, token=None, save_cookies=False, no_headless=False, session=None):
         """
         Method to retrieve an instance of the selected browser.
         :param token: User ID.
         :param save_cookies: Whether it is to save cookies.
         :param no_headless: If not it is to present browser window display.
+        :param session: Profile directory kept between launches (optional).
         :return: Browser instance.
         """
         browser = {
             BrowserType.CHROME: ChromeBrowser,
             BrowserType.FIREFOX: FirefoxBrowser,
         }[self]
-        return browser(token=token, save_cookies=save_cookies, no_headless=no_headless)
+        return browser(token=token, session=session, save_cookies=save_cookies, no_headless=no_headless)
 
 
 class BaseBrowser(metaclass=ABCMeta):
@@ -61,12 +68,57 @@ class BaseBrowser(metaclass=ABCMeta):
         self._session = session
         self._options = None
         self._browser = None
+        self.dense = False
+        self.uses = 0
 
     def __del__(self):
+        self.close()
+
+    def bind(self, token):
+        """
+        Assign the browser to a user.
+        :param token: User ID.
+        :return: Self.
+        """
+        self._token = token
+        self._cookies_file = os.path.normpath(
+            os.path.join(f'{BASE_DIR}/server/.temp/', f'cookies_{self._token}.pkl'))
+        return self
+
+    @staticmethod
+    def profile_dir(token):
+        """
+        Profile directory of a user, kept between launches of the browser.
+        :param token: User ID.
+        :return: Path.
+        """
+        return os.path.normpath(os.path.join(BROWSER_PROFILES_DIR, f'profile_{token}'))
+
+    def close(self):
+        """
+        Save the cookies when required (in the SessionStore when it is enabled) and quit the browser.
+        :return: Self.
+        """
         if self._browser:
-            if self._save_cookies:
+            if self._save_cookies and SESSION_STORE:
+                SessionStore().put_cookies(self._token, self._browser.get_cookies())
+            elif self._save_cookies:
                 pickle.dump(self._browser.get_cookies(), open(self._cookies_file, 'wb'))
             self._browser.quit()
+            self._browser = None
+        return self
+
+    def memory_usage(self):
+        """
+        Resident memory of the browser: its driver and every process started by the driver.
+        :return: Dict {'processes': Int, 'rss_mb': Float, 'dense': Bool} or None when it cannot be measured.
+        """
+        process = getattr(getattr(self._browser, 'service', None), 'process', None)
+        if process is None or not ProcessTree.available():
+            return None
+        pids = [process.pid] + ProcessTree(process.pid).descendants()
+        rss = sum(ProcessTree.rss_of(pid) for pid in pids)
+        return {'processes': len(pids), 'rss_mb': round(rss / 1024 / 1024, 1), 'dense': self.dense}
 
     @property
     def browser(self):
@@ -124,20 +176,86 @@ class ChromeBrowser(BaseBrowser):
                 self._browser = webdriver.Chrome(ChromeDriverManager().install(), options=self._options)
 
 
+class DenseFirefoxProfile:
+    """
+    Firefox preferences for packing many sessions in a host: one content process, no images, media or web fonts,
+    small caches and no telemetry or background services. Whatsapp Web works without them; the QR code is a canvas
+    and profile pictures are opened as their own page, which is not blocked.
+    """
+    PREFS = {
+        # Processes
+        'fission.autostart': False,
+        'dom.ipc.processCount': 1,
+        'dom.ipc.processCount.webIsolated': 1,
+        'dom.ipc.processPrelaunch.enabled': False,
+        'browser.tabs.remote.separatePrivilegedContentProcess': False,
+        # Images, media and fonts
+        'permissions.default.image': 2,
+        'media.autoplay.default': 5,
+        'media.hardware-video-decoding.enabled': False,
+        'gfx.downloadable_fonts.enabled': False,
+        'browser.display.use_document_fonts': 0,
+        'ui.prefersReducedMotion': 1,
+        # Caches and history
+        'browser.cache.disk.enable': False,
+        'browser.cache.memory.capacity': 16384,
+        'browser.sessionhistory.max_entries': 2,
+        'browser.sessionhistory.max_total_viewers': 0,
+        'browser.sessionstore.resume_from_crash': False,
+        'image.mem.surfacecache.max_size_kb': 16384,
+        'javascript.options.mem.high_water_mark': 32,
+        # Telemetry and background services
+        'toolkit.telemetry.enabled': False,
+        'toolkit.telemetry.unified': False,
+        'datareporting.healthreport.uploadEnabled': False,
+        'datareporting.policy.dataSubmissionEnabled': False,
+        'app.normandy.enabled': False,
+        'app.update.auto': False,
+        'extensions.update.enabled': False,
+        'extensions.pocket.enabled': False,
+        'browser.safebrowsing.malware.enabled': False,
+        'browser.safebrowsing.phishing.enabled': False,
+        'browser.safebrowsing.downloads.enabled': False,
+        'browser.search.update': False,
+        'browser.ping-centre.telemetry': False,
+        'browser.newtabpage.enabled': False,
+        'network.prefetch-next': False,
+        'network.dns.disablePrefetch': True,
+        'network.http.speculative-parallel-limit': 0,
+    }
+
+    @classmethod
+    def apply(cls, options):
+        """
+        Set the preferences in the options of a Firefox instance.
+        :param options: FirefoxOptions.
+        :return: FirefoxOptions.
+        """
+        for name, value in cls.PREFS.items():
+            options.set_preference(name, value)
+        return options
+
+
 class FirefoxBrowser(BaseBrowser):
     """
     Firefox browser class.
     *An instance of this class will not work on Linux if the root user is being used.*
     """
 
-    def __init__(self, token=None, session=None, save_cookies=False, no_headless=False):
+    def __init__(self, token=None, session=None, save_cookies=False, no_headless=False, dense=BROWSER_DENSE):
         logger.debug("Initializing Firefox")
         super().__init__(token=token, session=session, save_cookies=save_cookies, no_headless=no_headless)
         self._options = FirefoxOptions()
         if not self._no_headless:
             self._options.add_argument("--headless")
         self._options.add_argument("--lang=pt-br")
+        if dense:
+            DenseFirefoxProfile.apply(self._options)
+            self.dense = True
         if session:
+            os.makedirs(session, exist_ok=True)
+            self._options.add_argument('-profile')
+            self._options.add_argument(session)
             self._browser = webdriver.Firefox(options=self._options)
         else:
             try:
@@ -157,3 +275,179 @@ class FirefoxBrowser(BaseBrowser):
                     options=self._options
                 )
         logger.debug("Firefox Initialized")
+
+
+class BrowserPool(metaclass=Singleton):
+    """
+    Browsers launched in advance with Whatsapp Web already loaded, handed out to new sessions without the cold start.
+    """
+    WARM_URL = 'https://web.whatsapp.com/'
+    CLEAN_SCRIPT = """
+    const done = arguments[arguments.length - 1];
+    window.localStorage.clear();
+    window.sessionStorage.clear();
+    if (!window.indexedDB || !indexedDB.databases) { done(true); return; }
+    indexedDB.databases()
+        .then(dbs => Promise.all(dbs.map(db => new Promise(resolve => {
+            const request = indexedDB.deleteDatabase(db.name);
+            request.onsuccess = request.onerror = request.onblocked = () => resolve();
+        }))))
+        .then(() => done(true), () => done(false));
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._idle = deque()
+        self._wanted = Event()
+        self._stopped = Event()
+        self._thread = None
+        self._size = 0
+        self._refill_interval = 0.0
+        self._max_uses = 0
+        self._no_headless = False
+        self._launcher = None
+
+    @property
+    def running(self):
+        """
+        Check if the pool is refilling.
+        :return: Bool.
+        """
+        return self._thread is not None and not self._stopped.is_set()
+
+    @property
+    def idle(self):
+        """
+        Number of browsers waiting for a session.
+        :return: Int.
+        """
+        with self._lock:
+            return len(self._idle)
+
+    def start(self, size, refill_interval, max_uses, no_headless=False, browser_type=BrowserType.FIREFOX,
+              launcher=None):
+        """
+        Start launching browsers in background.
+        :param size: Browsers kept ready.
+        :param refill_interval: Seconds between two launches.
+        :param max_uses: Sessions served by a browser before it is replaced.
+        :param no_headless: Show the browser windows.
+        :param browser_type: BrowserType launched by the pool.
+        :param launcher: Callable returning a new BaseBrowser (optional).
+        :return: Self.
+        """
+        if self.running or size <= 0:
+            return self
+        self._size = size
+        self._refill_interval = refill_interval
+        self._max_uses = max_uses
+        self._no_headless = no_headless
+        self._launcher = launcher or (lambda: self._launch(browser_type))
+        self._stopped.clear()
+        self._wanted.set()
+        self._thread = Thread(target=self._refill, name='zap-browser-pool', daemon=True)
+        self._thread.start()
+        return self
+
+    def _launch(self, browser_type):
+        """
+        Launch a browser and load Whatsapp Web.
+        :param browser_type: BrowserType.
+        :return: BaseBrowser.
+        """
+        driver = browser_type.new_instance(no_headless=self._no_headless)
+        driver.browser.set_window_size(1600, 1200)
+        driver.browser.get(self.WARM_URL)
+        return driver
+
+    def _refill(self):
+        """
+        Keep the pool full, launching one browser per interval.
+        :return: None.
+        """
+        while not self._stopped.is_set():
+            self._wanted.wait()
+            with self._lock:
+                missing = self._size - len(self._idle)
+                if missing <= 0:
+                    self._wanted.clear()
+                    continue
+            try:
+                driver = self._launcher()
+            except Exception as e:
+                logger.warning(f'Browser pool could not launch a browser: {e}')
+            else:
+                self._put(driver)
+            self._stopped.wait(self._refill_interval)
+
+    def _put(self, driver):
+        """
+        Keep a browser in the pool or close it when the pool is full or stopped.
+        :param driver: BaseBrowser.
+        :return: Bool, True when the browser was kept.
+        """
+        with self._lock:
+            keep = not self._stopped.is_set() and len(self._idle) < self._size
+            if keep:
+                self._idle.append(driver)
+        if not keep:
+            driver.close()
+        return keep
+
+    def acquire(self, token, no_headless=False):
+        """
+        Take a ready browser for a session.
+        :param token: User ID.
+        :param no_headless: Whether the session shows the browser window.
+        :return: BaseBrowser or None when no browser is ready.
+        """
+        if no_headless != self._no_headless:
+            return None
+        with self._lock:
+            driver = self._idle.popleft() if self._idle else None
+        if self.running:
+            self._wanted.set()
+        if driver is None:
+            return None
+        driver.uses += 1
+        return driver.bind(token)
+
+    def release(self, driver):
+        """
+        Clean the browser of a session that quit and put it back in the pool.
+        Browsers that were used too many times or could not be cleaned are closed.
+        :param driver: BaseBrowser.
+        :return: Self.
+        """
+        if not self.running or not driver.browser or driver.uses >= self._max_uses:
+            driver.close()
+            return self
+        try:
+            driver.browser.set_script_timeout(10)
+            cleaned = driver.browser.execute_async_script(self.CLEAN_SCRIPT)
+            driver.browser.delete_all_cookies()
+            driver.browser.get(self.WARM_URL)
+        except Exception as e:
+            logger.debug(f'Browser pool could not clean a browser: {e}')
+            cleaned = False
+        if cleaned:
+            self._put(driver.bind(None))
+        else:
+            driver.close()
+        return self
+
+    def stop(self):
+        """
+        Stop refilling and close the idle browsers.
+        :return: Self.
+        """
+        self._stopped.set()
+        self._wanted.set()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for driver in idle:
+            driver.close()
+        return self
@@ -32,12 +32,153 @@ for key, value in storage.items():
 
 *Deleting all items:*
 storage.clear()
+
+*Setting and getting many items in one call:*
+storage.set_many({"my_key": 1234, "my_key2": 5678})
+print(storage.get_many(["my_key", "my_key2"]))
 """
 
 import os
 import pickle
+import tempfile
+from hashlib import sha256
+from threading import Condition, Thread
+
+from core.settings import BASE_DIR, SESSION_STORE
+from core.logs import logging
+from core.singletons.singleton_meta import Singleton
+from core.utils.browsers.sessions import SessionStore, dump_snapshot, load_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class StorageWriter(metaclass=Singleton):
+    """
+    Background writer of the Local Storage snapshots, to files or to the SessionStore. Snapshots of a file waiting to
+    be written are coalesced (only the newest one is written), snapshots equal to the stored one are skipped, and files
+    are compressed and replaced at once, so a crash never leaves a half written file.
+    """
+
+    def __init__(self):
+        self._changed = Condition()
+        self._pending = {}
+        self._digests = {}
+        self._writing = None
+        self._thread = None
+        self.writes = 0
+
+    @staticmethod
+    def digest(data):
+        """
+        Content hash of a snapshot.
+        :param data: Dict.
+        :return: Str.
+        """
+        return sha256(pickle.dumps(sorted(data.items()))).hexdigest()
+
+    @staticmethod
+    def read(file_name):
+        """
+        Read a snapshot file, compressed or not.
+        :param file_name: File name.
+        :return: Dict.
+        """
+        with open(file_name, 'rb') as file:
+            return load_snapshot(file.read())
+
+    def _stored_digest(self, name, store):
+        """
+        Content hash of the stored snapshot.
+        :param name: File name, or token for the store.
+        :param store: SessionStore or None for files.
+        :return: Str or None.
+        """
+        if store:
+            return store.storage_digest(name)
+        try:
+            return self.digest(self.read(name)) if os.path.isfile(name) else None
+        except Exception:
+            return None
+
+    def write(self, name, data, store=None):
+        """
+        Write a snapshot when it differs from the stored one.
+        :param name: File name, or token for the store.
+        :param data: Dict.
+        :param store: SessionStore (default: write a file).
+        :return: Bool, True when the snapshot was written.
+        """
+        digest = self.digest(data)
+        if name not in self._digests:
+            self._digests[name] = self._stored_digest(name, store)
+        if self._digests[name] == digest and (store or os.path.isfile(name)):
+            return False
+        if store:
+            store.put_storage(name, data, digest)
+        else:
+            folder = os.path.dirname(name)
+            os.makedirs(folder, exist_ok=True)
+            with tempfile.NamedTemporaryFile('wb', dir=folder, delete=False) as file:
+                file.write(dump_snapshot(data))
+            os.replace(file.name, name)
+        self._digests[name] = digest
+        self.writes += 1
+        return True
+
+    def submit(self, name, data, store=None):
+        """
+        Queue a snapshot, replacing the one of the same file still waiting.
+        :param name: File name, or token for the store.
+        :param data: Dict.
+        :param store: SessionStore (default: write a file).
+        :return: Self.
+        """
+        with self._changed:
+            self._pending[name] = (data, store)
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='zap-storage-writer', daemon=True)
+                self._thread.start()
+            self._changed.notify_all()
+        return self
 
-from core.settings import BASE_DIR
+    def flush(self, timeout=None):
+        """
+        Wait for the queued snapshots to be written.
+        :param timeout: Seconds.
+        :return: Bool, True when nothing is waiting.
+        """
+        with self._changed:
+            return self._changed.wait_for(lambda: not self._pending and self._writing is None, timeout)
+
+    def pending(self, name):
+        """
+        Newest snapshot of a file still waiting to be written. A snapshot of the file being written is waited for.
+        :param name: File name, or token for the store.
+        :return: Dict or None when the stored snapshot is up to date.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._writing != name)
+            data, _ = self._pending.get(name, (None, None))
+            return data
+
+    def _run(self):
+        """
+        Writer loop.
+        :return: None.
+        """
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._pending)
+                name, (data, store) = self._pending.popitem()
+                self._writing = name
+            try:
+                self.write(name, data, store)
+            except Exception as e:
+                logger.error(f'Local Storage snapshot {name} could not be written: {e}')
+            finally:
+                with self._changed:
+                    self._writing = None
+                    self._changed.notify_all()
 
 
 class LocalStorage:
@@ -113,6 +254,17 @@ class LocalStorage:
         """
         return self._driver.execute_script("return window.localStorage.getItem(arguments[0]);", key)
 
+    def get_many(self, keys):
+        """
+        Method to retrieve the values of many keys in one call.
+        :param keys: List of keys.
+        :return: Dict of the keys found.
+        """
+        return self._driver.execute_script(
+            "var ls = window.localStorage, items = {}; "
+            "arguments[0].forEach(function (k) { var v = ls.getItem(k); if (v !== null) items[k] = v; }); "
+            "return items; ", list(keys))
+
     def set(self, key, value):
         """
         Method for associating a value with a key.
@@ -122,6 +274,17 @@ class LocalStorage:
         """
         self._driver.execute_script("window.localStorage.setItem(arguments[0], arguments[1]);", key, value)
 
+    def set_many(self, values):
+        """
+        Method for associating many values with their keys in one call.
+        :param values: Dict {key: value}.
+        :return: None.
+        """
+        if values:
+            self._driver.execute_script(
+                "var ls = window.localStorage, items = arguments[0]; "
+                "Object.keys(items).forEach(function (k) { ls.setItem(k, items[k]); });", values)
+
     def has(self, key):
         """
         Method to check if the key exists.
@@ -147,13 +310,18 @@ class LocalStorage:
 
     def load(self):
         """
-        Method for loading saved file data.
+        Method for loading saved file data. A snapshot still waiting for the StorageWriter is newer than the saved one.
         :return: Tuple (Dict, Bool).
         """
         try:
+            data = StorageWriter().pending(self._token if SESSION_STORE else self._file_name)
+            if data is not None:
+                return data, True
+            if SESSION_STORE:
+                data = SessionStore().get_storage(self._token)
+                return (data, True) if data is not None else (self.items(), True)
             if os.path.isfile(self._file_name):
-                with open(self._file_name, "rb") as file:
-                    return pickle.load(file), True
+                return StorageWriter.read(self._file_name), True
             else:
                 return self.items(), True
         except Exception:
@@ -161,20 +329,12 @@ class LocalStorage:
 
     def save(self):
         """
-        Method for saving information to file.
+        Method for saving information to file (or to the SessionStore). The items are read in one call and written
+        in background; use StorageWriter().flush() to wait for the file.
         :return: Self.
         """
-        os.makedirs("./server/.temp/", exist_ok=True)
-        with open(self._file_name, "wb") as file:
-            pickle.dump(self._parse(), file)
+        if SESSION_STORE:
+            StorageWriter().submit(self._token, dict(self.items()), store=SessionStore())
+        else:
+            StorageWriter().submit(self._file_name, dict(self.items()))
         return self
-
-    def _parse(self):
-        """
-        Method to populate dictionary with retrieved data.
-        :return: Dict.
-        """
-        profile = {}
-        for key, value in self.items().items():
-            profile[key] = value
-        return profile
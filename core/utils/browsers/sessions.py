@@ -0,0 +1,309 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Session Store Module
+"""
+import glob
+import gzip
+import json
+import os
+import pickle
+import sqlite3
+import sys
+from threading import Lock
+from time import time
+
+from core import settings
+from core.logs import logging
+from core.singletons.singleton_meta import Singleton
+
+logger = logging.getLogger(__name__)
+
+
+def dump_snapshot(data):
+    """
+    Encode a Local Storage snapshot or a cookie list.
+    :param data: Object.
+    :return: Bytes (compressed pickle).
+    """
+    return gzip.compress(pickle.dumps(data), compresslevel=6)
+
+
+def load_snapshot(content):
+    """
+    Decode a snapshot, compressed or not.
+    :param content: Bytes.
+    :return: Object.
+    """
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    return pickle.loads(content)
+
+
+class SessionStore(metaclass=Singleton):
+    """
+    State of every token in one SQLite database: Local Storage snapshot, cookies, last activity and metadata.
+    The database runs in WAL mode, so the session processes read it while one of them writes.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        token TEXT PRIMARY KEY,
+        storage BLOB,
+        storage_digest TEXT,
+        cookies BLOB,
+        last_activity REAL,
+        metadata TEXT NOT NULL DEFAULT '{}'
+    );
+    CREATE INDEX IF NOT EXISTS sessions_last_activity ON sessions (last_activity);
+    """
+    FIELDS = ('storage', 'storage_digest', 'cookies', 'last_activity', 'metadata')
+
+    def __init__(self, file_name=None):
+        """
+        :param file_name: Database file (default: settings.SESSION_STORE_FILE).
+        """
+        self._file_name = file_name or settings.SESSION_STORE_FILE
+        os.makedirs(os.path.dirname(self._file_name), exist_ok=True)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(self._file_name, timeout=30.0, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(self.SCHEMA)
+
+    @property
+    def file_name(self):
+        """
+        Database file.
+        :return: Str.
+        """
+        return self._file_name
+
+    def close(self):
+        """
+        Close the database.
+        :return: None.
+        """
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def _row(row):
+        """
+        Decode a row.
+        :param row: Tuple (token, storage, storage_digest, cookies, last_activity, metadata).
+        :return: Dict.
+        """
+        token, storage, digest, cookies, last_activity, metadata = row
+        return {
+            'token': token,
+            'storage': load_snapshot(storage) if storage else None,
+            'storage_digest': digest,
+            'cookies': load_snapshot(cookies) if cookies else None,
+            'last_activity': last_activity,
+            'metadata': json.loads(metadata),
+        }
+
+    def put_many(self, items):
+        """
+        Write the state of many tokens in one transaction. Only the informed fields change; the metadata is merged.
+        :param items: Dicts with "token" and any of "storage", "storage_digest", "cookies", "last_activity",
+            "metadata".
+        :return: Int, number of tokens written.
+        """
+        count = 0
+        with self._lock, self._connection:
+            for item in items:
+                values = {field: item[field] for field in self.FIELDS if field in item}
+                if 'storage' in values:
+                    values['storage'] = dump_snapshot(values['storage'])
+                if 'cookies' in values:
+                    values['cookies'] = dump_snapshot(values['cookies'])
+                if 'metadata' in values:
+                    row = self._connection.execute(
+                        'SELECT metadata FROM sessions WHERE token = ?', (item['token'],)).fetchone()
+                    values['metadata'] = json.dumps({**(json.loads(row[0]) if row else {}), **values['metadata']})
+                names = ', '.join(values)
+                updates = ', '.join(f'{name} = excluded.{name}' for name in values) or 'token = excluded.token'
+                self._connection.execute(
+                    f'INSERT INTO sessions (token{", " if values else ""}{names}) '
+                    f'VALUES ({", ".join("?" * (len(values) + 1))}) '
+                    f'ON CONFLICT (token) DO UPDATE SET {updates}',
+                    (item['token'], *values.values()))
+                count += 1
+        return count
+
+    def get_many(self, tokens):
+        """
+        Read the state of many tokens.
+        :param tokens: List of tokens.
+        :return: Dict {token: state}; unknown tokens are missing.
+        """
+        tokens = list(tokens)
+        result = {}
+        with self._lock:
+            for start in range(0, len(tokens), 500):
+                chunk = tokens[start:start + 500]
+                rows = self._connection.execute(
+                    f'SELECT token, {", ".join(self.FIELDS)} FROM sessions '
+                    f'WHERE token IN ({", ".join("?" * len(chunk))})', chunk).fetchall()
+                result.update((row[0], self._row(row)) for row in rows)
+        return result
+
+    def get(self, token):
+        """
+        Read the state of a token.
+        :param token: Token.
+        :return: Dict or None.
+        """
+        return self.get_many([token]).get(token)
+
+    def put_storage(self, token, data, digest=None):
+        """
+        Store the Local Storage snapshot of a token.
+        :param token: Token.
+        :param data: Dict.
+        :param digest: Content hash of the snapshot.
+        :return: Self.
+        """
+        self.put_many([{'token': token, 'storage': data, 'storage_digest': digest}])
+        return self
+
+    def get_storage(self, token):
+        """
+        Read the Local Storage snapshot of a token.
+        :param token: Token.
+        :return: Dict or None.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT storage FROM sessions WHERE token = ?', (token,)).fetchone()
+        return load_snapshot(row[0]) if row and row[0] else None
+
+    def storage_digest(self, token):
+        """
+        Content hash of the stored Local Storage snapshot.
+        :param token: Token.
+        :return: Str or None.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT storage_digest FROM sessions WHERE token = ?', (token,)).fetchone()
+        return row[0] if row else None
+
+    def put_cookies(self, token, cookies):
+        """
+        Store the cookies of a token.
+        :param token: Token.
+        :param cookies: List of dicts.
+        :return: Self.
+        """
+        self.put_many([{'token': token, 'cookies': cookies}])
+        return self
+
+    def get_cookies(self, token):
+        """
+        Read the cookies of a token.
+        :param token: Token.
+        :return: List of dicts or None.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT cookies FROM sessions WHERE token = ?', (token,)).fetchone()
+        return load_snapshot(row[0]) if row and row[0] else None
+
+    def touch(self, token, metadata=None, when=None):
+        """
+        Record the activity of a token.
+        :param token: Token.
+        :param metadata: Dict merged in the metadata (optional).
+        :param when: Timestamp (default: now).
+        :return: Self.
+        """
+        item = {'token': token, 'last_activity': when or time()}
+        if metadata:
+            item['metadata'] = metadata
+        self.put_many([item])
+        return self
+
+    def active(self, hours=24.0, now=None):
+        """
+        Tokens active in the last hours, most recent first.
+        :param hours: Float.
+        :param now: Timestamp (default: now).
+        :return: List of tokens.
+        """
+        limit = (now or time()) - hours * 3600
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT token FROM sessions WHERE last_activity >= ? ORDER BY last_activity DESC', (limit,)).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, token):
+        """
+        Forget a token.
+        :param token: Token.
+        :return: Self.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM sessions WHERE token = ?', (token,))
+        return self
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+class SessionStoreMigrator:
+    """
+    Copy the per-token pickles ("<token>.profile" Local Storage snapshots and "cookies_<token>.pkl") to the store.
+    The file modification time becomes the last activity of the token.
+    """
+
+    def __init__(self, store, folder=None, batch_size=200):
+        """
+        :param store: SessionStore.
+        :param folder: Folder of the pickles (default: server/.temp).
+        :param batch_size: Tokens written per transaction.
+        """
+        self._store = store
+        self._folder = folder or os.path.join(settings.BASE_DIR, 'server', '.temp')
+        self._batch_size = batch_size
+
+    def _items(self):
+        """
+        Read the pickles.
+        :return: Dict {token: state}.
+        """
+        items = {}
+        files = [(name, 'storage', os.path.basename(name)[:-len('.profile')])
+                 for name in glob.glob(os.path.join(self._folder, '*.profile'))]
+        files += [(name, 'cookies', os.path.basename(name)[len('cookies_'):-len('.pkl')])
+                  for name in glob.glob(os.path.join(self._folder, 'cookies_*.pkl'))]
+        for name, field, token in files:
+            try:
+                with open(name, 'rb') as file:
+                    data = load_snapshot(file.read())
+            except Exception as e:
+                logger.warning(f'{name} could not be migrated: {e}')
+                continue
+            item = items.setdefault(token, {'token': token, 'last_activity': 0.0})
+            item[field] = data
+            item['last_activity'] = max(item['last_activity'], os.path.getmtime(name))
+        return items
+
+    def migrate(self):
+        """
+        Copy the pickles to the store. The pickles are kept.
+        :return: Int, number of tokens migrated.
+        """
+        items = list(self._items().values())
+        for start in range(0, len(items), self._batch_size):
+            self._store.put_many(items[start:start + self._batch_size])
+        logger.info(f'{len(items)} sessions migrated to {self._store.file_name}.')
+        return len(items)
+
+
+if __name__ == '__main__':
+    print(f'{SessionStoreMigrator(SessionStore(), *sys.argv[1:2]).migrate()} sessions migrated.')
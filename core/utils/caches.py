@@ -0,0 +1,75 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Caches Module
+"""
+from time import monotonic
+
+
+class TtlCache:
+    """
+    Values that expire a number of seconds after they were stored.
+    """
+
+    def __init__(self, ttl, clock=monotonic):
+        """
+        :param ttl: Seconds a value is kept (0 disables the cache).
+        :param clock: Callable returning the current time in seconds.
+        """
+        self._ttl = ttl
+        self._clock = clock
+        self._items = {}
+
+    def get(self, key, default=None):
+        """
+        Read a value that did not expire.
+        :param key: Key.
+        :param default: Value returned when the key is missing or expired.
+        :return: Value.
+        """
+        item = self._items.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires <= self._clock():
+            del self._items[key]
+            return default
+        return value
+
+    def set(self, key, value):
+        """
+        Store a value.
+        :param key: Key.
+        :param value: Value.
+        :return: Value.
+        """
+        if self._ttl > 0:
+            self._items[key] = (self._clock() + self._ttl, value)
+        return value
+
+    def pop(self, key):
+        """
+        Forget a value.
+        :param key: Key.
+        :return: None.
+        """
+        self._items.pop(key, None)
+
+    def clear(self):
+        """
+        Forget every value.
+        :return: None.
+        """
+        self._items.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        now = self._clock()
+        return sum(1 for expires, _ in self._items.values() if expires > now)
@@ -0,0 +1,95 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Consistent Hashing Module
+"""
+from bisect import bisect
+from hashlib import md5
+from threading import Lock
+
+
+class ConsistentHashRing:
+    """
+    Hash ring that maps keys to nodes. Adding or removing a node only moves the keys of the ring arcs it owns.
+    """
+
+    def __init__(self, nodes=(), replicas=160):
+        """
+        :param nodes: Initial nodes.
+        :param replicas: Virtual points of each node in the ring.
+        """
+        self._replicas = replicas
+        self._lock = Lock()
+        self._ring = {}
+        self._keys = []
+        self._nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        """
+        Position of a value in the ring.
+        :param value: String.
+        :return: Int.
+        """
+        return int.from_bytes(md5(value.encode()).digest()[:8], 'big')
+
+    @property
+    def nodes(self):
+        """
+        Nodes in the ring.
+        :return: Set.
+        """
+        with self._lock:
+            return set(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._nodes
+
+    def add(self, node):
+        """
+        Add a node to the ring.
+        :param node: Node name.
+        :return: Self.
+        """
+        with self._lock:
+            if node not in self._nodes:
+                self._nodes.add(node)
+                for replica in range(self._replicas):
+                    self._ring[self._hash(f'{node}#{replica}')] = node
+                self._keys = sorted(self._ring)
+        return self
+
+    def remove(self, node):
+        """
+        Remove a node from the ring.
+        :param node: Node name.
+        :return: Self.
+        """
+        with self._lock:
+            if node in self._nodes:
+                self._nodes.discard(node)
+                self._ring = {key: value for key, value in self._ring.items() if value != node}
+                self._keys = sorted(self._ring)
+        return self
+
+    def get(self, key):
+        """
+        Retrieve the node that owns a key.
+        :param key: Key string.
+        :return: Node name or None when the ring is empty.
+        """
+        with self._lock:
+            if not self._keys:
+                return None
+            index = bisect(self._keys, self._hash(key)) % len(self._keys)
+            return self._ring[self._keys[index]]
@@ -11,6 +11,7 @@ Generate Number Module
 from random import uniform
 from time import sleep
 
+from core import settings
 from core.utils.strategies import StrategyValueBase
 
 
@@ -56,3 +57,29 @@ class SleepRandom(GenerateNumber):
         """
         sleep(super(SleepRandom, self).execute()._value + self._delay)
         return self
+
+
+class HumanJitter(GenerateNumber):
+    """
+    Optional human-like pause between UI steps. It is a policy on top of the readiness waits, not a replacement for
+    them: with the default range (0, 0) it does not pause at all.
+    """
+
+    def __init__(self, end_number=settings.HUMAN_JITTER_MAX, start_number=settings.HUMAN_JITTER_MIN):
+        super().__init__(end_number=end_number, start_number=start_number)
+
+    @property
+    def enabled(self):
+        """
+        Check if the policy pauses.
+        :return: Bool.
+        """
+        return self._end_number > 0
+
+    def execute(self):
+        """
+        Method to perform the pause when the policy is enabled.
+        """
+        if self.enabled:
+            sleep(super(HumanJitter, self).execute()._value)
+        return self
@@ -0,0 +1,90 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Processes Memory Module
+"""
+import os
+
+from core.logs import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessTree:
+    """
+    Memory of the processes started by a process (the browsers and their drivers), read from /proc.
+    On systems without /proc the memory is reported as zero.
+    """
+    PROC_DIR = '/proc'
+
+    def __init__(self, pid=None):
+        """
+        :param pid: Root process id (default: this process).
+        """
+        self._pid = pid or os.getpid()
+
+    @classmethod
+    def available(cls):
+        """
+        Check if the memory can be measured in this system.
+        :return: Bool.
+        """
+        return os.path.isdir(cls.PROC_DIR) and os.path.isfile(os.path.join(cls.PROC_DIR, 'self', 'statm'))
+
+    @classmethod
+    def _parent_of(cls, pid):
+        """
+        Read the parent process id.
+        :param pid: Process id.
+        :return: Int or None when the process is gone.
+        """
+        try:
+            with open(os.path.join(cls.PROC_DIR, str(pid), 'stat')) as file:
+                return int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+
+    @classmethod
+    def rss_of(cls, pid):
+        """
+        Resident memory of one process.
+        :param pid: Process id.
+        :return: Bytes.
+        """
+        try:
+            with open(os.path.join(cls.PROC_DIR, str(pid), 'statm')) as file:
+                return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, IndexError, ValueError):
+            return 0
+
+    def descendants(self):
+        """
+        Every process below the root.
+        :return: List of process ids.
+        """
+        if not self.available():
+            return []
+        children = {}
+        for name in os.listdir(self.PROC_DIR):
+            if name.isdigit():
+                parent = self._parent_of(name)
+                if parent is not None:
+                    children.setdefault(parent, []).append(int(name))
+        result, stack = [], list(children.get(self._pid, []))
+        while stack:
+            pid = stack.pop()
+            result.append(pid)
+            stack.extend(children.get(pid, []))
+        return result
+
+    def rss(self):
+        """
+        Resident memory of every process below the root.
+        :return: Bytes.
+        """
+        return sum(self.rss_of(pid) for pid in self.descendants())
@@ -10,6 +10,8 @@ Main Application Module
 """
 import sys
 
+from apps.router_app import ZapRouterApp
+from apps.transports import Transport
 from apps.zap_server_app import ZapServerApp
 from core import settings
 from core.utils.classes import MessageConsole
@@ -27,18 +29,41 @@ class MainApplication:
         self.port = 8777
         self.adapter = None
         self.no_headless = False
+        self.restore = settings.SESSION_RESTORE
+        self.processes = settings.SESSION_PROCESSES
+        self.sessions_per_process = settings.SESSIONS_PER_PROCESS
+        self.transport = Transport(settings.SERVER_TRANSPORT)
+        self.backends = [backend for backend in settings.ROUTER_BACKENDS.split(',') if backend]
 
     def _start_message(self):
         self._con.show('Starting Zap Server...')
         return self
 
+    @staticmethod
+    def _get_option(args, name, default=None):
+        """
+        Retrieve the value of an option informed as "--name=value".
+        :param args: System arguments.
+        :param name: Option name.
+        :param default: Value when the option is missing.
+        :return: Str or default.
+        """
+        prefix = f'{name}='
+        for arg in args:
+            if isinstance(arg, str) and arg.startswith(prefix):
+                return arg[len(prefix):]
+        return default
+
     def _verify_args(self, *args):
         self._con.show('Verifying args...')
-        if len(args) <= 2:
+        positional = [arg for arg in args if not str(arg).startswith('--')]
+        if len(positional) <= 2:
             pass
         else:
-            self.host, self.port = args[1], int(args[2])
-        if len(args) != 3 and not ('--mock' in args or '--no-headless' in args):
+            self.host, self.port = positional[1], int(positional[2])
+        options = '--mock' in args or '--no-headless' in args or '--restore' in args or \
+            self._get_option(args, '--router')
+        if len(positional) != 3 and not options:
             self._con.show('To start the Zap Server use command: zap_server_app.py <host> <port>', file=sys.stderr)
             raise SystemExit(1)
         return self
@@ -57,6 +82,32 @@ class MainApplication:
             self._con.show('--no-headless')
         return self
 
+    def _is_restore_args(self, args):
+        self.restore = self.restore or '--restore' in args
+        if self.restore:
+            self._con.show('--restore')
+        return self
+
+    def _is_processes_args(self, args):
+        self.processes = int(self._get_option(args, '--processes', self.processes))
+        self.sessions_per_process = int(self._get_option(args, '--sessions-per-process', self.sessions_per_process))
+        if self.processes:
+            self._con.show(f'--processes={self.processes} --sessions-per-process={self.sessions_per_process}')
+        return self
+
+    def _is_transport_args(self, args):
+        self.transport = Transport(self._get_option(args, '--transport', self.transport.value))
+        self._con.show(f'--transport={self.transport.value}')
+        return self
+
+    def _is_router_args(self, args):
+        backends = self._get_option(args, '--router')
+        if backends:
+            self.backends = [backend for backend in backends.split(',') if backend]
+        if self.backends:
+            self._con.show(f'--router={",".join(self.backends)}')
+        return self
+
     def start(self, *args):
         """
         Start Server Application Instance and send args.
@@ -65,7 +116,8 @@ class MainApplication:
         """
         result = self if args else False
         if result:
-            self._start_message()._verify_args(*args)._is_mock_args(args)._is_no_headless(args)
+            self._start_message()._verify_args(*args)._is_mock_args(args)._is_no_headless(args)._is_restore_args(args)
+            self._is_processes_args(args)._is_router_args(args)._is_transport_args(args)
         return result
 
     def execute(self, server_cls):
@@ -73,12 +125,21 @@ class MainApplication:
         Execute the server application.
         :return: self
         """
-        if server_cls:
+        if server_cls and self.backends:
+            self._con.show('Starting router...')
+            ZapRouterApp(
+                address=(self.host, self.port),
+                authkey=settings.AUTH_KEY.encode(),
+                backends=self.backends, transport=self.transport
+            ).execute()
+        elif server_cls:
             self._con.show('Starting server...')
             server_cls(
                 address=(self.host, self.port),
                 authkey=settings.AUTH_KEY.encode(),
-                adapter=self.adapter, no_headless=self.no_headless
+                adapter=self.adapter, no_headless=self.no_headless,
+                processes=self.processes, sessions_per_process=self.sessions_per_process,
+                transport=self.transport, restore=self.restore
             ).execute()
         self._con.show('Ending server.')
         return self
@@ -0,0 +1,243 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Token Actors Module
+"""
+from concurrent.futures import Future
+from queue import Queue, Empty
+from threading import Lock, Thread
+from time import monotonic
+
+from core import settings
+from core.logs import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenActor:
+    """
+    Mailbox of a token: a FIFO queue and a dedicated thread that owns the token's CommandManager (and browser).
+    Commands of the same token run strictly one after the other, commands of different tokens run in parallel.
+    While its session is open, the actor takes a Local Storage snapshot once per snapshot interval, between commands or
+    while it waits for them.
+    """
+
+    def __init__(self, token, manager_factory, on_stop, snapshot_interval=settings.STORAGE_SNAPSHOT_INTERVAL):
+        """
+        :param token: User token.
+        :param manager_factory: Callable that creates the CommandManager inside the actor thread.
+        :param on_stop: Callable receiving (actor, pending items) when the actor stops.
+        :param snapshot_interval: Seconds between two Local Storage snapshots (0 disables).
+        """
+        self._token = token
+        self._manager_factory = manager_factory
+        self._on_stop = on_stop
+        self._snapshot_interval = snapshot_interval
+        self._snapshot_at = monotonic()
+        self._queue = Queue()
+        self._lock = Lock()
+        self._closed = False
+        self._outstanding = 0
+        self._evicting = False
+        self.last_activity = monotonic()
+        self._thread = Thread(target=self._run, name=f'zap-token-{token}', daemon=True)
+        self._thread.start()
+
+    @property
+    def token(self):
+        """
+        Token owned by the actor.
+        :return: Str.
+        """
+        return self._token
+
+    @property
+    def closed(self):
+        """
+        Whether the actor refuses new commands.
+        :return: Bool.
+        """
+        return self._closed
+
+    @property
+    def evicting(self):
+        """
+        Whether the actor was asked to release its session.
+        :return: Bool.
+        """
+        return self._evicting
+
+    @property
+    def idle(self):
+        """
+        Whether the actor is neither running nor holding commands.
+        :return: Bool.
+        """
+        return self._outstanding == 0
+
+    @property
+    def pending(self):
+        """
+        Number of commands waiting in the mailbox.
+        :return: Int.
+        """
+        return self._queue.qsize()
+
+    def submit(self, command, args, future=None):
+        """
+        Put a command in the mailbox.
+        :param command: Command name.
+        :param args: Command args.
+        :param future: Future to resolve (optional).
+        :return: Future or None when the actor is closed.
+        """
+        future = future or Future()
+        with self._lock:
+            if self._closed:
+                return None
+            self.last_activity = monotonic()
+            self._outstanding += 1
+            self._queue.put((future, command, args))
+        return future
+
+    def submit_many(self, items):
+        """
+        Put several commands in the mailbox, one right after the other.
+        :param items: List of (command, args).
+        :return: List of Futures or None when the actor is closed.
+        """
+        futures = [Future() for _ in items]
+        with self._lock:
+            if self._closed:
+                return None
+            self.last_activity = monotonic()
+            self._outstanding += len(items)
+            for future, (command, args) in zip(futures, items):
+                self._queue.put((future, command, args))
+        return futures
+
+    def evict(self):
+        """
+        Quit the session if the actor is idle. The session saves its state on "Quit" and the next command of the
+        token starts a new actor that restores it.
+        :return: Future of the "Quit" command or None when the actor is busy or closed.
+        """
+        with self._lock:
+            if self._closed or self._evicting or not self.idle:
+                return None
+            self._evicting = True
+            self._outstanding += 1
+            future = Future()
+            self._queue.put((future, 'Quit', None))
+        return future
+
+    def join(self, timeout=None):
+        """
+        Wait for the actor thread.
+        :param timeout: Seconds.
+        :return: Self.
+        """
+        self._thread.join(timeout=timeout)
+        return self
+
+    def _done(self):
+        """
+        Count a command as finished.
+        :return: None.
+        """
+        with self._lock:
+            self._outstanding -= 1
+
+    def _close(self):
+        """
+        Refuse new commands and collect the ones queued after the stop.
+        :return: List of pending items.
+        """
+        pending = []
+        with self._lock:
+            self._closed = True
+            try:
+                while True:
+                    pending.append(self._queue.get_nowait())
+            except Empty:
+                pass
+        return pending
+
+    @staticmethod
+    def _invoke(manager, command, args):
+        """
+        Run a command with the token's manager.
+        :param manager: CommandManager.
+        :param command: Command name.
+        :param args: Command args.
+        :return: Tuple (result, stop).
+        """
+        stop = False
+        try:
+            cmd = manager.parse_command(command, args)
+            try:
+                result = cmd.invoke().result
+            finally:
+                stop = cmd.name == 'Quit'
+        except Exception as e:
+            result = str(e)
+        return result, stop
+
+    def _snapshot(self, manager):
+        """
+        Take a Local Storage snapshot when the queue is empty and the interval elapsed.
+        :param manager: CommandManager.
+        :return: None.
+        """
+        if not self._snapshot_interval or manager is None or not self._queue.empty():
+            return
+        if monotonic() - self._snapshot_at >= self._snapshot_interval:
+            self._snapshot_at = monotonic()
+            self._invoke(manager, 'SaveStorage', None)
+
+    def _next_snapshot(self, manager):
+        """
+        Seconds the actor may wait for a command before the next snapshot is due.
+        :param manager: CommandManager.
+        :return: Float, or None to wait without limit.
+        """
+        if not self._snapshot_interval or manager is None:
+            return None
+        return max(0.0, self._snapshot_at + self._snapshot_interval - monotonic())
+
+    def _run(self):
+        """
+        Actor loop.
+        :return: None.
+        """
+        manager = None
+        stop = False
+        while not stop:
+            try:
+                future, command, args = self._queue.get(timeout=self._next_snapshot(manager))
+            except Empty:
+                self._snapshot(manager)
+                continue
+            if not future.set_running_or_notify_cancel():
+                self._done()
+                continue
+            try:
+                if manager is None:
+                    manager = self._manager_factory()
+                result, stop = self._invoke(manager, command, args)
+            except Exception as e:
+                logger.exception(e)
+                result = str(e)
+            finally:
+                self.last_activity = monotonic()
+            future.set_result(result)
+            self._done()
+            if not stop:
+                self._snapshot(manager)
+        del manager
+        self._on_stop(self, self._close())
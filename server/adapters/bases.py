@@ -346,6 +346,14 @@ class ManagerAdapterBase(metaclass=ABCMeta):
         """
         pass
 
+    @abstractmethod
+    def unread_chats(self):
+        """
+        Method for the chats that have unread messages and their counts.
+        :return:
+        """
+        pass
+
     @abstractmethod
     def get_driver(self):
         """
@@ -354,6 +362,22 @@ class ManagerAdapterBase(metaclass=ABCMeta):
         """
         pass
 
+    @abstractmethod
+    def memory_usage(self):
+        """
+        Method for the resident memory of the session browser.
+        :return:
+        """
+        pass
+
+    @abstractmethod
+    def save_storage(self):
+        """
+        Method to take a snapshot of the browser Local Storage.
+        :return:
+        """
+        pass
+
     @abstractmethod
     def quit(self):
         """
@@ -383,3 +407,11 @@ class PropertiesAdapterBase(metaclass=ABCMeta):
         :return: String 'true' ou 'false'.
         """
         pass
+
+    @abstractmethod
+    def restore(self):
+        """
+        This method opens the session, when it is closed, and checks if the main screen of whatsapp web is available.
+        :return: String 'true' ou 'false'.
+        """
+        pass
@@ -301,6 +301,13 @@ class ManagerAdapterWhatsApp(ManagerAdapterBase):
         """
         return self.wa_object.unread_usernames(scrolls=scrolls)
 
+    def unread_chats(self):
+        """
+        Method for the chats that have unread messages and their counts.
+        :return:
+        """
+        return self.wa_object.unread_chats()
+
     def get_driver(self):
         """
         Method to recover the drive (browser).
@@ -308,6 +315,20 @@ class ManagerAdapterWhatsApp(ManagerAdapterBase):
         """
         return self.wa_object.get_driver()
 
+    def memory_usage(self):
+        """
+        Method for the resident memory of the session browser.
+        :return:
+        """
+        return self.wa_object.memory_usage()
+
+    def save_storage(self):
+        """
+        Method to take a snapshot of the browser Local Storage.
+        :return:
+        """
+        return self.wa_object.save_storage()
+
     def quit(self):
         """
         Method to exit browser.
@@ -338,6 +359,13 @@ class PropertiesAdapterWhatsApp(PropertiesAdapterBase):
         """
         return self.wa_object.check_point()
 
+    def restore(self):
+        """
+        Open the session and return 'true' if whatsapp web main screen is available.
+        :return:
+        """
+        return self.wa_object.restore()
+
     def is_connected(self):
         """
         Check if you are connected with Whatsapp.
@@ -62,6 +62,13 @@ class MockWhatsapp:
             result = 'true'
         return result
 
+    def restore(self) -> str:
+        """
+        Opens the session and checks if the main screen of whatsapp web is available.
+        :return: string 'true' or 'false'
+        """
+        return self.check_point()
+
     @property
     def get_signin_qrcode(self) -> str:
         """
@@ -388,6 +395,14 @@ class MockWhatsapp:
         usernames = list(set(usernames))
         return usernames
 
+    @staticmethod
+    def unread_chats():
+        """
+        Chats with unread messages.
+        :return: Dict.
+        """
+        return {'User 1': 2, 'User 2': 1}
+
     @staticmethod
     def get_driver():
         """
@@ -407,6 +422,22 @@ class MockWhatsapp:
         messages = list()
         return messages
 
+    @staticmethod
+    def memory_usage():
+        """
+        Resident memory of the browser.
+        :return: Dict.
+        """
+        return {'processes': 0, 'rss_mb': 0.0, 'dense': False}
+
+    @staticmethod
+    def save_storage():
+        """
+        Snapshot of the Local Storage.
+        :return: Bool.
+        """
+        return True
+
     @staticmethod
     def quit():
         """
@@ -9,7 +9,6 @@ Aug 2021
 The First Selenium Whatsapp Adapter Module
 """
 import base64
-import datetime as dt
 import json
 import os
 import pickle
@@ -20,7 +19,6 @@ from time import sleep
 from urllib.parse import urlencode
 
 from PIL import Image
-from bs4 import BeautifulSoup
 from selenium.common.exceptions import NoSuchElementException, ElementNotVisibleException, \
     ElementClickInterceptedException
 from selenium.common.exceptions import TimeoutException
@@ -28,16 +26,20 @@ from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.alert import Alert
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support import expected_conditions as exp_cond
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
-from core.utils.browsers.classes import BrowserType
+from core.utils.browsers.classes import BaseBrowser, BrowserPool, BrowserType
 from core.utils.browsers.local_storage import LocalStorage
-from core.utils.numbers_gen import SleepRandom
+from core.utils.browsers.sessions import SessionStore
+from core import settings
+from core.utils.caches import TtlCache
+from core.utils.numbers_gen import HumanJitter
 from core.utils.qr_code.classes import QrCode
 from server.adapters.the_first.elements.drivers import DriveElements
 from server.adapters.the_first.exceptions import WhatsappElementChanged
+from server.adapters.the_first.scripts import DomExtractor, MutationWaiter, ParticipantExporter, QrCodeReader, \
+    TextComposer, UnreadTracker, WaitState
+from server.adapters.the_first.states import UiPanel, UiState, reset_ui_on_error
 from server.commands.groups.exceptions import InitialException, RenameGroupException, GotoMainException, \
     CreateGroupException, SetGroupPictureException, GetInviteLinkForGroupException, \
     OnlyAdminsChangeGroupDataException, OnlyAdminsSendMessagesException, AllUsersSendMessagesException, \
@@ -60,6 +62,7 @@ class WhatsApp:
         self._no_headless = no_headless
         self._token = token
         self._free_for_use = True
+        self._persistent = settings.BROWSER_PROFILES
         self.session = session
         self.emoji = {}
         self.timeout = wait
@@ -67,6 +70,16 @@ class WhatsApp:
         self.browser = None
         self.search_elements = None
         self.actions = None
+        self.waiter = None
+        self.composer = None
+        self.extractor = None
+        self.unread = None
+        self.participants = None
+        self.qr_reader = None
+        self._qr_image = None
+        self.participants_cache = TtlCache(settings.PARTICIPANTS_CACHE_TTL)
+        self.ui = UiState()
+        self.jitter = HumanJitter()
         logger.debug("WhatsApp Initialized")
 
     def __del__(self):
@@ -80,15 +93,16 @@ class WhatsApp:
         storage = LocalStorage(driver=self.browser, token=self._token, init_js=True)
         profile, exists = storage.load()
         if exists:
-            for key in profile:
-                storage.set(key, profile[key])
+            storage.set_many(profile)
         return self
 
     def _save_storage(self):
         """
-        Save Browser Local Storage.
+        Save Browser Local Storage. Persistent profiles keep it on disk by themselves.
         :return: Self.
         """
+        if self._persistent:
+            return self
 
         def execute(browser, token):
             """
@@ -107,13 +121,32 @@ class WhatsApp:
 
     def _get_cookies(self):
         """
-        Recovers cookies if file exists.
+        Recovers cookies if file exists (or from the SessionStore when it is enabled).
         :return: None.
         """
-        if self.driver.save_cookies and os.path.isfile(self.driver.cookies_file):
+        if not self.driver.save_cookies:
+            return
+        if settings.SESSION_STORE:
+            cookies = SessionStore().get_cookies(self._token) or []
+        elif os.path.isfile(self.driver.cookies_file):
             cookies = pickle.load(open(self.driver.cookies_file, 'rb'))
-            for cookie in cookies:
-                self.browser.add_cookie(cookie)
+        else:
+            cookies = []
+        for cookie in cookies:
+            self.browser.add_cookie(cookie)
+
+    def _touch(self, **metadata):
+        """
+        Record the activity of the token in the SessionStore, when it is enabled.
+        :param metadata: Values merged in the session metadata.
+        :return: Self.
+        """
+        if settings.SESSION_STORE and self._token:
+            try:
+                SessionStore().touch(self._token, metadata)
+            except Exception as e:
+                logger.warning(f'Session {self._token} could not be recorded: {e}')
+        return self
 
     def connect(self, screenshot=None):
         """
@@ -123,15 +156,43 @@ class WhatsApp:
         """
         logger.debug("Starting Firefox Browser")
         try:
-            self.driver = BrowserType.FIREFOX.new_instance(token=self._token, no_headless=self._no_headless)
+            replay = True
+            if self._persistent:
+                profile = BaseBrowser.profile_dir(self._token)
+                replay = not os.path.isdir(profile)
+                self.driver = BrowserType.FIREFOX.new_instance(
+                    token=self._token, no_headless=self._no_headless, session=profile)
+                warm = False
+            else:
+                self.driver = BrowserPool().acquire(token=self._token, no_headless=self._no_headless)
+                warm = self.driver is not None
+                if not warm:
+                    self.driver = BrowserType.FIREFOX.new_instance(token=self._token, no_headless=self._no_headless)
             self.browser = self.driver.browser
             self.actions = ActionChains(self.browser)
             self.search_elements = DriveElements(self.browser)
-            self.browser.set_window_size(1600, 1200)
-            self.browser.get("https://web.whatsapp.com/")
-            self._load_storage()._get_cookies()
+            self.waiter = MutationWaiter(self.browser)
+            self.composer = TextComposer(self.waiter)
+            self.extractor = DomExtractor(self.browser)
+            self.qr_reader = QrCodeReader(self.browser)
+            self.unread = UnreadTracker(self.waiter, lambda: self.search_elements.get_element_paths(
+                'chat_list', 'chat_list_item', 'chat_list_item_name', 'chat_list_item_unread'))
+            self.participants = ParticipantExporter(self.waiter, lambda: self.search_elements.get_element_paths(
+                'participants_dialog_list', 'participants_dialog_item', 'participants_dialog_item_name'))
+            self.ui.reset()
+            if not warm:
+                self.browser.set_window_size(1600, 1200)
+                self.browser.get("https://web.whatsapp.com/")
+            if replay:
+                self._load_storage()
+            self._get_cookies()
+            if warm:
+                # The pooled page booted without the session: reload it so the replayed login is picked up.
+                self.browser.refresh()
+                self._wait(lambda browser: browser.execute_script('return document.readyState') == 'complete')
         except Exception:
             raise InitialException()
+        self._touch(persistent=self._persistent, dense=self.driver.dense)
 
         if screenshot:
             self.browser.save_screenshot(screenshot)
@@ -171,15 +232,96 @@ class WhatsApp:
         :param time_out: Int.
         :return: Selenium Element.
         """
-        local_timeout = self.timeout
-        if time_out:
-            local_timeout = time_out
+        return self.wait_for_state(element_name, WaitState.PRESENT, time_out)
+
+    def wait_for_state(self, element_name, state, time_out=10, expected=None):
+        """
+        Wait inside the page for an element to reach a state, in a single WebDriver call.
+        :param element_name: Selenium Element Name.
+        :param state: WaitState.
+        :param time_out: Int (default: self.timeout).
+        :param expected: Regular expression (TEXT_MATCHES) or previous text (TEXT_CHANGED).
+        :return: Selenium Element (True for INVISIBLE).
+        """
+        locators = self.search_elements.get_presence_of_elements(element_name=element_name)
+        paths = [path for _, path in locators]
+        return self.waiter.wait(
+            locators[0], state, time_out or self.timeout, expected, fallbacks=locators[1:],
+            on_match=lambda index: self.search_elements.found(element_name, paths, index))
+
+    def _wait(self, condition, time_out=None):
+        """
+        Wait for a readiness condition, polling at the UI poll interval.
+        :param condition: Callable receiving the browser.
+        :param time_out: Seconds (default: self.timeout).
+        :return: The condition value.
+        """
+        return WebDriverWait(self.browser, time_out or self.timeout, poll_frequency=settings.UI_POLL_INTERVAL).until(
+            condition)
+
+    def wait_for_clickable(self, element_name, time_out=10):
+        """
+        Retrieve an element once it is visible and enabled.
+        :param element_name: Selenium Element Name.
+        :param time_out: Int.
+        :return: Selenium Element.
+        """
+        return self.wait_for_state(element_name, WaitState.CLICKABLE, time_out)
+
+    def wait_for_invisible(self, element_name, time_out=10):
+        """
+        Wait until an element is gone or hidden.
+        :param element_name: Selenium Element Name.
+        :param time_out: Int.
+        :return: Bool, False when the element is still visible after the timeout.
+        """
         try:
-            result = WebDriverWait(self.browser, local_timeout).until(exp_cond.presence_of_element_located(
-                self.get_presence_of_element(element_name=element_name)))
-        except NoSuchElementException:
-            raise WhatsappElementChanged(element=element_name)
-        return result
+            self.wait_for_state(element_name, WaitState.INVISIBLE, time_out)
+        except TimeoutException:
+            return False
+        return True
+
+    def wait_for_text(self, element_name, pattern=r'\S', time_out=10):
+        """
+        Wait until the text of an element matches the regular expression.
+        :param element_name: Selenium Element Name.
+        :param pattern: Regular expression (default: any text).
+        :param time_out: Int.
+        :return: Str with the text.
+        """
+        return self.wait_for_state(element_name, WaitState.TEXT_MATCHES, time_out, pattern).text
+
+    def wait_for_focus(self, element, time_out=5):
+        """
+        Wait until the element has the keyboard focus.
+        :param element: Selenium Element.
+        :param time_out: Int.
+        :return: Selenium Element.
+        """
+        script = 'return arguments[0] === document.activeElement || arguments[0].contains(document.activeElement);'
+        return self._wait(lambda browser: element if browser.execute_script(script, element) else False, time_out)
+
+    def wait_for_chat(self, name, time_out=10):
+        """
+        Wait until the header of the open chat shows the contact or group name.
+        :param name: Contact or Group Name.
+        :param time_out: Int.
+        :return: Selenium Element of the header title.
+        """
+        return self._wait(lambda browser: self._chat_title(name) or False, time_out)
+
+    def _chat_title(self, name):
+        """
+        Find the header title of the open chat when it shows the contact or group name.
+        :param name: Contact or Group Name.
+        :return: Selenium Element or None.
+        """
+        expected = name.strip().lower()
+        for title in self.browser.find_elements(*self.get_presence_of_element('chat_header_title')):
+            text = (title.get_attribute('title') or title.text or '').strip().lower()
+            if expected and expected in text:
+                return title
+        return None
 
     def check_point(self) -> str:
         """
@@ -197,13 +339,33 @@ class WhatsApp:
                     result = 'true'
         return result
 
+    def restore(self, time_out=None) -> str:
+        """
+        Opens the session, when it is closed, and waits for the main screen of whatsapp web. A session that needs the
+        QR-Code stays open showing it.
+        :param time_out: Seconds to wait for the main screen (default: settings.SESSION_RESTORE_TIMEOUT).
+        :return: String Bool, as check_point.
+        """
+        self._free_for_use = False
+        try:
+            if self.driver is None:
+                self.connect()
+            try:
+                self.wait_for_element('search_edit', time_out or settings.SESSION_RESTORE_TIMEOUT)
+            except TimeoutException:
+                pass
+        finally:
+            self._free_for_use = True
+        return self.check_point()
+
     def _retry_for_qr_code(self):
         """
         Performs a forced check by QR-Code.
         :return: Selenium Element.
         """
+        self.ui.reset()
         self.browser.refresh()
-        SleepRandom(end_number=3.0, start_number=2.5).execute()
+        self._wait(lambda browser: browser.execute_script('return document.readyState') == 'complete')
 
         max_attempt = 5
         attempt = 0
@@ -222,6 +384,17 @@ class WhatsApp:
                 attempt += 1
         return elem
 
+    def _qr_code_image(self, data):
+        """
+        Image of the QR-Code payload. Whatsapp Web keeps a payload for a few seconds, so the polling of the sign in
+        gets the image of the previous call.
+        :param data: Payload (str or bytes).
+        :return: String Base 64 (PNG).
+        """
+        if not self._qr_image or self._qr_image[0] != data:
+            self._qr_image = (data, QrCode(data=data).as_base64())
+        return self._qr_image[1]
+
     @property
     def get_signin_qrcode(self) -> str:
         """
@@ -243,11 +416,14 @@ class WhatsApp:
                     return elem
 
             if elem:
-                qr_code = Image.open(BytesIO(base64.b64decode(elem.screenshot_as_base64)))
+                data = self.qr_reader.read(elem)
+                if data is None:
+                    qr_code = Image.open(BytesIO(base64.b64decode(elem.screenshot_as_base64)))
+                    data = QrCode.decode_from_image(qr_code)['data']
                 file_name = f'qrcode_{secrets.token_hex(nbytes=8)}.png'
                 img = {
                     'file_name': file_name,
-                    'image': QrCode(data=QrCode.decode_from_image(qr_code)['data']).as_base64()
+                    'image': self._qr_code_image(data)
                 }
                 result = json.dumps(img, ensure_ascii=False)
         finally:
@@ -270,10 +446,12 @@ class WhatsApp:
         except Exception as e:
             print(e)
             if self.browser and refresh:
+                self.ui.reset()
                 self.browser.refresh()
             raise ConnectionLostException()
         return result
 
+    @reset_ui_on_error
     def send_message(self, name, message):
         """
         This method is used to send the message to the individual person or a group.
@@ -283,18 +461,24 @@ class WhatsApp:
         """
         try:
             self.access_search_panel(name)
-            send_msg = self.wait_for_element('send_message')
+            send_msg = self.wait_for_clickable('send_message')
             is_http = message.find('http') > -1
 
             messages = message.split("\n")
             send_msg.click()
-            for msg in messages:
-                self.actions.send_keys(msg).perform()
-                self.actions.send_keys(Keys.SHIFT + Keys.ENTER).perform()
+            self.wait_for_focus(send_msg)
+            if not self.composer.insert(send_msg, message):
+                for msg in messages:
+                    self.actions.send_keys(msg).perform()
+                    self.actions.send_keys(Keys.SHIFT + Keys.ENTER).perform()
             if is_http:
-                SleepRandom(end_number=3.0, start_number=2.0).execute()
+                try:
+                    self.wait_for_clickable('link_preview', time_out=3)
+                except TimeoutException:
+                    pass
+            self.jitter.execute()
             self.actions.send_keys(Keys.ENTER).perform()
-            SleepRandom(end_number=2.1, start_number=1.2).execute()
+            self.wait_for_text('send_message', '^$')
         except Exception as e:
             print(e)
             raise SendMessageException()
@@ -306,14 +490,20 @@ class WhatsApp:
         :param search_name: Contact or Group Name.
         :return: Self.
         """
-        search = self.get_element('search_edit')
+        if self.ui.is_chat_open(search_name) and self._chat_title(search_name):
+            logger.debug(f'Chat "{search_name}" is already open.')
+            return self
+        self.ui.reset()
+        search = self.wait_for_clickable('search_edit')
         search.click()
         self.actions.send_keys(" ").perform()
         self.actions.key_down(Keys.LEFT_CONTROL).key_down(Keys.SHIFT).send_keys(Keys.HOME).key_up(Keys.CONTROL).key_up(
             Keys.SHIFT).send_keys(Keys.BACK_SPACE).perform()
-        SleepRandom(end_number=1.1, start_number=0.7).execute()
+        self.wait_for_text('search_edit', '^$')
+        self.jitter.execute()
         self.actions.send_keys(search_name + Keys.ENTER).perform()
-        SleepRandom(end_number=2.1, start_number=1.1).execute()
+        self.wait_for_chat(search_name)
+        self.ui.open_chat(search_name)
         return self
 
     def access_group_panel(self):
@@ -321,6 +511,8 @@ class WhatsApp:
         Run Whatsapp Group Panel Access.
         :return: Self.
         """
+        if self.ui.panel == UiPanel.GROUP:
+            return self
         try:
             click_menu = self.wait_for_element('group_menu_button')
             click_menu.click()
@@ -331,7 +523,8 @@ class WhatsApp:
         except Exception as e:
             print(e)
             return None
-        SleepRandom(1.7).execute()
+        self.wait_for_clickable('group_close_panel_btn')
+        self.ui.open_panel(UiPanel.GROUP)
         return self
 
     def close_group_panel(self):
@@ -339,11 +532,13 @@ class WhatsApp:
         Close Whatsapp Group Panel.
         :return: Self.
         """
-        SleepRandom(0.7).execute()
-        close = self.get_element('group_close_panel_btn')
+        close = self.wait_for_clickable('group_close_panel_btn')
         close.click()
+        self.wait_for_invisible('group_close_panel_btn')
+        self.ui.close_panel()
         return self
 
+    @reset_ui_on_error
     def rename_group(self, old_name, new_name):
         """
         Run Whatsapp function to rename groups.
@@ -354,35 +549,37 @@ class WhatsApp:
         try:
             self.access_search_panel(old_name)
             self.access_group_panel()
-            rename_button = self.get_element('group_edit_button')
+            rename_button = self.wait_for_clickable('group_edit_button')
             rename_button.click()
-            SleepRandom(0.7).execute()
+            self._wait(lambda browser: browser.execute_script('return document.activeElement.isContentEditable;'))
             self.actions.send_keys(Keys.HOME).perform()
-            sleep(0.7)
             self.actions.key_down(Keys.LEFT_CONTROL).send_keys("a").key_up(Keys.CONTROL).send_keys(
                 Keys.BACK_SPACE).perform()
-            sleep(0.7)
-            self.actions.send_keys(Keys.HOME).perform()
-            sleep(0.7)
+            self._wait(lambda browser: not browser.execute_script('return document.activeElement.textContent;'))
+            self.jitter.execute()
             self.actions.send_keys(new_name + Keys.ENTER).perform()
+            self.participants_cache.pop(old_name)
+            self.participants_cache.pop(new_name)
             self.close_group_panel()
         except Exception as e:
             print(e)
             raise RenameGroupException()
         return True
 
+    @reset_ui_on_error
     def participants_count_for_group(self, group_name) -> int:
         """
         Count the number of participants for the group name provided.
         :param group_name: Group Name.
         :return: Int.
         """
+        participants = self.participants_cache.get(group_name)
+        if participants is not None:
+            return len(participants)
         try:
             self.access_search_panel(group_name)
             self.access_group_panel()
-            count_label = self.get_element('participants_selector')
-            SleepRandom(end_number=2.1, start_number=1.1).execute()
-            values = count_label.text.split(" ")
+            values = self.wait_for_text('participants_selector', r'\d').split(" ")
             result = int(values[-1])
             self.close_group_panel()
         except Exception as e:
@@ -390,22 +587,20 @@ class WhatsApp:
             raise GroupParticipantCountException()
         return result
 
+    @reset_ui_on_error
     def get_group_participants(self, group_name):
         """
         Get participants for the group name provided.
         :param group_name: Group Name.
         :return: List.
         """
+        participants = self.participants_cache.get(group_name)
+        if participants is not None:
+            return list(participants)
         self.access_search_panel(group_name)
         self.access_group_panel()
         try:
-            button_all_participants = WebDriverWait(self.driver.browser, 10).until(
-                EC.element_to_be_clickable((
-                    By.XPATH,
-                    "/html/body/div[1]/div/div[2]/div[5]/span/div/span/div/div/div/"
-                    "section/div[6]/div[2]/div[2]/div[2]"
-                ))
-            )
+            button_all_participants = self.wait_for_clickable('group_all_participants_button')
             self.driver.browser.execute_script("arguments[0].scrollIntoView(true);", button_all_participants)
             button_all_participants.click()
         except ElementClickInterceptedException:
@@ -416,25 +611,18 @@ class WhatsApp:
             return []
 
         try:
-            list_elements = WebDriverWait(self.driver.browser, 10).until(
-                EC.visibility_of_all_elements_located((
-                    By.CSS_SELECTOR,
-                    "span.ggj6brxn.gfz4du6o.r7fjleex.g0rxnol2.lhj4utae.le5p0ye3.l7jjieqr._11JPr"
-                ))
-            )
+            self.wait_for_state('participants_dialog_list', WaitState.VISIBLE)
         except TimeoutException:
             print("Os elementos dos participantes não ficaram visíveis após 10 segundos.")
             return []
 
-        result = [element.text for element in list_elements]
-        sleep(1)
-        button_close = self.driver.browser.find_element(
-            by=By.XPATH,
-            value="/html/body/div[1]/div/span[2]/div/span/div/div/div/div/div/div/header/div/div[1]/div"
-        )
+        result = self.participants.export() or []
+        button_close = self.wait_for_clickable('participants_dialog_close')
         button_close.click()
-        sleep(1)
+        self.wait_for_invisible('participants_dialog_close')
         self.close_group_panel()
+        if result:
+            self.participants_cache.set(group_name, tuple(result))
         return result
 
     def goto_main(self):
@@ -442,11 +630,11 @@ class WhatsApp:
         Go to Whatsapp main page.
         :return: None.
         """
+        self.ui.reset()
         try:
             self.browser.refresh()
             Alert(self.browser).accept()
-            self.wait_for_element('search_edit')
-            SleepRandom(1.9, 1.1).execute()
+            self.wait_for_clickable('search_edit')
         except Exception as e:
             print(e)
             raise GotoMainException()
@@ -471,15 +659,12 @@ class WhatsApp:
             return None
         try:
             self.wait_for_element('status_css_selector')
-            status = self.get_element('status_css_selector').text
-            for i in range(10):
-                if len(status) > 0:
-                    return status
-                else:
-                    sleep(1)  # we need some delay
-            return "None"
         except TimeoutException:
             raise TimeoutError(self._TIMEOUT_EXCEPTION_TEXT)
+        try:
+            return self.wait_for_text('status_css_selector')
+        except TimeoutException:
+            return "None"
         except NoSuchElementException:
             return "None"
         except Exception as e:
@@ -494,21 +679,15 @@ class WhatsApp:
         :param timeout: Int.
         :return: Str.
         """
-        _ = timeout
         self.access_search_panel(name)
-        start_time = dt.datetime.now()
         try:
             self.wait_for_element('last_seen')
-            while True:
-                last_seen = self.get_element('last_seen').text
-                if last_seen and "click here" not in last_seen:
-                    return last_seen
-                end_time = dt.datetime.now()
-                elapsed_time = (end_time - start_time).seconds
-                if elapsed_time > 10:
-                    return None
         except TimeoutException:
             raise TimeoutError(self._TIMEOUT_EXCEPTION_TEXT)
+        try:
+            return self.wait_for_text('last_seen', r'^(?![\s\S]*click here)[\s\S]*\S', time_out=timeout)
+        except TimeoutException:
+            return None
         except NoSuchElementException:
             return None
         except Exception as e:
@@ -523,16 +702,18 @@ class WhatsApp:
         """
         try:
             send_msg = self.wait_for_element('send_message')
-            messages = message.split("\n")
-            for msg in messages:
-                send_msg.send_keys(msg)
-                send_msg.send_keys(Keys.SHIFT + Keys.ENTER)
+            if not self.composer.insert(send_msg, message):
+                messages = message.split("\n")
+                for msg in messages:
+                    send_msg.send_keys(msg)
+                    send_msg.send_keys(Keys.SHIFT + Keys.ENTER)
             send_msg.send_keys(Keys.ENTER)
             return True
         except Exception as e:
             print(e)
             return False
 
+    @reset_ui_on_error
     def send_picture(self, name, picture_location, caption=None):
         """
         Send a Picture to contact or group.
@@ -543,24 +724,25 @@ class WhatsApp:
         """
         self.access_search_panel(name)
         try:
-            attach_btn = self.get_element('attach')
+            attach_btn = self.wait_for_clickable('attach')
             attach_btn.click()
-            SleepRandom(end_number=1.5, start_number=1.1).execute()
-            attach_img_btn = self.get_element('picture_attach_type')
+            self.ui.open_modal('attach')
+            attach_img_btn = self.wait_for_element('picture_attach_type')
             attach_img_btn.send_keys(picture_location)
-            SleepRandom(end_number=1.5, start_number=1.1).execute()
+            send_btn = self.wait_for_clickable('send_file')
             if caption:
-                send_caption = self.get_element('picture_caption')
+                send_caption = self.wait_for_clickable('picture_caption')
                 send_caption.send_keys(caption)
-                SleepRandom(end_number=0.9, start_number=0.1).execute()
+                self.jitter.execute()
 
-            send_btn = self.get_element('send_file')
             send_btn.click()
-            SleepRandom(end_number=1.5, start_number=1.1).execute()
+            if self.wait_for_invisible('send_file'):
+                self.ui.close_modal()
 
         except (NoSuchElementException, ElementNotVisibleException) as e:
             print(str(e))
 
+    @reset_ui_on_error
     def send_document(self, name, document_location):
         """
         Send a document to a contact or group.
@@ -570,19 +752,21 @@ class WhatsApp:
         """
         try:
             self.access_search_panel(name)
-            attach_btn = self.get_element('attach')
+            attach_btn = self.wait_for_clickable('attach')
             attach_btn.click()
-            SleepRandom(end_number=1.5, start_number=1.1).execute()
-            attach_img_btn = self.get_element('document_attach_type')
+            self.ui.open_modal('attach')
+            attach_img_btn = self.wait_for_element('document_attach_type')
             attach_img_btn.send_keys(document_location)
-            SleepRandom(end_number=1.5, start_number=1.1).execute()
-            send_btn = self.wait_for_element('send_document_attach_button')
+            send_btn = self.wait_for_clickable('send_document_attach_button')
+            self.jitter.execute()
             send_btn.click()
-            SleepRandom(end_number=1.5, start_number=1.1).execute()
+            if self.wait_for_invisible('send_document_attach_button'):
+                self.ui.close_modal()
         except Exception as e:
             print(e)
             raise SendDocumentException()
 
+    @reset_ui_on_error
     def clear_chat(self, name):
         """
         Clear the chat.
@@ -636,9 +820,11 @@ class WhatsApp:
             print("Couldn't find the URL to the image")
         else:
             img_src_url = img.get_attribute('src')
+            self.ui.reset()
             self.browser.get(img_src_url)
             self.browser.save_screenshot(name + "_img.png")
 
+    @reset_ui_on_error
     def create_group(self, group_name, members, picture_location=None):
         """
         Create a new Whatsapp group.
@@ -648,19 +834,18 @@ class WhatsApp:
         :return: Bool.
         """
         try:
-            bt = self.wait_for_element('group_menu_button')
+            bt = self.wait_for_clickable('group_menu_button')
             bt.click()
-            SleepRandom(1.9, 1.1).execute()
-            new_button = self.wait_for_element('new_group_button')
+            new_button = self.wait_for_clickable('new_group_button')
             new_button.click()
-            SleepRandom(1.2, 0.7).execute()
             for member in members:
-                contact_name = self.get_element('group_contact_name')
+                contact_name = self.wait_for_clickable('group_contact_name')
                 contact_name.send_keys(member + Keys.ENTER)
-                SleepRandom(1.9, 1.1).execute()
-            next_step = self.get_element('create_group_next_step')
+                self.wait_for_text('group_contact_name', '^$')
+                self.jitter.execute()
+            next_step = self.wait_for_clickable('create_group_next_step')
             next_step.click()
-            SleepRandom(1.9, 1.1).execute()
+            self.wait_for_clickable('create_group_edit')
 
             if picture_location:
                 try:
@@ -668,15 +853,19 @@ class WhatsApp:
                 except Exception as e:
                     print(e)
 
-            group_text = self.get_element('create_group_edit')
+            group_text = self.wait_for_clickable('create_group_edit')
             group_text.send_keys(group_name + Keys.ENTER)
-            SleepRandom(1.9, 1.1).execute()
+            self.participants_cache.pop(group_name)
+            self.wait_for_chat(group_name)
+            self.ui.open_chat(group_name)
         except Exception as e:
             print(e)
+            self.ui.reset()
             self.browser.refresh()
             raise CreateGroupException()
         return True
 
+    @reset_ui_on_error
     def set_group_picture(self, group_name, picture_location):
         """
         Method to change the image of a group.
@@ -687,11 +876,13 @@ class WhatsApp:
         try:
             self._goto_group_data(group_name)
             self._change_group_image(picture_location)
-            btn = self.get_element('group_settings_exit_button')
+            btn = self.wait_for_clickable('group_settings_exit_button')
             btn.click()
-            SleepRandom(0.9).execute()
+            self.wait_for_invisible('group_settings_exit_button')
+            self.ui.close_panel()
         except Exception as e:
             print(e)
+            self.ui.reset()
             self.browser.refresh()
             raise SetGroupPictureException()
         return True
@@ -707,16 +898,14 @@ class WhatsApp:
         if create:
             elem = 'group_create_image_button'
 
-        SleepRandom(0.5, 0.3).execute()
         img = self.wait_for_element(elem)
         img.send_keys(picture_location)
-        SleepRandom(0.9).execute()
-        zoom_out = self.wait_for_element('group_zoom_out')
+        zoom_out = self.wait_for_clickable('group_zoom_out')
         for i in range(0, 5):
             zoom_out.click()
-        button_save = self.wait_for_element('group_image_save_button')
+        button_save = self.wait_for_clickable('group_image_save_button')
         button_save.click()
-        SleepRandom(0.9).execute()
+        self.wait_for_invisible('group_image_save_button')
 
     def join_group(self, invite_link):
         """
@@ -725,6 +914,7 @@ class WhatsApp:
         :param invite_link: URL Link.
         :return: None.
         """
+        self.ui.reset()
         self.browser.get(invite_link)
         try:
             Alert(self.browser).accept()
@@ -735,6 +925,7 @@ class WhatsApp:
         self.wait_for_element('group_join')
         self.get_element('group_join').click()
 
+    @reset_ui_on_error
     def get_invite_link_for_group(self, group_name):
         """
         Retrieves the invitation link for the group.
@@ -743,10 +934,9 @@ class WhatsApp:
         """
         try:
             self._goto_group_data(group_name=group_name)
-            link_button = self.wait_for_element('group_link_button')
+            link_button = self.wait_for_clickable('group_link_button')
             link_button.click()
-            SleepRandom(0.9).execute()
-            link = self.wait_for_element('group_invite_link_anchor').text
+            link = self.wait_for_text('group_invite_link_anchor', 'http')
             self.close_group_panel()
             self.exit_group_panel()
         except Exception as e:
@@ -766,12 +956,15 @@ class WhatsApp:
         :return: None.
         """
         self.access_search_panel(group_name)
-        SleepRandom(0.9).execute()
-        self.get_element('group_menu').click()
-        SleepRandom(0.9).execute()
-        data_button = self.wait_for_element('group_data_button')
+        if self.ui.panel == UiPanel.GROUP_SETTINGS:
+            self._exit_group_settings()
+        if self.ui.panel == UiPanel.GROUP_DATA:
+            return
+        self.wait_for_clickable('group_menu').click()
+        data_button = self.wait_for_clickable('group_data_button')
         data_button.click()
-        SleepRandom(0.9).execute()
+        self.wait_for_invisible('group_data_button')
+        self.ui.open_panel(UiPanel.GROUP_DATA)
 
     def _goto_group_settings(self, group_name):
         """
@@ -780,19 +973,20 @@ class WhatsApp:
         :return: None.
         """
         self._goto_group_data(group_name=group_name)
-        self.wait_for_element('group_settings').click()
-        SleepRandom(0.5).execute()
+        self.wait_for_clickable('group_settings').click()
+        self.ui.open_panel(UiPanel.GROUP_SETTINGS)
 
     def _exit_group_settings(self):
         """
         Exit group settings.
         :return: None.
         """
-        SleepRandom(0.9).execute()
-        button_1 = self.wait_for_element('group_settings_exit_button')
+        button_1 = self.wait_for_clickable('group_settings_exit_button')
         button_1.click()
-        SleepRandom(0.9).execute()
+        self.wait_for_invisible('group_settings_exit_button')
+        self.ui.open_panel(UiPanel.GROUP_DATA)
 
+    @reset_ui_on_error
     def only_admins_change_group_data(self, group_name):
         """
         Only administrators change group data.
@@ -801,12 +995,10 @@ class WhatsApp:
         """
         try:
             self._goto_group_settings(group_name=group_name)
-            edit_group_data = self.wait_for_element('group_settings_edit_group_data')
+            edit_group_data = self.wait_for_clickable('group_settings_edit_group_data')
             edit_group_data.click()
-            SleepRandom(0.5).execute()
-            self.wait_for_element('group_settings_edit_group_data_only_admins').click()
-            SleepRandom(0.7).execute()
-            button = self.get_element('group_settings_edit_group_data_confirm_button')
+            self.wait_for_clickable('group_settings_edit_group_data_only_admins').click()
+            button = self.wait_for_clickable('group_settings_edit_group_data_confirm_button')
             button.click()
             self._exit_group_settings()
             self.exit_group_panel()
@@ -820,6 +1012,7 @@ class WhatsApp:
             raise OnlyAdminsChangeGroupDataException()
         return True
 
+    @reset_ui_on_error
     def all_users_change_group_data(self, group_name):
         """
         All users can change group data.
@@ -830,6 +1023,7 @@ class WhatsApp:
         _, _ = self, group_name
         return False
 
+    @reset_ui_on_error
     def only_admins_send_messages(self, group_name):
         """
         Only administrators send messages.
@@ -838,11 +1032,9 @@ class WhatsApp:
         """
         try:
             self._goto_group_settings(group_name=group_name)
-            self.wait_for_element('group_settings_send_messages').click()
-            SleepRandom(0.5).execute()
-            self.wait_for_element('group_settings_send_messages_only_admins').click()
-            SleepRandom(0.7).execute()
-            button = self.get_element('group_settings_send_messages_confirm_button')
+            self.wait_for_clickable('group_settings_send_messages').click()
+            self.wait_for_clickable('group_settings_send_messages_only_admins').click()
+            button = self.wait_for_clickable('group_settings_send_messages_confirm_button')
             button.click()
             self._exit_group_settings()
             self.exit_group_panel()
@@ -864,10 +1056,13 @@ class WhatsApp:
         try:
             button = self.get_element('group_exit_info')
             button.click()
+            self.ui.close_panel()
         except Exception as e:
             print(e)
+            self.ui.reset()
         return self
 
+    @reset_ui_on_error
     def all_users_send_messages(self, group_name):
         """
         All users can send messages.
@@ -876,11 +1071,9 @@ class WhatsApp:
         """
         try:
             self._goto_group_settings(group_name=group_name)
-            self.wait_for_element('group_settings_send_messages').click()
-            SleepRandom(0.5).execute()
-            self.wait_for_element('group_settings_send_messages_all_participants').click()
-            SleepRandom(0.7).execute()
-            button = self.get_element('group_settings_send_messages_confirm_button')
+            self.wait_for_clickable('group_settings_send_messages').click()
+            self.wait_for_clickable('group_settings_send_messages_all_participants').click()
+            button = self.wait_for_clickable('group_settings_send_messages_confirm_button')
             button.click()
             self._exit_group_settings()
             self.exit_group_panel()
@@ -894,6 +1087,7 @@ class WhatsApp:
             raise AllUsersSendMessagesException()
         return True
 
+    @reset_ui_on_error
     def exit_group(self, group_name):
         """
         Leave a group.
@@ -903,11 +1097,11 @@ class WhatsApp:
         """
         self.access_search_panel(group_name)
         self.get_element('group_menu').click()
-        self.wait_for_element('group_leave')
-        sleep(3)
-        self.get_element('group_leave').click()
+        self.wait_for_clickable('group_leave').click()
         button = self.wait_for_element('group_leave_button')
         button.click()
+        self.participants_cache.pop(group_name)
+        self.ui.reset()
 
     def send_anon_message(self, phone, text):
         """
@@ -918,20 +1112,20 @@ class WhatsApp:
         :return: None.
         """
         payload = urlencode({"phone": phone, "text": text, "source": "", "data": ""})
+        self.ui.reset()
         self.browser.get("https://api.whatsapp.com/send?" + payload)
         try:
             Alert(self.browser).accept()
         except Exception as e:
             print(e)
-        WebDriverWait(self.browser, self.timeout).until(
-            exp_cond.presence_of_element_located((By.CSS_SELECTOR, "#action-button")))
-        send_message = self.browser.find_element_by_css_selector("#action-button")
+        send_message = self.waiter.wait((By.CSS_SELECTOR, "#action-button"), WaitState.CLICKABLE, self.timeout)
         send_message.click()
-        confirm = WebDriverWait(self.browser, self.timeout + 5).until(exp_cond.presence_of_element_located(
-            (By.XPATH, "/html/body/div/div/div/div[4]/div/footer/div[1]/div[2]/div/div[2]")))
+        confirm = self.waiter.wait(
+            (By.XPATH, "/html/body/div/div/div/div[4]/div/footer/div[1]/div[2]/div/div[2]"), time_out=self.timeout + 5)
         confirm.clear()
         confirm.send_keys(text + Keys.ENTER)
 
+    @reset_ui_on_error
     def is_message_present(self, username, message):
         """
         Checks if a message exists in the contact's chat.
@@ -941,18 +1135,19 @@ class WhatsApp:
         :return: Bool.
         """
         self.access_search_panel(username)
-        search_bar = WebDriverWait(self.browser, self.timeout).until(exp_cond.presence_of_element_located(
-            (By.CSS_SELECTOR, "._1i0-u > div:nth-child(1) > div:nth-child(1) > div:nth-child(1) > span:nth-child(1)")))
+        search_bar = self.waiter.wait(
+            (By.CSS_SELECTOR, "._1i0-u > div:nth-child(1) > div:nth-child(1) > div:nth-child(1) > span:nth-child(1)"),
+            time_out=self.timeout)
         search_bar.click()
         message_search = self.browser.find_element_by_css_selector(
             "._1iopp > div:nth-child(1) > label:nth-child(4) > input:nth-child(1)")
         message_search.clear()
         message_search.send_keys(message + Keys.ENTER)
         try:
-            WebDriverWait(self.browser, self.timeout).until(exp_cond.presence_of_element_located(
+            self.waiter.wait(
                 (By.XPATH,
                  "/html/body/div[1]/div/div/div[2]/div[3]/span/div/div/div[2]/div/div/div/div/div[1]/div/div/div/" +
-                 "div[2]/div[1]/span/span/span")))
+                 "div[2]/div[1]/span/span/span"), time_out=self.timeout)
             return True
         except TimeoutException:
             return False
@@ -974,27 +1169,25 @@ class WhatsApp:
         chains.send_keys(Keys.ENTER)
         chains.perform()
         sleep(delay)
-        messages = self.browser.find_elements_by_class_name("MS-DH")
-        for message in messages:
+        messages = self.extractor.extract(".MS-DH", {
+            '_from': ("span._1qUQi", "title"),
+            'to': ("div.copyable-text", "data-pre-plain-text"),
+            'text': ("span.selectable-text.invisible-space.copyable-text", None),
+        }, with_element=True)
+        for item in messages:
             try:
-                message_html = message.get_attribute("innerHTML")
-                soup = BeautifulSoup(message_html, "html.parser")
-                _from = soup.find("span", class_="_1qUQi")["title"]
-                to = soup.find("div", class_="copyable-text")["data-pre-plain-text"]
-                message_text = soup.find("span", class_="selectable-text invisible-space copyable-text").text
-                message.click()
+                _from, to, message_text = item['_from'], item['to'], item['text']
+                if None in (_from, to, message_text):
+                    raise ValueError('Starred message without sender, recipient or text.')
+                item['element'].click()
                 selector = self.browser.find_element_by_css_selector(
                     "#main > header > div._5SiUq > div._16vzP > div > span")
                 title = selector.text
                 selector.click()
-                sleep(2)
-                WebDriverWait(self.browser, 5).until(exp_cond.presence_of_element_located(
+                phone = self.waiter.wait(
                     (By.CSS_SELECTOR,
                      "div._14oqx:nth-child(3) > div:nth-child(1) > div:nth-child(1) > span:nth-child(1) > " +
-                     "span:nth-child(1)")))
-                phone = self.browser.find_element_by_css_selector(
-                    "div._14oqx:nth-child(3) > div:nth-child(1) > div:nth-child(1) > span:nth-child(1) > " +
-                    "span:nth-child(1)").text
+                     "span:nth-child(1)"), WaitState.TEXT_MATCHES, 5).text
                 if title in _from:
                     _from = _from.replace(title, phone)
                 else:
@@ -1007,23 +1200,35 @@ class WhatsApp:
     def unread_usernames(self, scrolls=100):
         """
         Check unread messages.
-        TODO: Adjust this method.
-        :param scrolls: Int.
-        :return: Str.
+        :param scrolls: Not used, the whole chat list is read once and then followed.
+        :return: List.
         """
-        self.goto_main()
-        initial = 10
-        usernames = []
-        for j in range(0, scrolls):
-            self.browser.execute_script("document.getElementById('pane-side').scrollTop={}".format(initial))
-            soup = BeautifulSoup(self.browser.page_source, "html.parser")
-            for i in soup.find_all("div", class_="_2WP9Q"):
-                if i.find("div", class_="_1ZMSM"):
-                    username = i.find("div", class_="_3H4MS").text
-                    usernames.append(username)
-            initial += 10
-        usernames = list(set(usernames))
-        return usernames
+        _ = scrolls
+        return list(self.unread_chats())
+
+    def unread_chats(self):
+        """
+        Chats with unread messages, from the index kept by the unread tracker.
+        :return: Dict {name: unread count}.
+        """
+        return self.unread.unread()
+
+    def memory_usage(self):
+        """
+        Resident memory of the browser of the session.
+        :return: Dict {'processes': Int, 'rss_mb': Float, 'dense': Bool} or None when it cannot be measured.
+        """
+        return self.driver.memory_usage() if self.driver else None
+
+    def save_storage(self):
+        """
+        Take a snapshot of the Local Storage; it is written in background, only when it changed.
+        :return: Bool, False when there is nothing to save.
+        """
+        if self._persistent or not self.browser:
+            return False
+        self._save_storage()._touch()
+        return True
 
     def get_driver(self):
         """
@@ -1032,6 +1237,7 @@ class WhatsApp:
         """
         return self.browser
 
+    @reset_ui_on_error
     def get_last_message_for(self, name):
         """
         Get Last Message from a Contact.
@@ -1041,24 +1247,45 @@ class WhatsApp:
         """
         messages = list()
         self.access_search_panel(name)
-        sleep(3)
-        soup = BeautifulSoup(self.browser.page_source, "html.parser")
-        for i in soup.find_all("div", class_="FTBzM message-in"):
-            message = i.find("div", class_="_12pGw")
-            if message:
-                messages.append(message.text)
+        rows = self.get_presence_of_element('message_in')
+        _, text = self.get_presence_of_element('message_in_text')
+        try:
+            self.wait_for_state('message_in', WaitState.VISIBLE)
+        except TimeoutException:
+            logger.debug(f'No message received from "{name}".')
+            return messages
+        # The rows are rendered in batches: extract once a poll finds as many as the previous one.
+        counts = [-1]
+
+        def rows_rendered(browser):
+            counts.append(len(browser.find_elements(*rows)))
+            return counts[-1] == counts[-2]
+
+        self._wait(rows_rendered)
+        for item in self.extractor.extract(rows[1], {'text': (text, None)}):
+            messages.append(item['text'])
         messages = list(filter(None, messages))
         return messages
 
     def quit(self):
         """
-        Close the Browser and Save Local Storage Info.
+        Save Local Storage Info and give the Browser back to the pool, or close it.
+        Browsers with a persistent profile are closed, which writes the profile to disk.
         :return: Bool.
         """
         result = False
         if self.browser:
-            self._save_storage()
-            self.browser.quit()
+            self._save_storage()._touch()
+            if self._persistent:
+                self.driver.close()
+            else:
+                BrowserPool().release(self.driver)
+            self.waiter = None
+            self.composer = None
+            self.extractor = None
+            self.unread = None
+            self.participants = None
             self.browser = None
+            self.driver = None
             result = True
         return result
@@ -304,3 +304,68 @@ class OpenProfilePicture(AbstractElementData):
 class ProfileImage(AbstractElementData):
     """Representa a imagem do perfil."""
     path: str = '//*[@id="app"]/div/span[2]/div/div/div[2]/div/div/div/div/img'
+
+
+class ChatHeaderTitle(AbstractElementData):
+    """Representa o título do chat aberto, com o nome do contato ou grupo."""
+    path: str = '//*[@id="main"]/header//span[@dir="auto"]'
+
+
+class LinkPreview(AbstractElementData):
+    """Representa a prévia de link exibida acima do campo de mensagem."""
+    path: str = '//*[@id="main"]/footer//div[@role="button" and .//img]'
+
+
+class ChatList(AbstractElementData):
+    """Representa o painel lateral com a lista de chats."""
+    path: str = '#pane-side'
+
+
+class ChatListItem(AbstractElementData):
+    """Representa um chat da lista de chats."""
+    path: str = '#pane-side div[role="listitem"]'
+
+
+class ChatListItemName(AbstractElementData):
+    """Representa o nome do contato ou grupo dentro de um item da lista de chats."""
+    path: str = 'span[dir="auto"][title]'
+
+
+class ChatListItemUnread(AbstractElementData):
+    """Representa o contador de mensagens não lidas dentro de um item da lista de chats."""
+    path: str = 'span[aria-label*="unread" i], span[aria-label*="não lida" i]'
+
+
+class GroupAllParticipantsButton(AbstractElementData):
+    """Representa o botão que abre a lista de todos os participantes do grupo."""
+    path: str = "/html/body/div[1]/div/div[2]/div[5]/span/div/span/div/div/div/section/div[6]/div[2]/div[2]/div[2]"
+
+
+class ParticipantsDialogList(AbstractElementData):
+    """Representa a lista de participantes na janela de todos os participantes."""
+    path: str = 'div[data-animate-modal-body="true"] div[role="list"], div[data-animate-modal-body="true"]'
+
+
+class ParticipantsDialogItem(AbstractElementData):
+    """Representa um participante na janela de todos os participantes."""
+    path: str = 'div[role="listitem"], div[role="button"]'
+
+
+class ParticipantsDialogItemName(AbstractElementData):
+    """Representa o nome de um participante na janela de todos os participantes."""
+    path: str = 'span[dir="auto"][title], span._11JPr'
+
+
+class ParticipantsDialogClose(AbstractElementData):
+    """Representa o botão de fechar a janela de todos os participantes."""
+    path: str = "/html/body/div[1]/div/span[2]/div/span/div/div/div/div/div/div/header/div/div[1]/div"
+
+
+class MessageIn(AbstractElementData):
+    """Representa uma mensagem recebida no chat aberto."""
+    path: str = 'div.FTBzM.message-in'
+
+
+class MessageInText(AbstractElementData):
+    """Representa o texto dentro de uma mensagem recebida."""
+    path: str = 'div._12pGw'
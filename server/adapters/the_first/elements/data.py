@@ -11,6 +11,7 @@ Selenium Data Elements Module
 
 import os
 import pickle
+import tempfile
 
 from core import settings
 from server.adapters.the_first.elements.classes import *
@@ -21,10 +22,18 @@ class ManagerElementsData:
     Whatsapp elements data manager.
     """
 
-    def __init__(self):
-        self._file_name = settings.ELEMENTS_DATA_FILE
+    def __init__(self, file_name=None):
+        self._file_name = file_name or settings.ELEMENTS_DATA_FILE
         self._data = self._get()
 
+    @property
+    def file_name(self):
+        """
+        Property that returns the data file.
+        :return: Str.
+        """
+        return self._file_name
+
     @property
     def data(self):
         """
@@ -35,20 +44,47 @@ class ManagerElementsData:
 
     def load(self):
         """
-        Method for loading data from file.
+        Method for loading data from file. Elements missing in the file keep their default paths.
+        :return: Self.
+        """
+        with open(self._file_name, 'rb') as file:
+            data = pickle.load(file)
+        self._data = {**self._get(), **{key: value for key, value in data.items() if self._is_path(value)}}
+        return self
+
+    @staticmethod
+    def _is_path(value):
+        """
+        Check a value of the file: a path or a fallback chain (list of paths tried in order).
+        :param value: Value.
+        :return: Bool.
+        """
+        if isinstance(value, (list, tuple)):
+            return bool(value) and all(isinstance(item, str) and item for item in value)
+        return isinstance(value, str) and bool(value)
+
+    def update(self, values):
+        """
+        Method for changing the paths of some elements.
+        :param values: Dict {element name: path or list of paths tried in order}.
         :return: Self.
         """
-        self._data = pickle.load(open(self._file_name, 'rb'))
+        self._data.update(values)
         return self
 
     def save(self):
         """
-        Method for saving information to file.
+        Method for saving information to file. The file is replaced at once, so readers never see it half written.
         :return: Self.
         """
-        if os.path.isfile(self._file_name):
-            os.remove(self._file_name)
-        pickle.dump(self._data, open(self._file_name, 'wb'))
+        try:
+            mode = os.stat(self._file_name).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(self._file_name), delete=False) as file:
+            pickle.dump(self._data, file)
+        os.chmod(file.name, mode)
+        os.replace(file.name, self._file_name)
         return self
 
     @staticmethod
@@ -116,4 +152,17 @@ class ManagerElementsData:
             'open_profile': OpenProfile().path,
             'open_profile_picture': OpenProfilePicture().path,
             'profile_image': ProfileImage().path,
+            'chat_header_title': ChatHeaderTitle().path,
+            'link_preview': LinkPreview().path,
+            'chat_list': ChatList().path,
+            'chat_list_item': ChatListItem().path,
+            'chat_list_item_name': ChatListItemName().path,
+            'chat_list_item_unread': ChatListItemUnread().path,
+            'group_all_participants_button': GroupAllParticipantsButton().path,
+            'participants_dialog_list': ParticipantsDialogList().path,
+            'participants_dialog_item': ParticipantsDialogItem().path,
+            'participants_dialog_item_name': ParticipantsDialogItemName().path,
+            'participants_dialog_close': ParticipantsDialogClose().path,
+            'message_in': MessageIn().path,
+            'message_in_text': MessageInText().path,
         }
@@ -9,14 +9,25 @@ Aug 2021
 Selenium Driver Elements Module
 """
 
+import os
 from abc import ABCMeta, abstractmethod
+from collections import namedtuple
 from enum import Enum, unique
+from threading import Lock
+from time import monotonic
+from types import MappingProxyType
 
+from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.by import By
 
+from core import settings
+from core.logs import logging
+from core.singletons.singleton_meta import Singleton
 from server.adapters.the_first.elements.data import ManagerElementsData
 from server.adapters.the_first.elements.exceptions import InvalidElementName
 
+logger = logging.getLogger(__name__)
+
 
 class ElementsData:
     """
@@ -24,12 +35,13 @@ class ElementsData:
     """
 
     @staticmethod
-    def get():
+    def get(data=None):
         """
         Find the elements to Selenium.
+        :param data: Dict {element name: path} (default: the paths of ManagerElementsData).
         :return: Dict.
         """
-        data = ManagerElementsData().data
+        data = data or ManagerElementsData().data
         return {
             'search_edit':
                 ElementItem(data.get('search_edit'), ElementPathType.X_PATH),
@@ -145,6 +157,32 @@ class ElementsData:
                 ElementItem(data.get('open_profile_picture'), ElementPathType.X_PATH),
             'profile_image':
                 ElementItem(data.get('profile_image'), ElementPathType.X_PATH),
+            'chat_header_title':
+                ElementItem(data.get('chat_header_title'), ElementPathType.X_PATH),
+            'link_preview':
+                ElementItem(data.get('link_preview'), ElementPathType.X_PATH),
+            'chat_list':
+                ElementItem(data.get('chat_list'), ElementPathType.CSS),
+            'chat_list_item':
+                ElementItem(data.get('chat_list_item'), ElementPathType.CSS),
+            'chat_list_item_name':
+                ElementItem(data.get('chat_list_item_name'), ElementPathType.CSS),
+            'chat_list_item_unread':
+                ElementItem(data.get('chat_list_item_unread'), ElementPathType.CSS),
+            'group_all_participants_button':
+                ElementItem(data.get('group_all_participants_button'), ElementPathType.X_PATH),
+            'participants_dialog_list':
+                ElementItem(data.get('participants_dialog_list'), ElementPathType.CSS),
+            'participants_dialog_item':
+                ElementItem(data.get('participants_dialog_item'), ElementPathType.CSS),
+            'participants_dialog_item_name':
+                ElementItem(data.get('participants_dialog_item_name'), ElementPathType.CSS),
+            'participants_dialog_close':
+                ElementItem(data.get('participants_dialog_close'), ElementPathType.X_PATH),
+            'message_in':
+                ElementItem(data.get('message_in'), ElementPathType.CSS),
+            'message_in_text':
+                ElementItem(data.get('message_in_text'), ElementPathType.CSS),
         }
 
 
@@ -235,15 +273,31 @@ class ElementPathType(Enum):
                 ElementPathType.CLASS: (By.CLASS_NAME, element.path),
                 ElementPathType.CSS: (By.CSS_SELECTOR, element.path), }[self]
 
+    def detect(self, path):
+        """
+        Type of a path of a fallback chain: XPaths and CSS selectors are recognized, other paths keep the type of
+        the element (plain class names).
+        :param path: Str.
+        :return: ElementPathType.
+        """
+        if path.startswith(('/', '(', './')):
+            return ElementPathType.X_PATH
+        if self == ElementPathType.X_PATH or any(char in path for char in ' []#>:.=*'):
+            return ElementPathType.CSS
+        return self
+
 
 class ElementItem:
     """
-    Class representing the element item.
+    Class representing the element item. The path may be a fallback chain: a list of paths tried in order.
     """
 
     def __init__(self, path, path_type):
-        self._path = path
-        self._path_type = path_type
+        if path is None or isinstance(path, str):
+            self._locators = ((path_type, path),)
+        else:
+            self._locators = tuple((path_type.detect(item), item) for item in path)
+        self._path_type, self._path = self._locators[0]
 
     @property
     def path(self):
@@ -253,6 +307,14 @@ class ElementItem:
         """
         return self._path
 
+    @property
+    def locators(self):
+        """
+        Returns the fallback chain of the element.
+        :return: Tuple of (ElementPathType, path), in order.
+        """
+        return self._locators
+
     @property
     def path_type(self):
         """
@@ -262,6 +324,172 @@ class ElementItem:
         return self._path_type
 
 
+class SelectorStats:
+    """
+    Hits and misses of every path of the elements. The path that found an element last is tried first next time.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counts = {}
+        self._preferred = {}
+
+    def hit(self, element_name, path):
+        """
+        A path found the element.
+        :param element_name: Element name.
+        :param path: Path.
+        :return: None.
+        """
+        with self._lock:
+            hits, misses = self._counts.get((element_name, path), (0, 0))
+            self._counts[(element_name, path)] = (hits + 1, misses)
+            self._preferred[element_name] = path
+
+    def miss(self, element_name, path):
+        """
+        A path did not find the element.
+        :param element_name: Element name.
+        :param path: Path.
+        :return: None.
+        """
+        with self._lock:
+            hits, misses = self._counts.get((element_name, path), (0, 0))
+            self._counts[(element_name, path)] = (hits, misses + 1)
+            if self._preferred.get(element_name) == path:
+                del self._preferred[element_name]
+
+    def order(self, element_name, locators):
+        """
+        Fallback chain starting with the path that found the element last.
+        :param element_name: Element name.
+        :param locators: Tuple of (ElementPathType, path).
+        :return: Tuple of (ElementPathType, path).
+        """
+        preferred = self._preferred.get(element_name)
+        if preferred is None or preferred == locators[0][1]:
+            return locators
+        return tuple(sorted(locators, key=lambda locator: locator[1] != preferred))
+
+    def report(self):
+        """
+        Hit rates of the paths.
+        :return: Dict {element name: {path: {'hits': Int, 'misses': Int, 'rate': Float}}}.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+        result = {}
+        for (element_name, path), (hits, misses) in sorted(counts.items()):
+            result.setdefault(element_name, {})[path] = {
+                'hits': hits, 'misses': misses, 'rate': round(hits / (hits + misses), 3)}
+        return result
+
+
+SelectorSnapshot = namedtuple('SelectorSnapshot', ('version', 'items', 'mtime'))
+
+
+class SelectorRegistry(metaclass=Singleton):
+    """
+    Elements shared by every session of the process. The elements are an immutable snapshot that is replaced at once
+    when the data file changes, so a fixed path reaches the running sessions without restarting their browsers.
+    """
+
+    def __init__(self, file_name=None, check_interval=None, stats_interval=None):
+        """
+        :param file_name: Data file (default: settings.ELEMENTS_DATA_FILE).
+        :param check_interval: Seconds between checks of the data file (0 disables the checks).
+        :param stats_interval: Seconds between logs of the hit rates of the paths (0 disables the logs).
+        """
+        self._file_name = file_name or settings.ELEMENTS_DATA_FILE
+        self._check_interval = settings.ELEMENTS_CHECK_INTERVAL if check_interval is None else check_interval
+        self._stats_interval = settings.ELEMENTS_STATS_INTERVAL if stats_interval is None else stats_interval
+        self._lock = Lock()
+        self._checked = monotonic()
+        self._logged = monotonic()
+        self.stats = SelectorStats()
+        self._snapshot = SelectorSnapshot(0, MappingProxyType(ElementsData.get()), None)
+        self.reload()
+
+    def _mtime(self):
+        """
+        Modification time of the data file.
+        :return: Int or None when there is no file.
+        """
+        try:
+            return os.stat(self._file_name).st_mtime_ns
+        except OSError:
+            return None
+
+    def _log_stats(self):
+        """
+        Log the hit rates of the paths, once every stats interval.
+        :return: None.
+        """
+        if self._stats_interval <= 0 or monotonic() - self._logged < self._stats_interval:
+            return
+        self._logged = monotonic()
+        report = self.stats.report()
+        if report:
+            logger.info(f'Elements hit rates: {report}')
+
+    def _check(self):
+        """
+        Reload the elements when the data file changed since the last check.
+        :return: None.
+        """
+        self._log_stats()
+        if self._check_interval <= 0 or monotonic() - self._checked < self._check_interval:
+            return
+        self._checked = monotonic()
+        mtime = self._mtime()
+        if mtime is not None and mtime != self._snapshot.mtime:
+            self.reload()
+
+    @property
+    def snapshot(self):
+        """
+        Current elements.
+        :return: SelectorSnapshot.
+        """
+        self._check()
+        return self._snapshot
+
+    @property
+    def items(self):
+        """
+        Current elements.
+        :return: Read-only dict {element name: ElementItem}.
+        """
+        return self.snapshot.items
+
+    @property
+    def version(self):
+        """
+        Version of the current elements, increased by every reload.
+        :return: Int.
+        """
+        return self._snapshot.version
+
+    def reload(self):
+        """
+        Read the data file, merged over the default paths, and replace the elements. Without a file the default paths
+        are used; a file that cannot be read keeps the current elements.
+        :return: Self.
+        """
+        with self._lock:
+            mtime = self._mtime()
+            try:
+                manager = ManagerElementsData(self._file_name)
+                items = MappingProxyType(ElementsData.get((manager.load() if mtime is not None else manager).data))
+            except Exception as e:
+                logger.error(f'The elements file could not be loaded: {e}')
+                self._snapshot = self._snapshot._replace(mtime=mtime)
+                return self
+            self._snapshot = SelectorSnapshot(self._snapshot.version + 1, items, mtime)
+        logger.info(f'Elements reloaded from {self._file_name}, version {self._snapshot.version}.')
+        return self
+
+
 class DriveElements:
     """
     Class for element controllers.
@@ -273,27 +501,62 @@ class DriveElements:
         :param browser: Selenium driver.browser object.
         """
         self._browser = browser
-        self._items = DriveElements._set_items()
+        self._registry = SelectorRegistry()
 
-    @staticmethod
-    def _set_items():
+    @property
+    def _items(self):
         """
-        Recovers elements and their settings.
+        Recovers elements and their settings from the registry shared by the sessions.
         :return: Dict.
         """
-        return ElementsData.get()
+        return self._registry.items
 
-    def get_element(self, element_name):
+    def _locators(self, element_name):
         """
-        Retrieves the element by searching according to the element's type.
+        Retrieves the fallback chain of the element, starting with the path that found it last.
         :param element_name: Element name.
-        :return: Selenium element object.
+        :return: Tuple of (ElementPathType, path).
         """
         elem = self._items.get(element_name)
         if elem is None:
             raise InvalidElementName()
 
-        return elem.path_type.new_element_by(self._browser, elem)
+        return self._registry.stats.order(element_name, elem.locators)
+
+    def get_element(self, element_name):
+        """
+        Retrieves the element by searching according to the element's type, trying the paths of its fallback chain.
+        :param element_name: Element name.
+        :return: Selenium element object.
+        """
+        stats, error = self._registry.stats, None
+        for index, (path_type, path) in enumerate(self._locators(element_name)):
+            try:
+                result = path_type.new_element_by(self._browser, ElementItem(path, path_type))
+            except NoSuchElementException as e:
+                stats.miss(element_name, path)
+                error = error or e
+                continue
+            stats.hit(element_name, path)
+            if index:
+                logger.warning(f'Element "{element_name}" found by the fallback path {path}.')
+            return result
+        raise error
+
+    def found(self, element_name, paths, index):
+        """
+        Record the path of the fallback chain that found the element in a wait; the paths before it missed.
+        :param element_name: Element name.
+        :param paths: Paths of the chain, in the order they were tried.
+        :param index: Position of the path that found the element.
+        :return: None.
+        """
+        stats = self._registry.stats
+        for path in paths[:index]:
+            stats.miss(element_name, path)
+        stats.hit(element_name, paths[index])
+        if index:
+            logger.warning(f'Element "{element_name}" found by the fallback path {paths[index]}.')
 
     def get_element_path(self, element_name):
         """
@@ -301,11 +564,18 @@ class DriveElements:
         :param element_name: Element name.
         :return: Element identifier.
         """
-        elem = self._items.get(element_name)
-        if elem is None:
-            raise InvalidElementName()
+        return self._locators(element_name)[0][1]
 
-        return elem.path
+    def get_element_paths(self, *element_names):
+        """
+        Retrieves the paths of the entered elements from the same snapshot.
+        :param element_names: Element names.
+        :return: Tuple of element identifiers.
+        """
+        items = self._items
+        if any(name not in items for name in element_names):
+            raise InvalidElementName()
+        return tuple(self._registry.stats.order(name, items[name].locators)[0][1] for name in element_names)
 
     def get_presence_of_element(self, element_name):
         """
@@ -313,8 +583,13 @@ class DriveElements:
         :param element_name: Element name.
         :return: By object tuple and Selenium element.
         """
-        elem = self._items.get(element_name)
-        if elem is None:
-            raise InvalidElementName()
+        return self.get_presence_of_elements(element_name)[0]
 
-        return elem.path_type.new_element_by_presence(elem)
+    def get_presence_of_elements(self, element_name):
+        """
+        Retrieves the fallback chain of the element for the waits.
+        :param element_name: Element name.
+        :return: List of By object tuples.
+        """
+        return [path_type.new_element_by_presence(ElementItem(path, path_type))
+                for path_type, path in self._locators(element_name)]
@@ -0,0 +1,218 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Selenium Elements Optimizer Module
+"""
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+from core.utils.classes import MessageConsole
+from server.adapters.the_first.elements.data import ManagerElementsData
+from server.adapters.the_first.elements.drivers import ElementsData
+
+SelectorReport = namedtuple('SelectorReport', ('name', 'path', 'count', 'ms', 'candidates'))
+
+
+class SelectorOptimizer:
+    """
+    Benchmark the paths of the elements against a saved page of Whatsapp Web and propose CSS selectors anchored on
+    stable attributes (data-testid, data-icon, role, aria-label...) that find the same element. The proposals become
+    fallback chains of ManagerElementsData, fastest path first, so a layout change no longer breaks the element.
+    """
+    SNAPSHOT_SCRIPT = """
+    const page = document.documentElement.cloneNode(true);
+    page.querySelectorAll('script, link[rel="preload"], link[rel="modulepreload"]').forEach((el) => el.remove());
+    return page.outerHTML;
+    """
+    SCRIPT = """
+    const [by, path, runs, limit] = arguments;
+    const ANCHORS = ['data-testid', 'data-icon', 'role', 'data-tab', 'contenteditable', 'name', 'type', 'aria-label',
+                     'title', 'id'];
+    const findAll = (by, path) => {
+        if (by === 'xpath') {
+            const found = document.evaluate(path, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            return Array.from({length: found.snapshotLength}, (_, index) => found.snapshotItem(index));
+        }
+        if (by === 'class name') {
+            return Array.from(document.getElementsByClassName(path));
+        }
+        return Array.from(document.querySelectorAll(path));
+    };
+    const findFirst = (by, path) => {
+        if (by === 'xpath') {
+            return document.evaluate(path, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        }
+        if (by === 'class name') {
+            return document.getElementsByClassName(path)[0] || null;
+        }
+        return document.querySelector(path);
+    };
+    const time = (by, path) => {
+        const start = performance.now();
+        for (let index = 0; index < runs; index++) {
+            findFirst(by, path);
+        }
+        return (performance.now() - start) / runs;
+    };
+    const quote = (value) => '"' + value.replace(/["\\\\]/g, '\\\\$&') + '"';
+    const attributes = (el) => ANCHORS
+        .filter((name) => el.hasAttribute(name))
+        .filter((name) => {
+            const value = el.getAttribute(name);
+            return value && value.length <= 60 && !(name === 'id' && /\\d/.test(value));
+        })
+        .map((name) => name === 'id' ? '#' + CSS.escape(el.id) : `[${name}=${quote(el.getAttribute(name))}]`);
+    const anchored = (el) => {
+        const tag = el.tagName.toLowerCase();
+        const own = attributes(el);
+        const result = own.map((attribute) => tag + attribute);
+        own.forEach((first, index) => own.slice(index + 1).forEach((second) => result.push(tag + first + second)));
+        return result;
+    };
+    const matches = findAll(by, path);
+    if (!matches.length) {
+        return {count: 0, ms: null, candidates: []};
+    }
+    const target = matches[0];
+    const tag = target.tagName.toLowerCase();
+    const selectors = anchored(target);
+    const tails = [tag].concat(attributes(target).map((attribute) => tag + attribute));
+    let parent = target.parentElement;
+    for (let depth = 0; parent && depth < 6; depth++, parent = parent.parentElement) {
+        anchored(parent).forEach((anchor) => tails.forEach((tail) => selectors.push(anchor + ' ' + tail)));
+    }
+    const candidates = [];
+    new Set(selectors).forEach((selector) => {
+        let found = [];
+        try {
+            found = document.querySelectorAll(selector);
+        } catch (e) {
+        }
+        if (found.length === 1 && found[0] === target) {
+            candidates.push({selector: selector, ms: time('css selector', selector)});
+        }
+    });
+    candidates.sort((a, b) => a.ms - b.ms || a.selector.length - b.selector.length);
+    return {count: matches.length, ms: time(by, path), candidates: candidates.slice(0, limit)};
+    """
+
+    def __init__(self, browser, runs=50, chain_size=3):
+        """
+        :param browser: Selenium Driver showing a saved page (see open_snapshot) or Whatsapp Web.
+        :param runs: Lookups timed for every path.
+        :param chain_size: Paths kept in a fallback chain.
+        """
+        self._browser = browser
+        self._runs = runs
+        self._chain_size = chain_size
+
+    @staticmethod
+    def save_snapshot(browser, file_name):
+        """
+        Save the page of a logged session, without its scripts, for later benchmarks.
+        :param browser: Selenium Driver showing Whatsapp Web.
+        :param file_name: HTML file.
+        :return: File name.
+        """
+        with open(file_name, 'w', encoding='utf-8') as file:
+            file.write('<!DOCTYPE html>\n' + browser.execute_script(SelectorOptimizer.SNAPSHOT_SCRIPT))
+        return file_name
+
+    def open_snapshot(self, file_name):
+        """
+        Show a saved page in the browser.
+        :param file_name: HTML file.
+        :return: Self.
+        """
+        self._browser.get(Path(file_name).resolve().as_uri())
+        return self
+
+    def benchmark(self, name, item):
+        """
+        Time the path of an element and look for equivalent selectors.
+        :param name: Element name.
+        :param item: ElementItem.
+        :return: SelectorReport.
+        """
+        by, path = item.path_type.new_element_by_presence(item)
+        result = self._browser.execute_script(self.SCRIPT, by, path, self._runs, self._chain_size * 3)
+        return SelectorReport(name, path, result['count'], result['ms'],
+                              [(candidate['selector'], candidate['ms']) for candidate in result['candidates']])
+
+    def optimize(self, names=None):
+        """
+        Benchmark the elements.
+        :param names: Element names (default: all).
+        :return: List of SelectorReport.
+        """
+        items = ElementsData.get()
+        return [self.benchmark(name, items[name]) for name in names or items if items[name].path]
+
+    def chain(self, report):
+        """
+        Fallback chain of an element: the selectors faster than the path, the path, then the slower selectors.
+        :param report: SelectorReport.
+        :return: List of paths, or None when the path finds nothing in the page.
+        """
+        if not report.count:
+            return None
+        faster = [selector for selector, ms in report.candidates if ms < report.ms]
+        slower = [selector for selector, ms in report.candidates if ms >= report.ms]
+        return (faster[:self._chain_size - 1] + [report.path] + slower)[:self._chain_size]
+
+    def apply(self, reports, file_name=None):
+        """
+        Store the fallback chains over the default paths in the elements file; running sessions reload it. The paths
+        of the previous file are not kept, so an outdated file cannot bring back old paths.
+        :param reports: List of SelectorReport.
+        :param file_name: Elements file (default: settings.ELEMENTS_DATA_FILE).
+        :return: ManagerElementsData.
+        """
+        manager = ManagerElementsData(file_name)
+        chains = {report.name: self.chain(report) for report in reports}
+        return manager.update({name: chain for name, chain in chains.items() if chain}).save()
+
+
+def main(*args):
+    """
+    Benchmark the elements against a saved page:
+    python -m server.adapters.the_first.elements.optimizer <page.html> [--names=a,b] [--runs=50] [--apply]
+    :param args: System arguments.
+    :return: List of SelectorReport.
+    """
+    from core.utils.browsers.classes import BrowserType
+
+    con = MessageConsole()
+    positional = [arg for arg in args[1:] if not arg.startswith('--')]
+    options = dict(arg[2:].split('=', 1) for arg in args[1:] if arg.startswith('--') and '=' in arg)
+    if not positional:
+        con.show('Use: optimizer.py <page.html> [--names=a,b] [--runs=50] [--apply]', file=sys.stderr)
+        raise SystemExit(1)
+
+    browser = BrowserType.FIREFOX.new_instance()
+    try:
+        optimizer = SelectorOptimizer(browser.browser, runs=int(options.get('runs', 50))).open_snapshot(positional[0])
+        names = [name for name in options.get('names', '').split(',') if name]
+        reports = optimizer.optimize(names)
+    finally:
+        browser.close()
+    for report in reports:
+        if not report.count:
+            con.show(f'{report.name}: not found ({report.path})')
+            continue
+        best = report.candidates[0] if report.candidates else ('-', report.ms)
+        con.show(f'{report.name}: {report.ms:.4f} ms, {report.count} match(es); best {best[1]:.4f} ms {best[0]}')
+    if '--apply' in args:
+        optimizer.apply(reports)
+        con.show('Fallback chains saved.')
+    return reports
+
+
+if __name__ == '__main__':
+    main(*sys.argv)
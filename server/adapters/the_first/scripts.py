@@ -0,0 +1,619 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+In-page Scripts Module
+"""
+import base64
+import re
+from enum import Enum
+from io import BytesIO
+
+from PIL import Image
+from selenium.common.exceptions import JavascriptException, TimeoutException
+from selenium.webdriver.support import expected_conditions as exp_cond
+from selenium.webdriver.support.ui import WebDriverWait
+
+from core import settings
+from core.logs import logging
+from core.utils.qr_code.classes import QrCode
+
+logger = logging.getLogger(__name__)
+
+
+class WaitState(Enum):
+    """
+    States an element can be waited for.
+    """
+    PRESENT = 'present'
+    VISIBLE = 'visible'
+    CLICKABLE = 'clickable'
+    INVISIBLE = 'invisible'
+    TEXT_MATCHES = 'text_matches'
+    TEXT_CHANGED = 'text_changed'
+
+    def new_condition(self, locator, expected=None):
+        """
+        Factory Method of the polling condition used when the in-page wait is not available.
+        :param locator: Tuple (By, path).
+        :param expected: Regular expression (TEXT_MATCHES) or previous text (TEXT_CHANGED).
+        :return: Callable receiving the browser.
+        """
+        if self in (WaitState.TEXT_MATCHES, WaitState.TEXT_CHANGED):
+            pattern = re.compile(expected or r'\S') if self == WaitState.TEXT_MATCHES else None
+
+            def has_text(browser):
+                elements = browser.find_elements(*locator)
+                text = elements[0].text.strip() if elements else None
+                if text is None:
+                    return False
+                ok = pattern.search(text) if pattern else text != (expected or '').strip()
+                return elements[0] if ok else False
+
+            return has_text
+        return {
+            WaitState.PRESENT: exp_cond.presence_of_element_located,
+            WaitState.VISIBLE: exp_cond.visibility_of_element_located,
+            WaitState.CLICKABLE: exp_cond.element_to_be_clickable,
+            WaitState.INVISIBLE: exp_cond.invisibility_of_element_located,
+        }[self](locator)
+
+    def new_chain_condition(self, locators, expected=None, on_match=None):
+        """
+        Polling condition of a fallback chain: the first locator reaching the state answers
+        (every locator must be invisible for INVISIBLE).
+        :param locators: List of tuples (By, path).
+        :param expected: Regular expression (TEXT_MATCHES) or previous text (TEXT_CHANGED).
+        :param on_match: Callable receiving the index of the locator that answered (not called for INVISIBLE).
+        :return: Callable receiving the browser.
+        """
+        conditions = [self.new_condition(locator, expected) for locator in locators]
+        if self == WaitState.INVISIBLE:
+            return lambda browser: all(condition(browser) for condition in conditions)
+
+        def first(browser):
+            for index, condition in enumerate(conditions):
+                result = condition(browser)
+                if result:
+                    if on_match:
+                        on_match(index)
+                    return result
+            return False
+
+        return first
+
+
+class MutationWaiter:
+    """
+    Wait for elements inside the page: a MutationObserver checks the element after every change of the DOM and
+    answers the single "execute_async_script" call as soon as the state is reached, instead of polling WebDriver.
+    The page also answers which locator of the fallback chain found the element. Browsers that refuse the script fall
+    back to WebDriverWait.
+    """
+    SCRIPT = """
+    const [by, path, state, expected, timeoutMs] = arguments;
+    const done = arguments[arguments.length - 1];
+    const locators = [[by, path]].concat(arguments.length > 6 ? arguments[5] : []);
+    const findBy = ([by, path]) => {
+        if (by === 'xpath') {
+            return document.evaluate(path, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        }
+        if (by === 'class name') {
+            return document.getElementsByClassName(path)[0] || null;
+        }
+        return document.querySelector(path);
+    };
+    let matched = -1;
+    const find = () => {
+        for (let index = 0; index < locators.length; index++) {
+            const el = findBy(locators[index]);
+            if (el) {
+                matched = index;
+                return el;
+            }
+        }
+        matched = -1;
+        return null;
+    };
+    const visible = (el) => {
+        const rect = el.getBoundingClientRect();
+        const style = window.getComputedStyle(el);
+        return rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+    };
+    const textOf = (el) => (el.innerText || el.textContent || '').trim();
+    const pattern = state === 'text_matches' ? new RegExp(expected || '\\\\S') : null;
+    const check = () => {
+        const el = find();
+        switch (state) {
+            case 'present': return el;
+            case 'visible': return el && visible(el) ? el : null;
+            case 'clickable':
+                return el && visible(el) && !el.disabled && el.getAttribute('aria-disabled') !== 'true' ? el : null;
+            case 'invisible': return !el || !visible(el) ? true : null;
+            case 'text_matches': return el && pattern.test(textOf(el)) ? el : null;
+            case 'text_changed': return el && textOf(el) !== (expected || '').trim() ? el : null;
+        }
+        return null;
+    };
+    const answer = (value) => done({value: value, index: state === 'invisible' ? -1 : matched});
+    const found = check();
+    if (found) {
+        return answer(found);
+    }
+    let timer = null;
+    const observer = new MutationObserver(() => {
+        const result = check();
+        if (result) {
+            observer.disconnect();
+            clearTimeout(timer);
+            answer(result);
+        }
+    });
+    observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    timer = setTimeout(() => { observer.disconnect(); done(null); }, timeoutMs);
+    """
+
+    def __init__(self, browser):
+        """
+        :param browser: Selenium Driver.
+        """
+        self._browser = browser
+        self._script_timeout = None
+        self._supported = settings.UI_PUSH_WAITS
+
+    def _prepare(self, time_out):
+        """
+        Raise the script timeout of the driver when the wait may take longer.
+        :param time_out: Seconds.
+        :return: None.
+        """
+        needed = time_out + 5
+        if self._script_timeout is None or self._script_timeout < needed:
+            self._browser.set_script_timeout(needed)
+            self._script_timeout = needed
+
+    def _poll(self, locators, state, time_out, expected, on_match=None):
+        """
+        Wait polling WebDriver.
+        :param locators: List of tuples (By, path).
+        :param state: WaitState.
+        :param time_out: Seconds.
+        :param expected: Value used by the text states.
+        :param on_match: Callable receiving the index of the locator that found the element.
+        :return: Selenium Element or True.
+        """
+        return WebDriverWait(self._browser, time_out, poll_frequency=settings.UI_POLL_INTERVAL).until(
+            state.new_chain_condition(locators, expected, on_match))
+
+    def execute(self, script, *args, time_out=10):
+        """
+        Run an asynchronous script, raising the script timeout of the driver when needed.
+        :param script: Script calling its last argument with the result.
+        :param args: Script arguments.
+        :param time_out: Seconds the script may take.
+        :return: Script result.
+        """
+        self._prepare(time_out)
+        return self._browser.execute_async_script(script, *args)
+
+    def wait(self, locator, state=WaitState.PRESENT, time_out=10, expected=None, fallbacks=(), on_match=None):
+        """
+        Wait for the element to reach the state.
+        :param locator: Tuple (By, path).
+        :param state: WaitState.
+        :param time_out: Seconds.
+        :param expected: Regular expression (TEXT_MATCHES) or previous text (TEXT_CHANGED).
+        :param fallbacks: Tuples (By, path) of the same element, looked up when the locator finds nothing.
+        :param on_match: Callable receiving the index of the locator that found the element (0 is "locator").
+        :return: Selenium Element (True for INVISIBLE).
+        """
+        locators = [locator, *fallbacks]
+        if not self._supported:
+            return self._poll(locators, state, time_out, expected, on_match)
+        by, path = locator
+        extra = ([list(item) for item in fallbacks],) if fallbacks else ()
+        try:
+            result = self.execute(
+                self.SCRIPT, by, path, state.value, expected, int(time_out * 1000), *extra, time_out=time_out)
+        except JavascriptException as e:
+            logger.warning(f'In-page waits are not available, polling instead: {e.msg}')
+            self._supported = False
+            return self._poll(locators, state, time_out, expected, on_match)
+        except TimeoutException:
+            result = None
+        if not result:
+            raise TimeoutException(f'{path} did not become {state.value} in {time_out} seconds.')
+        if on_match and result['index'] >= 0:
+            on_match(result['index'])
+        return result['value']
+
+
+class TextComposer:
+    """
+    Put a whole multi-line message in the composer with one WebDriver call: the text is pasted as a clipboard event
+    and, when the editor ignores it, inserted with "insertText" and "insertLineBreak". Line breaks and emoji are kept.
+    When the composer does not end up with the message it is emptied, so the caller can type it key by key.
+    """
+    SCRIPT = """
+    const [el, text, done] = arguments;
+    const normalize = (value) => value.split('\\n').map((line) => line.trim()).filter((line) => line).join('\\n');
+    const inserted = () => normalize(el.innerText || el.textContent || '') === normalize(text);
+    const clear = () => {
+        document.execCommand('selectAll', false, null);
+        document.execCommand('delete', false, null);
+    };
+    const finish = () => {
+        if (!inserted()) {
+            clear();
+        }
+        done(inserted());
+    };
+    el.focus();
+    try {
+        const data = new DataTransfer();
+        data.setData('text/plain', text);
+        el.dispatchEvent(new ClipboardEvent('paste', {clipboardData: data, bubbles: true, cancelable: true}));
+    } catch (e) {
+    }
+    setTimeout(() => {
+        if (inserted()) {
+            return done(true);
+        }
+        clear();
+        text.split('\\n').forEach((line, index) => {
+            if (index) {
+                document.execCommand('insertLineBreak', false, null);
+            }
+            if (line) {
+                document.execCommand('insertText', false, line);
+            }
+        });
+        setTimeout(finish, 0);
+    }, 0);
+    """
+
+    def __init__(self, waiter):
+        """
+        :param waiter: MutationWaiter of the session.
+        """
+        self._waiter = waiter
+        self._enabled = settings.UI_FAST_COMPOSE
+
+    def insert(self, element, text):
+        """
+        Insert the text in the composer.
+        :param element: Selenium Element of the composer.
+        :param text: Message.
+        :return: Bool, False when the message must be typed.
+        """
+        if not self._enabled:
+            return False
+        try:
+            return bool(self._waiter.execute(self.SCRIPT, element, text, time_out=5))
+        except JavascriptException as e:
+            logger.warning(f'Fast composition is not available, typing instead: {e.msg}')
+            self._enabled = False
+        except TimeoutException:
+            pass
+        return False
+
+
+class DomExtractor:
+    """
+    Read fields of the page in one WebDriver call. The page sends back only the requested texts and attributes,
+    instead of the whole "page_source" parsed in Python.
+    """
+    SCRIPT = """
+    const [root, fields, required, withElement, scroll] = arguments;
+    if (scroll) {
+        const container = document.querySelector(scroll[0]);
+        if (container) {
+            container.scrollTop = scroll[1];
+        }
+    }
+    return Array.from(document.querySelectorAll(root))
+        .filter((el) => !required || el.querySelector(required))
+        .map((el) => {
+            const item = {};
+            for (const [name, [selector, attribute]] of Object.entries(fields)) {
+                const target = selector ? el.querySelector(selector) : el;
+                item[name] = !target ? null : attribute ? target.getAttribute(attribute) : target.textContent;
+            }
+            if (withElement) {
+                item.element = el;
+            }
+            return item;
+        });
+    """
+
+    def __init__(self, browser):
+        """
+        :param browser: Selenium Driver.
+        """
+        self._browser = browser
+
+    def extract(self, root, fields, required=None, with_element=False, scroll=None):
+        """
+        Extract the fields of every element matching the root selector.
+        :param root: CSS selector of the items.
+        :param fields: Dict {name: (CSS selector inside the item or None for the item, attribute or None for the text)}.
+        :param required: CSS selector that must exist inside the item (optional).
+        :param with_element: Add the Selenium Element of the item as "element".
+        :param scroll: Tuple (CSS selector of a container, scrollTop) applied before reading (optional).
+        :return: List of dicts; missing fields are None.
+        """
+        return self._browser.execute_script(
+            self.SCRIPT, root, {name: list(field) for name, field in fields.items()}, required, with_element,
+            list(scroll) if scroll else None) or []
+
+
+def _paths(paths):
+    """
+    Selectors given to a script.
+    :param paths: Tuple of selectors or a callable returning them.
+    :return: Tuple.
+    """
+    return tuple(paths()) if callable(paths) else paths
+
+
+class UnreadTracker:
+    """
+    Index of the chats with unread messages. A MutationObserver installed in the chat list records the chats whose
+    unread counter changes; every read only transfers those changes, so the index is answered without reloading or
+    scrolling the page. The first read, and the first one after the page was reloaded, walks the whole (virtualized)
+    list once, until its end.
+    """
+    SCRIPT = """
+    const [mode, listPath, itemPath, namePath, unreadPath, done] = arguments;
+    const pane = document.querySelector(listPath);
+    if (!pane) {
+        return done(null);
+    }
+    const fresh = !window.__zapUnread;
+    const state = window.__zapUnread || (window.__zapUnread = {pane: null, observer: null, changes: {}});
+    const read = (item) => {
+        const name = item.querySelector(namePath);
+        if (!name) {
+            return;
+        }
+        const badge = item.querySelector(unreadPath);
+        const count = badge ? (parseInt((badge.textContent || '').replace(/\\D/g, ''), 10) || 1) : 0;
+        state.changes[name.getAttribute('title') || name.textContent] = count;
+    };
+    const readAll = () => pane.querySelectorAll(itemPath).forEach(read);
+    if (state.pane !== pane) {
+        if (state.observer) {
+            state.observer.disconnect();
+        }
+        state.pane = pane;
+        state.observer = new MutationObserver((mutations) => {
+            const items = new Set();
+            for (const mutation of mutations) {
+                const target = mutation.target.nodeType === 1 ? mutation.target : mutation.target.parentElement;
+                const item = target && target.closest(itemPath);
+                if (item) {
+                    items.add(item);
+                }
+                mutation.addedNodes.forEach((node) => {
+                    if (node.nodeType === 1) {
+                        node.querySelectorAll(itemPath).forEach((child) => items.add(child));
+                    }
+                });
+            }
+            items.forEach(read);
+        });
+        state.observer.observe(pane, {childList: true, subtree: true, characterData: true, attributes: true});
+    }
+    const drain = (full) => {
+        const changes = state.changes;
+        state.changes = {};
+        done({full: full, changes: changes});
+    };
+    if (mode !== 'scan' && !fresh) {
+        readAll();
+        return drain(false);
+    }
+    const start = pane.scrollTop;
+    pane.scrollTop = 0;
+    let last = -1;
+    const step = () => {
+        readAll();
+        const end = pane.scrollTop + pane.clientHeight >= pane.scrollHeight - 1;
+        if (end || pane.scrollTop === last) {
+            pane.scrollTop = start;
+            return drain(true);
+        }
+        last = pane.scrollTop;
+        pane.scrollTop += pane.clientHeight;
+        setTimeout(step, 50);
+    };
+    setTimeout(step, 50);
+    """
+
+    def __init__(self, waiter, paths, scan_timeout=None):
+        """
+        :param waiter: MutationWaiter of the session.
+        :param paths: CSS selectors of the chat list, a chat, the name and the unread counter inside a chat, or a
+            callable returning them on each call (reloaded elements apply at once).
+        :param scan_timeout: Seconds allowed for walking the whole list (default: settings.UNREAD_SCAN_TIMEOUT).
+        """
+        self._waiter = waiter
+        self._paths = paths if callable(paths) else tuple(paths)
+        self._scan_timeout = scan_timeout or settings.UNREAD_SCAN_TIMEOUT
+        self._index = {}
+        self._scanned = False
+
+    def _apply(self, result):
+        """
+        Update the index.
+        :param result: Dict {'full': Bool, 'changes': {name: unread count}} or None without the chat list.
+        :return: Bool, True when the changes were read.
+        """
+        if not result:
+            return False
+        if result['full']:
+            self._index = {}
+        for name, count in result['changes'].items():
+            if count:
+                self._index[name] = count
+            else:
+                self._index.pop(name, None)
+        return True
+
+    def refresh(self):
+        """
+        Read the changes of the chat list, walking the whole list the first time.
+        :return: Self.
+        """
+        mode = 'changes' if self._scanned else 'scan'
+        if self._apply(self._waiter.execute(self.SCRIPT, mode, *_paths(self._paths), time_out=self._scan_timeout)):
+            self._scanned = True
+        return self
+
+    def reset(self):
+        """
+        Forget the index, e.g. after the page was reloaded.
+        :return: Self.
+        """
+        self._index = {}
+        self._scanned = False
+        return self
+
+    def unread(self):
+        """
+        Chats with unread messages.
+        :return: Dict {name: unread count}.
+        """
+        return dict(self.refresh()._index)
+
+    def count(self, name):
+        """
+        Unread messages of a chat.
+        :param name: Contact or Group Name.
+        :return: Int.
+        """
+        return self.refresh()._index.get(name, 0)
+
+
+class ParticipantExporter:
+    """
+    Read every row of a virtualized list (the participants of a group): the page scrolls the list until its end and
+    collects the rows of each step, so the whole list comes back in one WebDriver call. A row seen in several steps is
+    kept once: rows are told apart by their contact id ("data-id" or "data-jid") or by their offset in the list, never
+    by the name, so members with the same name are all counted.
+    """
+    SCRIPT = """
+    const [listPath, itemPath, namePath, done] = arguments;
+    const list = document.querySelector(listPath);
+    if (!list) {
+        return done(null);
+    }
+    let pane = list;
+    while (pane && pane.scrollHeight <= pane.clientHeight && pane.parentElement) {
+        pane = pane.parentElement;
+    }
+    const rows = new Map();
+    const keyOf = (item, name) => {
+        const holder = item.matches('[data-id], [data-jid]') ? item : item.querySelector('[data-id], [data-jid]');
+        const id = holder ? holder.getAttribute('data-id') || holder.getAttribute('data-jid') : '';
+        if (id) {
+            return id;
+        }
+        const top = item.getBoundingClientRect().top - list.getBoundingClientRect().top;
+        return `${Math.round(top + (pane === list ? pane.scrollTop : 0))}|${name}`;
+    };
+    const collect = () => list.querySelectorAll(itemPath).forEach((item) => {
+        const name = item.querySelector(namePath);
+        const text = name ? (name.getAttribute('title') || name.textContent || '').trim() : '';
+        if (text) {
+            rows.set(keyOf(item, text), text);
+        }
+    });
+    pane.scrollTop = 0;
+    let last = -1;
+    let idle = 0;
+    const step = () => {
+        const before = rows.size;
+        collect();
+        const end = pane.scrollTop + pane.clientHeight >= pane.scrollHeight - 1 || pane.scrollTop === last;
+        idle = rows.size === before ? idle + 1 : 0;
+        if (end && idle >= 2) {
+            return done(Array.from(rows.values()));
+        }
+        last = pane.scrollTop;
+        pane.scrollTop += Math.max(pane.clientHeight - 40, 40);
+        setTimeout(step, 60);
+    };
+    setTimeout(step, 60);
+    """
+
+    def __init__(self, waiter, paths, time_out=None):
+        """
+        :param waiter: MutationWaiter of the session.
+        :param paths: CSS selectors of the list, a row and the name inside a row, or a callable returning them.
+        :param time_out: Seconds allowed for reading the whole list (default: settings.PARTICIPANTS_EXPORT_TIMEOUT).
+        """
+        self._waiter = waiter
+        self._paths = paths if callable(paths) else tuple(paths)
+        self._time_out = time_out or settings.PARTICIPANTS_EXPORT_TIMEOUT
+
+    def export(self):
+        """
+        Read the names of the list, one per row (the same name may appear more than once).
+        :return: List of names, or None when the list is not on the page.
+        """
+        return self._waiter.execute(self.SCRIPT, *_paths(self._paths), time_out=self._time_out)
+
+
+class QrCodeReader:
+    """
+    Read the QR-Code of the sign in page in one WebDriver call, without a screenshot of the element: the payload kept
+    by Whatsapp Web in the "data-ref" attribute around the canvas or, when it is missing, the canvas pixels as a PNG.
+    """
+    SCRIPT = """
+    const [canvas, depth] = arguments;
+    let el = canvas;
+    for (let level = 0; el && level <= depth; level++, el = el.parentElement) {
+        const ref = el.getAttribute('data-ref');
+        if (ref) {
+            return {ref: ref, png: null};
+        }
+    }
+    try {
+        return {ref: null, png: canvas.toDataURL('image/png').split(',')[1] || null};
+    } catch (e) {
+        return {ref: null, png: null};
+    }
+    """
+
+    def __init__(self, browser, depth=4):
+        """
+        :param browser: Selenium Driver.
+        :param depth: Parents of the canvas searched for the "data-ref" attribute.
+        """
+        self._browser = browser
+        self._depth = depth
+
+    def read(self, canvas):
+        """
+        Read the payload of the QR-Code.
+        :param canvas: Selenium Element of the canvas.
+        :return: Str or bytes, or None when the page could not give it (use the screenshot).
+        """
+        try:
+            result = self._browser.execute_script(self.SCRIPT, canvas, self._depth) or {}
+        except JavascriptException as e:
+            logger.debug(f'QR-Code not read from the page: {e.msg}')
+            return None
+        if result.get('ref'):
+            return result['ref']
+        if result.get('png'):
+            try:
+                return QrCode.decode_from_image(Image.open(BytesIO(base64.b64decode(result['png']))))['data']
+            except Exception as e:
+                logger.debug(f'QR-Code not decoded from the canvas: {e}')
+        return None
@@ -0,0 +1,147 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+UI State Module
+"""
+from enum import Enum
+from functools import wraps
+
+
+class UiPanel(Enum):
+    """
+    Side panels that can be open over a chat.
+    """
+    GROUP = 'group'
+    GROUP_DATA = 'group_data'
+    GROUP_SETTINGS = 'group_settings'
+
+
+class UiState:
+    """
+    What the Whatsapp Web page is showing: the open chat, the side panel and a modal (attachment preview, dialogs).
+    Anything unexpected (errors, reloads, other pages) resets it, so the next step navigates again.
+    """
+
+    def __init__(self):
+        self._chat = None
+        self._panel = None
+        self._modal = None
+
+    @staticmethod
+    def _key(name):
+        """
+        Normalize a contact or group name.
+        :param name: Str.
+        :return: Str.
+        """
+        return (name or '').strip().lower()
+
+    @property
+    def chat(self):
+        """
+        Name of the open chat.
+        :return: Str or None.
+        """
+        return self._chat
+
+    @property
+    def panel(self):
+        """
+        Open side panel.
+        :return: UiPanel or None.
+        """
+        return self._panel
+
+    @property
+    def modal(self):
+        """
+        Open modal.
+        :return: Str or None.
+        """
+        return self._modal
+
+    def is_chat_open(self, name):
+        """
+        Check if the chat is open and nothing covers it.
+        :param name: Contact or Group Name.
+        :return: Bool.
+        """
+        return self._chat is not None and self._modal is None and self._chat == self._key(name)
+
+    def open_chat(self, name):
+        """
+        A chat was opened by the search panel.
+        :param name: Contact or Group Name.
+        :return: Self.
+        """
+        self._chat = self._key(name) or None
+        self._panel = None
+        self._modal = None
+        return self
+
+    def open_panel(self, panel):
+        """
+        A side panel was opened.
+        :param panel: UiPanel.
+        :return: Self.
+        """
+        self._panel = panel
+        return self
+
+    def close_panel(self):
+        """
+        The side panel was closed.
+        :return: Self.
+        """
+        self._panel = None
+        return self
+
+    def open_modal(self, name):
+        """
+        A modal was opened.
+        :param name: Str.
+        :return: Self.
+        """
+        self._modal = name
+        return self
+
+    def close_modal(self):
+        """
+        The modal was closed.
+        :return: Self.
+        """
+        self._modal = None
+        return self
+
+    def reset(self):
+        """
+        Forget the state of the page.
+        :return: Self.
+        """
+        self._chat = None
+        self._panel = None
+        self._modal = None
+        return self
+
+
+def reset_ui_on_error(method):
+    """
+    Decorator for WhatsApp methods: when the method raises, the page state is unknown and is reset.
+    :param method: Method of an object with an "ui" attribute.
+    :return: Wrapped method.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            self.ui.reset()
+            raise
+
+    return wrapper
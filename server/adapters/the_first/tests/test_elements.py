@@ -0,0 +1,164 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Elements Module
+"""
+import os
+from time import sleep
+
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+from server.adapters.the_first.elements.data import ManagerElementsData
+from server.adapters.the_first.elements.drivers import DriveElements, ElementItem, ElementPathType, SelectorRegistry
+from server.adapters.the_first.elements.optimizer import SelectorOptimizer, SelectorReport
+
+
+class FakeBrowser:
+    """
+    Selenium driver stand-in finding only some paths.
+    """
+
+    def __init__(self, paths=(), result=None):
+        self.paths = set(paths)
+        self.result = result
+        self.lookups = []
+
+    def find_element(self, by, value):
+        self.lookups.append(value)
+        if value not in self.paths:
+            raise NoSuchElementException(value)
+        return value
+
+    def execute_script(self, script, *args):
+        return self.result
+
+
+def new_registry(file_name, check_interval):
+    """
+    Registry outside of the process singleton.
+    :param file_name: Data file.
+    :param check_interval: Seconds between checks of the data file.
+    :return: SelectorRegistry.
+    """
+    registry = SelectorRegistry.__new__(SelectorRegistry)
+    registry.__init__(file_name=file_name, check_interval=check_interval)
+    return registry
+
+
+def test_registry_reloads_the_changed_file(tmp_path):
+    """
+    A saved file replaces the elements of every session; a broken file keeps them.
+    :param tmp_path: Pytest fixture.
+    :return: None.
+    """
+    file_name = str(tmp_path / 'elements_data.pkl')
+    registry = new_registry(file_name, check_interval=0.001)
+    default = registry.items['send_message'].path
+    assert registry.version == 1
+
+    ManagerElementsData(file_name).update({'send_message': '//span[@data-icon="send-v2"]', 'qr_code': ''}).save()
+    os.utime(file_name, ns=(1, 1))
+    while registry.version == 1:
+        items = registry.items
+    assert items['send_message'].path == '//span[@data-icon="send-v2"]' != default
+    assert items['qr_code'].path == ManagerElementsData().data['qr_code']
+
+    elements = DriveElements(browser=None)
+    elements._registry = registry
+    assert elements.get_element_paths('send_message') == ('//span[@data-icon="send-v2"]',)
+
+    with open(file_name, 'wb') as file:
+        file.write(b'broken')
+    os.utime(file_name, ns=(2, 2))
+    assert registry.reload().version == 2
+    assert registry.items['send_message'].path == '//span[@data-icon="send-v2"]'
+
+
+def test_registry_starts_from_the_saved_file(tmp_path):
+    """
+    A file saved before the registry is created is used from the start, merged over the default paths.
+    :param tmp_path: Pytest fixture.
+    :return: None.
+    """
+    file_name = str(tmp_path / 'elements_data.pkl')
+    ManagerElementsData(file_name).update({'send_message': ['span[data-icon="send"]', '//span']}).save()
+    registry = new_registry(file_name, check_interval=0)
+    assert registry.version == 1
+    assert [path for _, path in registry.items['send_message'].locators] == ['span[data-icon="send"]', '//span']
+    assert registry.items['qr_code'].path == ManagerElementsData().data['qr_code']
+
+
+def test_fallback_chain_learns_the_working_path(tmp_path):
+    """
+    A broken path falls back to the next one of the chain, which is tried first from then on.
+    :param tmp_path: Pytest fixture.
+    :return: None.
+    """
+    file_name = str(tmp_path / 'elements_data.pkl')
+    chain = ['span[data-icon="send"]', '//span[@data-icon="send"]']
+    ManagerElementsData(file_name).update({'send_message': chain}).save()
+    registry = new_registry(file_name, check_interval=0).reload()
+    item = registry.items['send_message']
+    assert item.locators == ((ElementPathType.CSS, 'span[data-icon="send"]'),
+                             (ElementPathType.X_PATH, '//span[@data-icon="send"]'))
+
+    browser = FakeBrowser(paths=['//span[@data-icon="send"]'])
+    elements = DriveElements(browser)
+    elements._registry = registry
+    assert elements.get_element('send_message') == '//span[@data-icon="send"]'
+    assert elements.get_element('send_message') == '//span[@data-icon="send"]'
+    assert browser.lookups == ['span[data-icon="send"]', '//span[@data-icon="send"]', '//span[@data-icon="send"]']
+    assert elements.get_presence_of_elements('send_message') == [
+        (By.XPATH, '//span[@data-icon="send"]'), (By.CSS_SELECTOR, 'span[data-icon="send"]')]
+    assert registry.stats.report()['send_message'] == {
+        '//span[@data-icon="send"]': {'hits': 2, 'misses': 0, 'rate': 1.0},
+        'span[data-icon="send"]': {'hits': 0, 'misses': 1, 'rate': 0.0}}
+
+    elements.found('send_message', ['span[data-icon="send"]', '//span[@data-icon="send"]'], 1)
+    assert registry.stats.report()['send_message']['span[data-icon="send"]'] == {'hits': 0, 'misses': 2, 'rate': 0.0}
+    elements.found('send_message', ['span[data-icon="send"]', '//span[@data-icon="send"]'], 0)
+    assert elements.get_element_path('send_message') == 'span[data-icon="send"]'
+
+
+def test_registry_logs_the_hit_rates(tmp_path, caplog):
+    """
+    The hit rates of the paths are logged once every stats interval.
+    :param tmp_path: Pytest fixture.
+    :param caplog: Pytest fixture.
+    :return: None.
+    """
+    registry = SelectorRegistry.__new__(SelectorRegistry)
+    registry.__init__(file_name=str(tmp_path / 'elements_data.pkl'), check_interval=0, stats_interval=0.001)
+    registry.stats.hit('send_message', '//span')
+    sleep(0.01)
+    with caplog.at_level('INFO'):
+        assert registry.items
+    assert "'send_message': {'//span': {'hits': 1, 'misses': 0, 'rate': 1.0}}" in caplog.text
+
+
+def test_optimizer_stores_the_fastest_chain(tmp_path):
+    """
+    Selectors faster than the path go first, the path stays in the chain; paths missing from the page are kept.
+    :param tmp_path: Pytest fixture.
+    :return: None.
+    """
+    browser = FakeBrowser(result={'count': 1, 'ms': 0.5, 'candidates': [
+        {'selector': 'span[data-icon="send"]', 'ms': 0.01}, {'selector': 'button span', 'ms': 0.9}]})
+    optimizer = SelectorOptimizer(browser, chain_size=3)
+    report = optimizer.benchmark('send_message', ElementItem('/html/body/div/span', ElementPathType.X_PATH))
+    assert optimizer.chain(report) == ['span[data-icon="send"]', '/html/body/div/span', 'button span']
+
+    file_name = str(tmp_path / 'elements_data.pkl')
+    ManagerElementsData(file_name).update({'search_edit': '/html/old/search', 'qr_code': '/html/old/canvas'}).save()
+    missing = SelectorReport('qr_code', '/html/canvas', 0, None, [])
+    optimizer.apply([report, missing], file_name)
+    data = ManagerElementsData(file_name).load().data
+    assert data['send_message'][0] == 'span[data-icon="send"]'
+    assert data['qr_code'] == ManagerElementsData().data['qr_code']
+    assert data['search_edit'] == ManagerElementsData().data['search_edit']
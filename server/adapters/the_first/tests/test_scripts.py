@@ -0,0 +1,197 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test In-page Scripts Module
+"""
+import pytest
+from selenium.common.exceptions import JavascriptException, TimeoutException
+from selenium.webdriver.common.by import By
+
+from server.adapters.the_first.classes import WhatsApp
+from server.adapters.the_first.scripts import DomExtractor, MutationWaiter, ParticipantExporter, QrCodeReader, \
+    TextComposer, UnreadTracker, WaitState
+
+
+class FakeElement:
+    """
+    Element with a fixed text.
+    """
+
+    def __init__(self, text=''):
+        self.text = text
+
+
+class FakeSelenium:
+    """
+    Selenium driver stand-in answering the in-page waits.
+    """
+
+    def __init__(self, result=None, error=None, elements=()):
+        self.result = result
+        self.error = error
+        self.elements = list(elements)
+        self.script_calls = []
+        self.script_timeouts = []
+
+    def set_script_timeout(self, value):
+        self.script_timeouts.append(value)
+
+    def execute_async_script(self, script, *args):
+        self.script_calls.append(args)
+        if self.error:
+            raise self.error
+        return self.result
+
+    def execute_script(self, script, *args):
+        self.script_calls.append(args)
+        return self.result
+
+    def find_elements(self, by, value):
+        return self.elements
+
+
+def test_waiter_answers_in_one_call():
+    """
+    The element found by the page is returned and the script timeout is only raised when needed.
+    :return: None.
+    """
+    element = FakeElement('online')
+    browser = FakeSelenium(result={'value': element, 'index': 0})
+    waiter = MutationWaiter(browser)
+    assert waiter.wait((By.XPATH, '//span'), WaitState.CLICKABLE, time_out=10) is element
+    assert waiter.wait((By.CSS_SELECTOR, 'span'), WaitState.TEXT_MATCHES, time_out=2, expected=r'\d') is element
+    assert browser.script_calls == [
+        ('xpath', '//span', 'clickable', None, 10000),
+        ('css selector', 'span', 'text_matches', r'\d', 2000),
+    ]
+    assert browser.script_timeouts == [15]
+
+
+def test_waiter_times_out():
+    """
+    A wait resolved without an element raises TimeoutException.
+    :return: None.
+    """
+    waiter = MutationWaiter(FakeSelenium(result=None))
+    with pytest.raises(TimeoutException):
+        waiter.wait((By.XPATH, '//span'), time_out=1)
+
+
+def test_waiter_falls_back_to_polling():
+    """
+    Pages refusing the script are polled with WebDriverWait from then on.
+    :return: None.
+    """
+    browser = FakeSelenium(error=JavascriptException('blocked'), elements=[FakeElement('last seen today')])
+    waiter = MutationWaiter(browser)
+    assert waiter.wait((By.XPATH, '//span'), WaitState.TEXT_MATCHES, time_out=1, expected='today').text.endswith(
+        'today')
+    assert waiter.wait((By.XPATH, '//span'), WaitState.TEXT_CHANGED, time_out=1, expected='online')
+    assert len(browser.script_calls) == 1
+
+
+def test_waiter_tries_the_fallback_chain():
+    """
+    The fallbacks of the element go to the page with the wait, and are polled when the script is refused. Both ways
+    tell which locator found the element.
+    :return: None.
+    """
+    matches = []
+    browser = FakeSelenium(result={'value': FakeElement(), 'index': 1})
+    MutationWaiter(browser).wait(
+        (By.CSS_SELECTOR, 'span.a'), time_out=1, fallbacks=[(By.XPATH, '//span')], on_match=matches.append)
+    assert browser.script_calls == [('css selector', 'span.a', 'present', None, 1000, [['xpath', '//span']])]
+    assert matches == [1]
+
+    condition = WaitState.TEXT_MATCHES.new_chain_condition(
+        [(By.CSS_SELECTOR, 'span.a'), (By.XPATH, '//span')], on_match=matches.append)
+    assert condition(FakeSelenium(elements=[FakeElement('online')])).text == 'online'
+    assert not condition(FakeSelenium(elements=[]))
+    assert matches == [1, 0]
+
+
+def test_composer_inserts_the_whole_message():
+    """
+    The message goes to the page in one call; a refused script makes the caller type it.
+    :return: None.
+    """
+    element, message = FakeElement(), 'Hello \U0001F600\nsecond line'
+    browser = FakeSelenium(result=True)
+    assert TextComposer(MutationWaiter(browser)).insert(element, message)
+    assert browser.script_calls == [(element, message)]
+
+    browser = FakeSelenium(error=JavascriptException('blocked'))
+    composer = TextComposer(MutationWaiter(browser))
+    assert not composer.insert(element, message)
+    assert not composer.insert(element, message)
+    assert len(browser.script_calls) == 1
+
+
+def test_extractor_sends_only_the_fields():
+    """
+    The extractor asks the page for the fields in one call.
+    :return: None.
+    """
+    browser = FakeSelenium(result=[{'username': 'Friend'}])
+    chats = DomExtractor(browser).extract(
+        'div.chat', {'username': ('div.name', None)}, required='div.unread', scroll=('#pane-side', 10))
+    assert chats == [{'username': 'Friend'}]
+    assert browser.script_calls == [
+        ('div.chat', {'username': ['div.name', None]}, 'div.unread', False, ['#pane-side', 10])]
+    assert DomExtractor(FakeSelenium(result=None)).extract('div.chat', {}) == []
+
+
+def test_unread_tracker_applies_the_changes():
+    """
+    The first read replaces the index with the whole list, the next ones only apply the changes.
+    :return: None.
+    """
+    browser = FakeSelenium(result={'full': True, 'changes': {'Friend': 2, 'Group': 0}})
+    tracker = UnreadTracker(MutationWaiter(browser), ('#pane-side', 'div.item', 'span.name', 'span.unread'))
+    assert tracker.unread() == {'Friend': 2}
+    browser.result = {'full': False, 'changes': {'Friend': 0, 'Group': 5}}
+    assert tracker.count('Group') == 5 and tracker.count('Friend') == 0
+    assert [call[0] for call in browser.script_calls] == ['scan', 'changes', 'changes']
+    browser.result = None
+    assert tracker.unread() == {'Group': 5}
+
+
+def test_participants_are_exported_once_and_cached():
+    """
+    The exporter reads the list in one call and the count of the group is served from the cache. Members with the
+    same name are all counted.
+    :return: None.
+    """
+    browser = FakeSelenium(result=['Ana', 'Bia', 'Ana', 'You'])
+    exporter = ParticipantExporter(MutationWaiter(browser), ('div.list', 'div.item', 'span.name'), time_out=30)
+    assert exporter.export() == ['Ana', 'Bia', 'Ana', 'You']
+    assert browser.script_calls == [('div.list', 'div.item', 'span.name')]
+    assert browser.script_timeouts == [35]
+    assert 'data-id' in ParticipantExporter.SCRIPT and 'new Set' not in ParticipantExporter.SCRIPT
+
+    whatsapp = WhatsApp(wait=10)
+    whatsapp.participants_cache.set('Group', ('Ana', 'Bia', 'Ana', 'You'))
+    assert whatsapp.get_group_participants('Group') == ['Ana', 'Bia', 'Ana', 'You']
+    assert whatsapp.participants_count_for_group('Group') == 4
+
+
+def test_qr_code_is_read_from_the_page():
+    """
+    The payload comes from the page without a screenshot, its image is made once and an empty answer asks for the
+    screenshot.
+    :return: None.
+    """
+    browser = FakeSelenium(result={'ref': '2@abc,def', 'png': None})
+    assert QrCodeReader(browser).read(FakeElement()) == '2@abc,def'
+    browser.result = {'ref': None, 'png': None}
+    assert QrCodeReader(browser).read(FakeElement()) is None
+
+    whatsapp = WhatsApp(wait=10)
+    image = whatsapp._qr_code_image('2@abc,def')
+    assert whatsapp._qr_code_image('2@abc,def') is image
+    assert whatsapp._qr_code_image('2@xyz,def') != image
@@ -0,0 +1,97 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test UI State Module
+"""
+import pytest
+
+from core import settings
+from core.utils.browsers.classes import BrowserPool
+from server.adapters.the_first.classes import WhatsApp
+from server.adapters.the_first.states import UiPanel, UiState
+from server.commands.messages.exceptions import SendMessageException
+
+
+def test_ui_state_tracks_chat_panel_and_modal():
+    """
+    The open chat is only reported while no modal covers it.
+    :return: None.
+    """
+    ui = UiState().open_chat(' My Group ').open_panel(UiPanel.GROUP)
+    assert ui.is_chat_open('my group') and ui.panel == UiPanel.GROUP
+    ui.open_modal('attach')
+    assert not ui.is_chat_open('my group')
+    ui.close_modal()
+    assert ui.is_chat_open('My Group') and not ui.is_chat_open('Other')
+    assert ui.reset().chat is None and ui.panel is None
+
+
+def test_open_chat_skips_the_search(monkeypatch):
+    """
+    Navigating to the chat that is already open does not touch the search panel; errors forget the state.
+    :param monkeypatch: Pytest fixture.
+    :return: None.
+    """
+    whatsapp = WhatsApp(wait=10)
+    whatsapp.ui.open_chat('My Group')
+    monkeypatch.setattr(whatsapp, '_chat_title', lambda name: object())
+
+    def search_panel(element_name, time_out=10):
+        raise AssertionError('The search panel must not be used.')
+
+    monkeypatch.setattr(whatsapp, 'wait_for_clickable', search_panel)
+    assert whatsapp.access_search_panel('My Group') is whatsapp
+
+    with pytest.raises(SendMessageException):
+        whatsapp.send_message('My Group', 'Hello')
+    assert whatsapp.ui.chat is None
+
+
+class FakeBrowser:
+    """
+    Page of a pooled browser recording the calls.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def refresh(self):
+        self.calls.append('refresh')
+
+    def execute_script(self, script, *args):
+        return 'complete'
+
+
+class FakeDriver:
+    """
+    Pooled driver stand-in.
+    """
+    dense = False
+    save_cookies = True
+
+    def __init__(self):
+        self.browser = FakeBrowser()
+
+
+def test_warm_browser_reloads_the_replayed_session(monkeypatch):
+    """
+    A browser taken from the pool is reloaded after the Local Storage and the cookies are replayed.
+    :param monkeypatch: Pytest fixture.
+    :return: None.
+    """
+    driver = FakeDriver()
+    monkeypatch.setattr(BrowserPool, 'acquire', lambda pool, token, no_headless: driver)
+    monkeypatch.setattr(settings, 'BROWSER_PROFILES', False)
+    whatsapp = WhatsApp(wait=10, token='warm')
+    monkeypatch.setattr(whatsapp, '_load_storage', lambda: driver.browser.calls.append('storage'))
+    monkeypatch.setattr(whatsapp, '_get_cookies', lambda: driver.browser.calls.append('cookies'))
+    try:
+        assert whatsapp.connect()
+        assert driver.browser.calls == ['storage', 'cookies', 'refresh']
+    finally:
+        whatsapp.driver = None
@@ -38,10 +38,54 @@ class Quit(AbstractCommand):
         return self
 
 
+class MemoryUsage(AbstractCommand):
+    """
+    Command to report the resident memory of the session browser.
+    """
+    name = 'MemoryUsage'
+
+    def __init__(self, adaptee, args):
+        super().__init__(adaptee, args)
+
+    def __str__(self):
+        return self.name
+
+    def invoke(self):
+        """
+        Run Command.
+        :return: Self.
+        """
+        if self.adaptee:
+            self._result = self.adaptee.manager.memory_usage()
+        return self
+
+
+class SaveStorage(AbstractCommand):
+    """
+    Command to take a snapshot of the session Local Storage.
+    """
+    name = 'SaveStorage'
+
+    def __init__(self, adaptee, args):
+        super().__init__(adaptee, args)
+
+    def __str__(self):
+        return self.name
+
+    def invoke(self):
+        """
+        Run Command.
+        :return: Self.
+        """
+        if self.adaptee:
+            self._result = self.adaptee.manager.save_storage()
+        return self
+
+
 class ManagerCommandsRegister:
     """
     Register for management commands.
     """
     available_classes = (
-        Quit,
+        Quit, MemoryUsage, SaveStorage,
     )
@@ -8,6 +8,8 @@ Aug 2021
 
 Command Manager Module
 """
+from types import MappingProxyType
+
 from server.commands.classes import NoCommand
 from server.commands.groups.classes import GroupCommandsRegister
 from server.commands.managements.classes import ManagerCommandsRegister
@@ -16,6 +18,54 @@ from server.commands.persons.classes import PersonsCommandsRegister
 from server.commands.properties.classes import PropertiesCommandsRegister
 
 
+class CommandRegistry:
+    """
+    Read-only index of the available commands, built once and shared by every session.
+    """
+    registers = (
+        GroupCommandsRegister, MessageCommandsRegister, ManagerCommandsRegister, PropertiesCommandsRegister,
+        PersonsCommandsRegister,
+    )
+
+    def __init__(self):
+        commands = {}
+        for register in self.registers:
+            for cmd in register.available_classes:
+                commands.setdefault(cmd.name, cmd)
+        self._commands = MappingProxyType(commands)
+        self._substrings = frozenset(
+            name[start:end] for name in commands for start in range(len(name) + 1)
+            for end in range(start, len(name) + 1))
+
+    @property
+    def commands(self):
+        """
+        Mapping of command names to command classes.
+        :return: MappingProxyType.
+        """
+        return self._commands
+
+    def get(self, name, default=NoCommand):
+        """
+        Retrieve the class of a command.
+        :param name: Command name.
+        :param default: Class returned for unknown names.
+        :return: Command class.
+        """
+        return self._commands.get(name, default)
+
+    def has_text(self, text):
+        """
+        Check if the text is part of any command name.
+        :param text: Information to look for.
+        :return: Bool.
+        """
+        return text in self._substrings
+
+
+COMMAND_REGISTRY = CommandRegistry()
+
+
 class AvailableCommands:
     """
     Register for available commands.
@@ -27,11 +77,7 @@ class AvailableCommands:
         Method for exposing commands.
         :return:
         """
-        commands = \
-            GroupCommandsRegister.available_classes + MessageCommandsRegister.available_classes + \
-            ManagerCommandsRegister.available_classes + PropertiesCommandsRegister.available_classes + \
-            PersonsCommandsRegister.available_classes
-        return [{'name': cmd.name, 'class': cmd} for cmd in commands]
+        return [{'name': name, 'class': cmd} for name, cmd in COMMAND_REGISTRY.commands.items()]
 
 
 class CommandManager:
@@ -41,11 +87,9 @@ class CommandManager:
 
     def __init__(self, adaptee):
         self._adaptee = adaptee
-        self._commands = AvailableCommands.get()
 
     def __del__(self):
         del self._adaptee
-        self._commands = None
 
     def parse_command(self, name, args):
         """
@@ -54,20 +98,13 @@ class CommandManager:
         :param args: Attributes for the command.
         :return:
         """
-        command = NoCommand
-        for com in self._commands:
-            if name == com['name']:
-                command = com['class']
-                break
-        return command(self._adaptee, args)
-
-    def check(self, text):
+        return COMMAND_REGISTRY.get(name)(self._adaptee, args)
+
+    @staticmethod
+    def check(text):
         """
         Method for verifying the exposure of a command.
         :param text: Information to look for.
         :return: True/False.
         """
-        for com in self._commands:
-            if text in com['name']:
-                return True
-        return False
+        return COMMAND_REGISTRY.has_text(text)
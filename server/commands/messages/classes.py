@@ -96,10 +96,32 @@ class SendDocument(AbstractCommand):
         return self
 
 
+class UnreadChats(AbstractCommand):
+    """
+    Command to list the chats with unread messages.
+    """
+    name = 'UnreadChats'
+
+    def __init__(self, adaptee, args):
+        super().__init__(adaptee, args)
+
+    def __str__(self):
+        return self.name
+
+    def invoke(self):
+        """
+        Run Command.
+        :return: Self.
+        """
+        if self.adaptee:
+            self._result = self.adaptee.manager.unread_chats()
+        return self
+
+
 class MessageCommandsRegister:
     """
     Register for message commands.
     """
     available_classes = (
-        SendMessage, SendPicture, SendDocument,
+        SendMessage, SendPicture, SendDocument, UnreadChats,
     )
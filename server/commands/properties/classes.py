@@ -63,6 +63,31 @@ class CheckPoint(AbstractCommand):
         return self
 
 
+class Restore(AbstractCommand):
+    """
+    Command to open the session and verify authentication is complete.
+    """
+    name = 'Restore'
+
+    def __init__(self, adaptee, args):
+        super().__init__(adaptee, args)
+
+    def __str__(self):
+        return self.name
+
+    def invoke(self):
+        """
+        Run Command.
+        :return: Self.
+        """
+        if self.adaptee:
+            try:
+                self._result = self.adaptee.properties.restore()
+            except CheckPointException as e:
+                self._result = e.message
+        return self
+
+
 class IsConnected(AbstractCommand):
     """
     Command to check if it is connected.
@@ -94,5 +119,5 @@ class PropertiesCommandsRegister:
     Register for the property command.
     """
     available_classes = (
-        GetQrCode, CheckPoint, IsConnected,
+        GetQrCode, CheckPoint, Restore, IsConnected,
     )
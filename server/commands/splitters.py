@@ -59,3 +59,59 @@ class SplitterCommand:
         :return: Tuple.
         """
         return self._token, self._command, self._args
+
+
+class BatchSplitterCommand(SplitterCommand):
+    """
+    Class to separate the sub-commands of a batch.
+    A batch carries several commands of the same token, separated by RECORD_SEPARATOR (shown as <RS>):
+    'token||Batch<RS>SendMessage||Group||Message 1<RS>SendMessage||Group||Message 2'
+    """
+    COMMAND = 'Batch'
+    RECORD_SEPARATOR = '\x1e'
+
+    def __init__(self, data):
+        super().__init__(data)
+        self._items = []
+
+    @classmethod
+    def is_batch(cls, data):
+        """
+        Check if the data is a batch.
+        :param data: Command Data.
+        :return: Bool.
+        """
+        return isinstance(data, str) and cls.RECORD_SEPARATOR in data and \
+            data.split(cls.RECORD_SEPARATOR, 1)[0].endswith(f'{cls.SEPARATOR}{cls.COMMAND}')
+
+    @classmethod
+    def join(cls, token, commands):
+        """
+        Build the data of a batch.
+        :param token: Token string.
+        :param commands: List of commands without the token ('Command||args').
+        :return: Str.
+        """
+        return cls.RECORD_SEPARATOR.join([f'{token}{cls.SEPARATOR}{cls.COMMAND}'] + list(commands))
+
+    def process(self):
+        """
+        Split the token and the sub-commands with their args.
+        :return: Self.
+        """
+        head, *records = self._data.split(self.RECORD_SEPARATOR)
+        self._token, self._command, _ = SplitterCommand(head).process().result()
+        if self._command != self.COMMAND or not records:
+            raise ParserCommandException()
+        self._items = []
+        for record in records:
+            _, command, args = SplitterCommand(f'{self._token}{self.SEPARATOR}{record}').process().result()
+            self._items.append((command, args))
+        return self
+
+    def result(self):
+        """
+        Mount the result values with attributes.
+        :return: Tuple (token, command, list of (command, args)).
+        """
+        return self._token, self._command, self._items
@@ -8,13 +8,25 @@ Aug 2021
 
 Manager Module
 """
-from multiprocessing import Semaphore
+from concurrent.futures import Future, TimeoutError
+from functools import partial
+from threading import Event, Lock, Thread
+from time import monotonic
 
 from apps.exceptions import ParserCommandException
+from core import settings
+from core.utils.browsers.classes import BrowserPool
+from core.utils.browsers.local_storage import StorageWriter
+from core.logs import logging
 from core.singletons.singleton_meta import Singleton
+from core.utils.processes import ProcessTree
+from server.actors import TokenActor
 from server.commands.managers import CommandManager
-from server.commands.splitters import SplitterCommand
+from server.commands.splitters import BatchSplitterCommand, SplitterCommand
 from server.factories.whatsapp import FactoryWhatsappAdapter
+from server.processes import SessionProcessPool
+
+logger = logging.getLogger(__name__)
 
 
 class ManagerSingleton(metaclass=Singleton):
@@ -23,9 +35,16 @@ class ManagerSingleton(metaclass=Singleton):
     """
 
     _adapter = FactoryWhatsappAdapter.DEFAULT
-    _managers = {}
-    _semaphore = Semaphore()
+    _actors = {}
+    _lock = Lock()
     _no_headless = False
+    _pool = None
+    _max_sessions = 0
+    _idle_timeout = 0.0
+    _memory_budget = 0
+    _reaper = None
+    _reaper_stop = Event()
+    _on_released = None
 
     @property
     def adapter(self):
@@ -61,27 +80,282 @@ class ManagerSingleton(metaclass=Singleton):
         self._adapter = value
         return self
 
-    def _get_manager(self, token):
+    def set_on_released(self, callback):
+        """
+        Be told when the session of a token ends (Quit or eviction) and no command is waiting for it.
+        :param callback: Callable receiving the token, or None.
+        :return: Self.
+        """
+        self._on_released = callback
+        return self
+
+    def stopping(self):
+        """
+        Tell the session processes that the server is stopping, so the ones that end are not replaced.
+        :return: Self.
+        """
+        if self._pool:
+            self._pool.stopping()
+        return self
+
+    @property
+    def pool(self):
+        """
+        Get the session processes pool, None when the sessions run in this process.
+        :return: SessionProcessPool or None.
+        """
+        return self._pool
+
+    def set_processes(self, processes, sessions_per_process):
+        """
+        Run the sessions in a pool of worker processes instead of this process.
+        Must be called after "set_adapter" and "set_no_headless".
+        :param processes: Number of worker processes (0 keeps the sessions in this process).
+        :param sessions_per_process: Sessions assigned to each process.
+        :return: Self.
+        """
+        if self._pool:
+            self._pool.stop()
+            self._pool = None
+        if processes > 0:
+            self._pool = SessionProcessPool(
+                processes=processes, sessions_per_process=sessions_per_process,
+                adapter=self._adapter, no_headless=self._no_headless)
+        return self
+
+    def start_browser_pool(self, size=settings.BROWSER_POOL_SIZE, refill_interval=settings.BROWSER_POOL_REFILL_INTERVAL,
+                           max_uses=settings.BROWSER_POOL_MAX_USES):
+        """
+        Keep browsers ready for new sessions. The session processes keep their own pools.
+        Persistent profiles are chosen when the browser is launched, so they do not use the pool.
+        :param size: Browsers kept ready (0 disables the pool).
+        :param refill_interval: Seconds between two launches.
+        :param max_uses: Sessions served by a browser before it is replaced.
+        :return: Self.
+        """
+        if settings.BROWSER_PROFILES:
+            return self
+        if size > 0 and not self._pool and self._adapter == FactoryWhatsappAdapter.DEFAULT:
+            BrowserPool().start(
+                size=size, refill_interval=refill_interval, max_uses=max_uses, no_headless=self._no_headless)
+        return self
+
+    def set_eviction(self, max_sessions=settings.SESSION_MAX, idle_timeout=settings.SESSION_IDLE_TIMEOUT,
+                     memory_budget_mb=settings.SESSION_MEMORY_BUDGET_MB, interval=settings.SESSION_EVICTION_INTERVAL):
+        """
+        Limit the live sessions. Idle sessions are quit (saving their Local Storage) in least recently used order
+        and are revived by the next command of their token. The session processes apply their own limits.
+        :param max_sessions: Live sessions (0 is unlimited).
+        :param idle_timeout: Seconds without commands before a session is quit (0 disables).
+        :param memory_budget_mb: Resident memory allowed for the browser processes (0 disables).
+        :param interval: Seconds between checks of the idle timeout and the memory budget.
+        :return: Self.
+        """
+        if self._pool:
+            return self
+        self._max_sessions = max_sessions
+        self._idle_timeout = idle_timeout
+        self._memory_budget = memory_budget_mb * 1024 * 1024
+        if self._memory_budget and not ProcessTree.available():
+            logger.warning('The memory budget is not supported in this system.')
+            self._memory_budget = 0
+        if (self._idle_timeout or self._memory_budget) and self._reaper is None:
+            self._reaper_stop.clear()
+            self._reaper = Thread(target=self._reap, args=(interval,), name='zap-session-reaper', daemon=True)
+            self._reaper.start()
+        return self
+
+    def _live_actors(self):
+        """
+        Actors that were not asked to quit, least recently used first.
+        :return: List of TokenActor.
+        """
+        with self._lock:
+            actors = [actor for actor in self._actors.values() if not actor.closed and not actor.evicting]
+        return sorted(actors, key=lambda actor: actor.last_activity)
+
+    def _evict(self, actor, reason):
+        """
+        Quit an idle session.
+        :param actor: TokenActor.
+        :param reason: Text for the log.
+        :return: Future of the "Quit" command or None when the actor is busy.
+        """
+        future = actor.evict()
+        if future:
+            logger.info(f'Evicting session {actor.token}: {reason}.')
+        return future
+
+    def _evict_over_limit(self):
+        """
+        Quit the least recently used sessions above the max number of sessions.
+        :return: None.
+        """
+        actors = self._live_actors()
+        excess = len(actors) - self._max_sessions
+        for actor in actors:
+            if excess <= 0:
+                break
+            if self._evict(actor, 'too many sessions'):
+                excess -= 1
+
+    def _evict_idle(self):
+        """
+        Quit the sessions without commands for longer than the idle timeout.
+        :return: None.
+        """
+        limit = monotonic() - self._idle_timeout
+        for actor in self._live_actors():
+            if actor.last_activity < limit:
+                self._evict(actor, 'idle timeout')
+
+    def _evict_over_budget(self, timeout=30.0):
+        """
+        Quit the least recently used sessions while the browsers use more memory than the budget.
+        :param timeout: Seconds to wait for each session to quit.
+        :return: None.
+        """
+        tree = ProcessTree()
+        for actor in self._live_actors():
+            if tree.rss() <= self._memory_budget or self._reaper_stop.is_set():
+                break
+            future = self._evict(actor, 'memory budget')
+            if future:
+                try:
+                    future.result(timeout=timeout)
+                except TimeoutError:
+                    pass
+
+    def _reap(self, interval):
         """
-        Get manager to execute command instance.
+        Check the idle timeout and the memory budget periodically.
+        :param interval: Seconds.
+        :return: None.
+        """
+        while not self._reaper_stop.wait(interval):
+            try:
+                if self._idle_timeout:
+                    self._evict_idle()
+                if self._memory_budget:
+                    self._evict_over_budget()
+            except Exception as e:
+                logger.exception(e)
+
+    def _new_manager(self, token):
+        """
+        Create the manager to execute the commands of a token.
         :param token: Token string.
         :return: CommandManager instance.
         """
-        manager = self._managers.get(token)
-        if manager is None:
-            manager = CommandManager(
-                self._adapter.get_cls(
+        return CommandManager(
+            self._adapter.get_cls(
+                token=token,
+                no_headless=self._no_headless
+            )
+        )
+
+    def _get_actor(self, token):
+        """
+        Get the actor that serializes the commands of a token.
+        :param token: Token string.
+        :return: TokenActor instance.
+        """
+        with self._lock:
+            actor = self._actors.get(token)
+            if actor is None or actor.closed:
+                actor = TokenActor(
                     token=token,
-                    no_headless=self._no_headless
+                    manager_factory=lambda: self._new_manager(token),
+                    on_stop=self._actor_stopped
                 )
-            )
-            self._semaphore.acquire()
-            try:
-                self._managers[token] = manager
-            finally:
-                self._semaphore.release()
+                self._actors[token] = actor
+                created = True
+            else:
+                created = False
+        if created and self._max_sessions:
+            self._evict_over_limit()
+        return actor
 
-        return manager
+    def _actor_stopped(self, actor, pending):
+        """
+        Forget a stopped actor and give its remaining commands to a new session.
+        :param actor: TokenActor instance.
+        :param pending: Commands queued after the stop.
+        :return: None.
+        """
+        with self._lock:
+            if self._actors.get(actor.token) is actor:
+                self._actors.pop(actor.token)
+        for future, command, args in pending:
+            self._submit(actor.token, command, args, future)
+        if not pending and self._on_released:
+            self._on_released(actor.token)
+
+    def _submit(self, token, command, args, future=None):
+        """
+        Put the command in the token's mailbox.
+        :param token: Token string.
+        :param command: Command name.
+        :param args: Command args.
+        :param future: Future to resolve (optional).
+        :return: Future.
+        """
+        result = None
+        while result is None:
+            result = self._get_actor(token).submit(command, args, future)
+        return result
+
+    def _submit_batch(self, token, items, on_item=None):
+        """
+        Put the sub-commands of a batch in the token's mailbox, in order and without other commands between them.
+        :param token: Token string.
+        :param items: List of (command, args).
+        :param on_item: Callable receiving (index, result) as each sub-command finishes (optional).
+        :return: Future with the list of results.
+        """
+        futures = None
+        while futures is None:
+            futures = self._get_actor(token).submit_many(items)
+        batch = Future()
+        remaining = [len(futures)]
+        lock = Lock()
+
+        def done(index, future):
+            if on_item:
+                try:
+                    on_item(index, future.result())
+                except Exception as e:
+                    logger.exception(e)
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                batch.set_result([item.result() for item in futures])
+
+        for position, item_future in enumerate(futures):
+            item_future.add_done_callback(partial(done, position))
+        return batch
+
+    def submit_command(self, command_data, on_item=None):
+        """
+        Schedule the selected command without waiting for it.
+        :param command_data: Command Data or batch.
+        :param on_item: Callable receiving (index, result) as each sub-command of a batch finishes (optional).
+        :return: Future with the command result (a list of results for a batch) or exception message.
+        """
+        batch = BatchSplitterCommand.is_batch(command_data)
+        try:
+            splitter = BatchSplitterCommand if batch else SplitterCommand
+            token, command, args = splitter(command_data).process().result()
+        except ParserCommandException as e:
+            future = Future()
+            future.set_result(e.message)
+            return future
+        if self._pool:
+            return self._pool.submit(token, command, command_data, on_item)
+        if batch:
+            return self._submit_batch(token, args, on_item)
+        return self._submit(token, command, args)
 
     def run_command(self, command_data):
         """
@@ -89,27 +363,30 @@ class ManagerSingleton(metaclass=Singleton):
         :param command_data: Command Data.
         :return: Str with the command result or exception.
         """
-        try:
-            token, command, args = SplitterCommand(command_data).process().result()
-        except ParserCommandException as e:
-            return e.message
-        else:
-            manager = self._get_manager(token)
-            try:
-                cmd = manager.parse_command(command, args)
-                try:
-                    result = cmd.invoke().result
-                finally:
-                    if cmd.name == 'Quit':
-                        self._semaphore.acquire()
-                        try:
-                            self._managers.pop(token)
-                        finally:
-                            self._semaphore.release()
-                        del manager
-            except Exception as e:
-                result = str(e)
-            return result
+        return self.submit_command(command_data).result()
+
+    def shutdown(self, timeout=None):
+        """
+        Quit every session.
+        :param timeout: Seconds to wait for each session.
+        :return: Self.
+        """
+        self.stopping()
+        self._reaper_stop.set()
+        if self._reaper:
+            self._reaper.join(timeout=timeout)
+            self._reaper = None
+        with self._lock:
+            actors = list(self._actors.values())
+        for actor in actors:
+            actor.submit('Quit', None)
+        for actor in actors:
+            actor.join(timeout=timeout)
+        BrowserPool().stop()
+        StorageWriter().flush(timeout=timeout)
+        if self._pool:
+            self._pool.stop(timeout=timeout)
+        return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
@@ -119,7 +396,4 @@ class ManagerSingleton(metaclass=Singleton):
         :param exc_tb:
         :return:
         """
-        for manager in self._managers:
-            cmd = manager.parse_command('Quit', None)
-            cmd.invoke()
-        self._managers = None
+        self.shutdown()
@@ -0,0 +1,351 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Session Processes Module
+"""
+import signal
+from concurrent.futures import Future
+from functools import partial
+from itertools import count
+from math import ceil
+from multiprocessing import get_context
+from threading import Lock, Thread
+
+from core import settings
+from core.logs import logging
+from server.commands.splitters import SplitterCommand
+
+logger = logging.getLogger(__name__)
+
+
+class SessionProcess:
+    """
+    Worker process that owns a group of browser sessions and receives their commands over a pipe.
+    """
+
+    def __init__(self, index, adapter, no_headless, on_exit, shards=1, on_released=None):
+        """
+        :param index: Position in the pool.
+        :param adapter: FactoryWhatsappAdapter used by the sessions.
+        :param no_headless: Show the browser window.
+        :param on_exit: Callable receiving the process when it ends.
+        :param shards: Number of processes sharing the host session limits.
+        :param on_released: Callable receiving (process, token, last request id) when a session of the worker ends.
+        """
+        context = get_context('spawn')
+        self.index = index
+        self.tokens = set()
+        self.last_requests = {}
+        self._on_exit = on_exit
+        self._on_released = on_released
+        self._ids = count(1)
+        self._lock = Lock()
+        self._send_lock = Lock()
+        self._pending = {}
+        self._on_items = {}
+        self._alive = True
+        self._connection, child = context.Pipe()
+        self._process = context.Process(
+            target=SessionProcess.run, args=(child, adapter, no_headless, shards), name=f'zap-sessions-{index}',
+            daemon=True)
+        self._process.start()
+        child.close()
+        self._reader = Thread(target=self._read, name=f'zap-sessions-reader-{index}', daemon=True)
+        self._reader.start()
+
+    @property
+    def pid(self):
+        """
+        Worker process id.
+        :return: Int.
+        """
+        return self._process.pid
+
+    def submit(self, command_data, token=None, on_item=None):
+        """
+        Send a command to the worker process.
+        :param command_data: Command Data.
+        :param token: Token of the command, recorded to match the session end reports.
+        :param on_item: Callable receiving (index, result) as each sub-command of a batch finishes (optional).
+        :return: Future with the command result.
+        """
+        future = Future()
+        with self._lock:
+            if not self._alive:
+                future.set_result(f'Session process {self.index} is not available.')
+                return future
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            if on_item:
+                self._on_items[request_id] = on_item
+            if token is not None:
+                self.last_requests[token] = request_id
+        try:
+            with self._send_lock:
+                self._connection.send((request_id, command_data, on_item is not None))
+        except OSError as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+                self._on_items.pop(request_id, None)
+            future.set_result(str(e))
+        return future
+
+    def _read(self):
+        """
+        Resolve the pending Futures as the worker answers.
+        :return: None.
+        """
+        try:
+            while True:
+                message = self._connection.recv()
+                request_id = message[0]
+                if request_id is None:
+                    if self._on_released:
+                        self._on_released(self, *message[1])
+                    continue
+                if len(message) == 3:
+                    with self._lock:
+                        on_item = self._on_items.get(request_id)
+                    if on_item:
+                        on_item(*message[1:])
+                    continue
+                result = message[1]
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                    self._on_items.pop(request_id, None)
+                if future:
+                    future.set_result(result)
+        except (EOFError, OSError) as e:
+            logger.debug(f'Session process {self.index} closed: {e}')
+        with self._lock:
+            self._alive = False
+            pending, self._pending = list(self._pending.values()), {}
+            self._on_items.clear()
+        for future in pending:
+            future.set_result(f'Session process {self.index} ended before answering.')
+        self._on_exit(self)
+
+    def stop(self, timeout=None):
+        """
+        Ask the worker to quit its sessions and wait for it.
+        :param timeout: Seconds.
+        :return: Self.
+        """
+        try:
+            with self._send_lock:
+                self._connection.send(None)
+        except OSError:
+            pass
+        self._process.join(timeout=timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        return self
+
+    @staticmethod
+    def run(connection, adapter, no_headless, shards=1):
+        """
+        Worker process loop. Ctrl+C reaches the whole process group: the worker ignores it and quits its sessions
+        when the main process sends None. Requests are (request id, command data, stream) and are answered with
+        (request id, result); a streamed batch also sends (request id, index, result) as each sub-command finishes.
+        Every session that ends is reported as (None, (token, last request id)).
+        :param connection: Pipe to the main process.
+        :param adapter: FactoryWhatsappAdapter used by the sessions.
+        :param no_headless: Show the browser window.
+        :param shards: Number of processes sharing the host session limits.
+        :return: None.
+        """
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # Imported here: the manager module itself routes commands to this one.
+        from server.managers import ManagerSingleton
+
+        lock = Lock()
+        last_requests = {}
+
+        def send(message):
+            try:
+                with lock:
+                    connection.send(message)
+            except OSError as e:
+                logger.debug(f'Main process is gone: {e}')
+
+        def reply(request_id, future):
+            send((request_id, future.result()))
+
+        def send_item(request_id, index, result):
+            send((request_id, index, result))
+
+        def released(token):
+            send((None, (token, last_requests.get(token))))
+
+        manager = ManagerSingleton().set_adapter(adapter).set_no_headless(no_headless).start_browser_pool()
+        manager.set_on_released(released).set_eviction(
+            max_sessions=ceil(settings.SESSION_MAX / shards),
+            memory_budget_mb=settings.SESSION_MEMORY_BUDGET_MB // shards)
+
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            request_id, command_data, stream = message
+            last_requests[command_data.split(SplitterCommand.SEPARATOR, 1)[0]] = request_id
+            on_item = partial(send_item, request_id) if stream else None
+            manager.submit_command(command_data, on_item=on_item).add_done_callback(partial(reply, request_id))
+        manager.shutdown()
+        connection.close()
+
+
+class SessionProcessPool:
+    """
+    Routes the commands of each token to the worker process that owns its session.
+    """
+
+    def __init__(self, processes, sessions_per_process, adapter, no_headless):
+        """
+        :param processes: Number of worker processes.
+        :param sessions_per_process: Sessions assigned to a process before the next one is preferred.
+        :param adapter: FactoryWhatsappAdapter used by the sessions.
+        :param no_headless: Show the browser window.
+        """
+        self._sessions_per_process = sessions_per_process
+        self._adapter = adapter
+        self._no_headless = no_headless
+        self._lock = Lock()
+        self._running = True
+        self._tokens = {}
+        self._shards = processes
+        self._processes = [self._new_process(index) for index in range(processes)]
+
+    def _new_process(self, index):
+        """
+        Start a worker process.
+        :param index: Position in the pool.
+        :return: SessionProcess.
+        """
+        return SessionProcess(
+            index, self._adapter, self._no_headless, on_exit=self._process_exited, shards=self._shards,
+            on_released=self._session_ended)
+
+    @property
+    def processes(self):
+        """
+        Worker processes.
+        :return: List of SessionProcess.
+        """
+        return list(self._processes)
+
+    def process_of(self, token):
+        """
+        Retrieve the process that owns a token.
+        :param token: Token string.
+        :return: SessionProcess or None.
+        """
+        with self._lock:
+            return self._tokens.get(token)
+
+    def _assign(self, token):
+        """
+        Get the process of a token, assigning the least loaded one to new tokens.
+        :param token: Token string.
+        :return: SessionProcess.
+        """
+        with self._lock:
+            process = self._tokens.get(token)
+            if process is None:
+                process = min(self._processes, key=lambda p: len(p.tokens))
+                if len(process.tokens) >= self._sessions_per_process:
+                    logger.warning(f'Every session process is full, token {token} goes to process {process.index}.')
+                process.tokens.add(token)
+                self._tokens[token] = process
+            # Not sent yet: a session end reported meanwhile must not free the slot.
+            process.last_requests[token] = 0
+        return process
+
+    def _release(self, token, process):
+        """
+        Free the slot of a token that quit.
+        :param token: Token string.
+        :param process: SessionProcess.
+        :return: None.
+        """
+        with self._lock:
+            if self._tokens.get(token) is process:
+                self._tokens.pop(token)
+            process.tokens.discard(token)
+            process.last_requests.pop(token, None)
+
+    def _session_ended(self, process, token, last_request):
+        """
+        Free the slot of a token whose session ended inside the worker (Quit or eviction). A command sent after the
+        last one the worker had seen keeps the slot, since it opens the session again.
+        :param process: SessionProcess.
+        :param token: Token string.
+        :param last_request: Id of the last request of the token received by the worker.
+        :return: None.
+        """
+        with self._lock:
+            if process.last_requests.get(token) != last_request:
+                return
+            if self._tokens.get(token) is process:
+                self._tokens.pop(token)
+            process.tokens.discard(token)
+            process.last_requests.pop(token, None)
+
+    def _process_exited(self, process):
+        """
+        Drop the sessions of a dead process and start a replacement.
+        :param process: SessionProcess.
+        :return: None.
+        """
+        with self._lock:
+            for token in process.tokens:
+                self._tokens.pop(token, None)
+            process.tokens.clear()
+            process.last_requests.clear()
+            if self._running and self._processes[process.index] is process:
+                logger.warning(f'Session process {process.index} ended, starting a new one.')
+                self._processes[process.index] = self._new_process(process.index)
+
+    def submit(self, token, command, command_data, on_item=None):
+        """
+        Send the command to the process that owns the token.
+        :param token: Token string.
+        :param command: Command name.
+        :param command_data: Command Data.
+        :param on_item: Callable receiving (index, result) as each sub-command of a batch finishes (optional).
+        :return: Future with the command result.
+        """
+        process = self._assign(token)
+        future = process.submit(command_data, token, on_item)
+        if command == 'Quit':
+            future.add_done_callback(lambda _: self._release(token, process))
+        return future
+
+    def stopping(self):
+        """
+        Do not replace the processes that end from now on: the server is stopping.
+        :return: Self.
+        """
+        with self._lock:
+            self._running = False
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop every worker process.
+        :param timeout: Seconds to wait for each process.
+        :return: Self.
+        """
+        with self._lock:
+            self._running = False
+            processes = list(self._processes)
+        for process in processes:
+            process.stop(timeout=timeout)
+        return self
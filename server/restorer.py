@@ -0,0 +1,176 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Session Restorer Module
+"""
+import glob
+import os
+from threading import BoundedSemaphore, Event, Lock, Thread
+from time import monotonic, time
+
+from core import settings
+from core.logs import logging
+from core.utils.browsers.sessions import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRestorer:
+    """
+    Open the sessions of the tokens active in the last hours when the server starts, most recent first, so their first
+    command finds the browser ready. Only a few browsers are launched at once; every session is opened by the
+    "Restore" command, which answers like "CheckPoint".
+    """
+
+    def __init__(self, manager, concurrency=settings.SESSION_RESTORE_CONCURRENCY, hours=settings.SESSION_RESTORE_HOURS,
+                 max_sessions=settings.SESSION_RESTORE_MAX, folder=None):
+        """
+        :param manager: ManagerSingleton (anything with "submit_command").
+        :param concurrency: Sessions opened at once.
+        :param hours: Restore the tokens active in the last hours.
+        :param max_sessions: Sessions restored (0 is unlimited).
+        :param folder: Folder of the saved sessions (default: server/.temp).
+        """
+        self._manager = manager
+        self._concurrency = max(1, concurrency)
+        self._hours = hours
+        self._max_sessions = max_sessions
+        self._folder = folder or os.path.join(settings.BASE_DIR, 'server', '.temp')
+        self._stop = Event()
+        self._lock = Lock()
+        self._results = {}
+        self._thread = None
+
+    @property
+    def results(self):
+        """
+        Answer of every restored session.
+        :return: Dict {token: 'true' or 'false'}.
+        """
+        with self._lock:
+            return dict(self._results)
+
+    @property
+    def ready(self):
+        """
+        Tokens whose main screen is available.
+        :return: List of tokens.
+        """
+        return [token for token, result in self.results.items() if result == 'true']
+
+    def _saved_tokens(self, limit):
+        """
+        Tokens saved in the folder (Local Storage snapshots and cookies) and in the persistent profiles.
+        :param limit: Oldest modification time accepted.
+        :return: List of tokens, most recent first.
+        """
+        files = [(name, os.path.basename(name)[:-len('.profile')])
+                 for name in glob.glob(os.path.join(self._folder, '*.profile'))]
+        files += [(name, os.path.basename(name)[len('cookies_'):-len('.pkl')])
+                  for name in glob.glob(os.path.join(self._folder, 'cookies_*.pkl'))]
+        if settings.BROWSER_PROFILES:
+            files += [(name, os.path.basename(name)[len('profile_'):])
+                      for name in glob.glob(os.path.join(settings.BROWSER_PROFILES_DIR, 'profile_*'))]
+        activity = {}
+        for name, token in files:
+            try:
+                mtime = os.path.getmtime(name)
+            except OSError:
+                continue
+            if mtime >= limit and token:
+                activity[token] = max(activity.get(token, 0.0), mtime)
+        return sorted(activity, key=activity.get, reverse=True)
+
+    def tokens(self):
+        """
+        Tokens to restore, most recent activity first. The token of the router health check is not a session.
+        :return: List of tokens.
+        """
+        if settings.SESSION_STORE:
+            tokens = SessionStore().active(hours=self._hours)
+        else:
+            tokens = self._saved_tokens(time() - self._hours * 3600)
+        tokens = [token for token in tokens if token != settings.ROUTER_HEALTH_TOKEN]
+        return tokens[:self._max_sessions] if self._max_sessions else tokens
+
+    def _done(self, slots, token, future):
+        """
+        Record the answer of a session and release its slot.
+        :param slots: BoundedSemaphore.
+        :param token: Token.
+        :param future: Future of the "Restore" command, or None when it could not be submitted.
+        :return: None.
+        """
+        try:
+            result = future.result() if future else 'false'
+        except Exception as e:
+            logger.warning(f'Session {token} could not be restored: {e}')
+            result = 'false'
+        with self._lock:
+            self._results[token] = result
+        slots.release()
+
+    def restore(self):
+        """
+        Open the sessions, at most "concurrency" at a time, and wait for them.
+        :return: Dict {token: 'true' or 'false'}.
+        """
+        tokens = self.tokens()
+        logger.info(f'Restoring {len(tokens)} sessions, {self._concurrency} at a time...')
+        started = monotonic()
+        slots = BoundedSemaphore(self._concurrency)
+        for token in tokens:
+            while not slots.acquire(timeout=0.5):
+                if self._stop.is_set():
+                    break
+            if self._stop.is_set():
+                break
+            try:
+                future = self._manager.submit_command(f'{token}||Restore')
+            except Exception as e:
+                logger.warning(f'Session {token} could not be submitted for restore: {e}')
+                self._done(slots, token, None)
+                continue
+            future.add_done_callback(lambda done, token=token: self._done(slots, token, done))
+        for _ in range(self._concurrency):
+            while not slots.acquire(timeout=0.5) and not self._stop.is_set():
+                pass
+        logger.info(f'{len(self.ready)} of {len(tokens)} sessions ready in {monotonic() - started:.1f}s.')
+        return self.results
+
+    def _run(self):
+        """
+        Restorer thread.
+        :return: None.
+        """
+        try:
+            self.restore()
+        except Exception as e:
+            logger.exception(e)
+
+    def start(self):
+        """
+        Restore the sessions in background, while the server accepts commands.
+        :return: Self.
+        """
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name='zap-session-restorer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop opening sessions. The sessions being opened are finished by their actors.
+        :param timeout: Seconds to wait for the restorer.
+        :return: Self.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        return self
@@ -0,0 +1,115 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Token Actors Module
+"""
+from threading import Lock
+from time import monotonic, sleep
+
+from server.actors import TokenActor
+
+
+class SlowCommand:
+    """
+    Command that records how many commands of the same manager run at the same time.
+    """
+
+    def __init__(self, manager, name):
+        self._manager = manager
+        self.name = name
+        self.result = None
+
+    def invoke(self):
+        """
+        Run Command.
+        :return: Self.
+        """
+        with self._manager.lock:
+            self._manager.running += 1
+            self._manager.max_running = max(self._manager.max_running, self._manager.running)
+        sleep(0.05)
+        with self._manager.lock:
+            self._manager.running -= 1
+        self._manager.executed.append(self.name)
+        self.result = self.name
+        return self
+
+
+class RecorderManager:
+    """
+    Fake CommandManager.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.running = 0
+        self.max_running = 0
+        self.executed = []
+
+    def parse_command(self, name, args):
+        """
+        Create the command.
+        :param name: Command name.
+        :param args: Ignored.
+        :return: SlowCommand.
+        """
+        _ = args
+        return SlowCommand(self, name)
+
+
+def test_commands_are_serialized_in_order():
+    """
+    Commands of the same token run one at a time, in FIFO order.
+    :return: None.
+    """
+    manager = RecorderManager()
+    stopped = []
+    actor = TokenActor('token', lambda: manager, lambda a, pending: stopped.append(pending))
+    futures = [actor.submit(f'Command{i}', None) for i in range(5)]
+    results = [future.result(timeout=5) for future in futures]
+    assert results == [f'Command{i}' for i in range(5)]
+    assert manager.executed == results
+    assert manager.max_running == 1
+    actor.submit('Quit', None).result(timeout=5)
+    actor.join(timeout=5)
+    assert actor.closed and stopped == [[]]
+    assert actor.submit('Command', None) is None
+
+
+def test_evict_only_idle_actors():
+    """
+    Eviction is refused while a command is queued or running, and quits the session when the actor is idle.
+    :return: None.
+    """
+    manager = RecorderManager()
+    stopped = []
+    actor = TokenActor('token', lambda: manager, lambda a, pending: stopped.append(pending))
+    future = actor.submit('Command', None)
+    assert actor.evict() is None
+    future.result(timeout=5)
+    assert actor.evict().result(timeout=5) == 'Quit'
+    actor.join(timeout=5)
+    assert actor.closed and actor.evicting and stopped == [[]]
+
+
+def test_idle_actor_takes_storage_snapshots():
+    """
+    Snapshots are taken while the actor waits for commands once the interval elapsed; they are not a result of any
+    command.
+    :return: None.
+    """
+    manager = RecorderManager()
+    actor = TokenActor('token', lambda: manager, lambda a, pending: None, snapshot_interval=0.01)
+    assert actor.submit('Command', None).result(timeout=5) == 'Command'
+    limit = monotonic() + 5
+    while manager.executed.count('SaveStorage') < 3 and monotonic() < limit:
+        sleep(0.01)
+    assert actor.submit('Quit', None).result(timeout=5) == 'Quit'
+    actor.join(timeout=5)
+    assert manager.executed[0] == 'Command' and manager.executed[-1] == 'Quit'
+    assert set(manager.executed[1:-1]) == {'SaveStorage'} and len(manager.executed) >= 5
@@ -0,0 +1,53 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Command Manager Module
+"""
+import pytest
+
+from server.commands.classes import NoCommand
+from server.commands.managers import COMMAND_REGISTRY, AvailableCommands, CommandManager
+from server.commands.splitters import BatchSplitterCommand
+
+
+def test_registry_has_every_register_command():
+    """
+    The registry maps the name of each registered command to its class and cannot be changed.
+    :return: None.
+    """
+    for register in COMMAND_REGISTRY.registers:
+        for cmd in register.available_classes:
+            assert COMMAND_REGISTRY.get(cmd.name) is cmd
+    assert [item['class'] for item in AvailableCommands.get()] == list(COMMAND_REGISTRY.commands.values())
+    with pytest.raises(TypeError):
+        COMMAND_REGISTRY.commands['Quit'] = NoCommand
+
+
+def test_command_manager_dispatch():
+    """
+    Known names create their command, unknown names create NoCommand.
+    :return: None.
+    """
+    manager = CommandManager(adaptee=None)
+    assert manager.parse_command('Quit', None).name == 'Quit'
+    assert isinstance(manager.parse_command('Unknown', None), NoCommand)
+    assert manager.check('Participant') and manager.check('Quit')
+    assert not manager.check('Unknown')
+
+
+def test_batch_splitter():
+    """
+    A batch is split in the token and the list of sub-commands with their args.
+    :return: None.
+    """
+    data = BatchSplitterCommand.join('token', ['SendMessage||Group||Hello', 'GroupParticipants||Group'])
+    assert BatchSplitterCommand.is_batch(data)
+    assert not BatchSplitterCommand.is_batch('token||SendMessage||Group||Hello')
+    token, command, items = BatchSplitterCommand(data).process().result()
+    assert (token, command) == ('token', 'Batch')
+    assert items == [('SendMessage', ['Group', 'Hello']), ('GroupParticipants', ['Group'])]
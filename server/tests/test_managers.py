@@ -0,0 +1,45 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Manager Module
+"""
+from time import monotonic, sleep
+
+import pytest
+
+from server.factories.whatsapp import FactoryWhatsappAdapter
+from server.managers import ManagerSingleton
+
+
+@pytest.fixture
+def mock_manager():
+    """
+    Manager with mock sessions limited to two live sessions.
+    :return: ManagerSingleton.
+    """
+    manager = ManagerSingleton().set_adapter(FactoryWhatsappAdapter.MOCK).set_no_headless(False)
+    yield manager.set_eviction(max_sessions=2, idle_timeout=0, memory_budget_mb=0)
+    manager.set_eviction(max_sessions=0, idle_timeout=0, memory_budget_mb=0).shutdown(timeout=5)
+
+
+def test_least_recently_used_session_is_evicted(mock_manager):
+    """
+    A new session above the limit quits the least recently used one, which is revived by its next command.
+    :param mock_manager: Manager fixture.
+    :return: None.
+    """
+    tokens = [f'test_eviction_{index}' for index in range(3)]
+    for token in tokens:
+        assert isinstance(mock_manager.run_command(f'{token}||GroupParticipants||Group'), list)
+    limit = monotonic() + 5
+    while tokens[0] in mock_manager._actors and monotonic() < limit:
+        sleep(0.01)
+    assert tokens[0] not in mock_manager._actors
+    assert set(tokens[1:]) <= set(mock_manager._actors)
+    assert isinstance(mock_manager.run_command(f'{tokens[0]}||GroupParticipants||Group'), list)
+    assert tokens[0] in mock_manager._actors
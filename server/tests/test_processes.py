@@ -0,0 +1,101 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Session Processes Module
+"""
+import os
+import signal
+from time import monotonic, sleep
+
+import pytest
+
+from server.commands.splitters import BatchSplitterCommand
+from server.factories.whatsapp import FactoryWhatsappAdapter
+from server.processes import SessionProcessPool
+
+
+@pytest.fixture
+def mock_pool():
+    """
+    Start a pool of two worker processes with mock sessions.
+    :return: SessionProcessPool.
+    """
+    pool = SessionProcessPool(
+        processes=2, sessions_per_process=1, adapter=FactoryWhatsappAdapter.MOCK, no_headless=False)
+    yield pool
+    pool.stop(timeout=10)
+
+
+def test_tokens_are_spread_across_processes(mock_pool):
+    """
+    Each token is owned by one process and new tokens go to the least loaded one.
+    :param mock_pool: Pool fixture.
+    :return: None.
+    """
+    first = mock_pool.submit('token_1', 'GroupParticipants', 'token_1||GroupParticipants||Group')
+    second = mock_pool.submit('token_2', 'GroupParticipants', 'token_2||GroupParticipants||Group')
+    assert isinstance(first.result(timeout=30), list)
+    assert isinstance(second.result(timeout=30), list)
+    assert mock_pool.process_of('token_1').pid != mock_pool.process_of('token_2').pid
+
+    mock_pool.submit('token_1', 'Quit', 'token_1||Quit').result(timeout=30)
+    assert mock_pool.process_of('token_1') is None
+
+
+def test_sessions_evicted_in_a_worker_free_their_slot(monkeypatch):
+    """
+    A worker that evicts a session tells the pool, which stops counting the token.
+    :param monkeypatch: Pytest fixture.
+    :return: None.
+    """
+    monkeypatch.setenv('SESSION_MAX', '2')
+    pool = SessionProcessPool(
+        processes=2, sessions_per_process=1, adapter=FactoryWhatsappAdapter.MOCK, no_headless=False)
+    try:
+        for token in ['token_1', 'token_2', 'token_3']:
+            assert isinstance(pool.submit(token, 'GroupParticipants', f'{token}||GroupParticipants||Group').result(
+                timeout=30), list)
+        owner = pool.process_of('token_3')
+        limit = monotonic() + 10
+        while len(owner.tokens) > 1 and monotonic() < limit:
+            sleep(0.05)
+        assert len(owner.tokens) == 1
+        assert sum(len(process.tokens) for process in pool.processes) == 2
+    finally:
+        pool.stop(timeout=10)
+
+
+def test_ctrl_c_does_not_kill_the_workers(mock_pool):
+    """
+    SIGINT is left to the main process: the workers only stop when the pool asks.
+    :param mock_pool: Pool fixture.
+    :return: None.
+    """
+    pids = [process.pid for process in mock_pool.processes]
+    assert isinstance(mock_pool.submit('token_1', 'GroupParticipants', 'token_1||GroupParticipants||Group').result(
+        timeout=30), list)
+    for pid in pids:
+        os.kill(pid, signal.SIGINT)
+    sleep(0.5)
+    assert [process.pid for process in mock_pool.processes] == pids
+    assert isinstance(mock_pool.submit('token_1', 'GroupParticipants', 'token_1||GroupParticipants||Group').result(
+        timeout=30), list)
+
+
+def test_batch_streams_through_the_worker(mock_pool):
+    """
+    The partial results of a batch run by a worker process reach the caller before the list of results.
+    :param mock_pool: Pool fixture.
+    :return: None.
+    """
+    partials = []
+    command_data = BatchSplitterCommand.join('token_1', ['CheckPoint', 'GroupParticipants||Group'])
+    results = mock_pool.submit('token_1', 'Batch', command_data, on_item=lambda *item: partials.append(item)).result(
+        timeout=30)
+    assert results[0] == 'true' and isinstance(results[1], list)
+    assert partials == list(enumerate(results))
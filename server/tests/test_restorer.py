@@ -0,0 +1,72 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Session Restorer Module
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import sleep, time
+
+from core import settings
+from server.restorer import SessionRestorer
+
+
+class FakeManager:
+    """
+    Manager stand-in answering "Restore" after a pause and recording the sessions opened at once.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=8)
+        self._lock = Lock()
+        self.running = 0
+        self.peak = 0
+        self.commands = []
+
+    def _restore(self, token):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        sleep(0.05)
+        with self._lock:
+            self.running -= 1
+        return 'false' if token == 'new' else 'true'
+
+    def submit_command(self, command_data):
+        self.commands.append(command_data)
+        token, _ = command_data.split('||')
+        if token == 'broken':
+            raise RuntimeError('Manager is shut down.')
+        return self._executor.submit(self._restore, token)
+
+
+def test_recent_sessions_are_restored_first_with_bounded_concurrency(tmp_path):
+    """
+    Tokens are restored from the most recent activity, old ones are skipped and only two sessions open at once.
+    :param tmp_path: Pytest fixture.
+    :return: None.
+    """
+    now = time()
+    names = ['a.profile', 'cookies_b.pkl', 'c.profile', 'new.profile', 'cookies_a.pkl', 'broken.profile',
+             f'{settings.ROUTER_HEALTH_TOKEN}.profile']
+    for age, name in enumerate(names):
+        (tmp_path / name).write_bytes(b'')
+        os.utime(tmp_path / name, (now - age * 60, now - age * 60))
+    (tmp_path / 'old.profile').write_bytes(b'')
+    os.utime(tmp_path / 'old.profile', (now - 7200, now - 7200))
+
+    manager = FakeManager()
+    restorer = SessionRestorer(manager, concurrency=2, hours=1, folder=str(tmp_path))
+    assert restorer.tokens() == ['a', 'b', 'c', 'new', 'broken']
+    results = restorer.restore()
+    assert manager.commands == ['a||Restore', 'b||Restore', 'c||Restore', 'new||Restore', 'broken||Restore']
+    assert manager.peak == 2
+    assert results == {'a': 'true', 'b': 'true', 'c': 'true', 'new': 'false', 'broken': 'false'}
+    assert sorted(restorer.ready) == ['a', 'b', 'c']
+    assert SessionRestorer(manager, hours=1, max_sessions=2, folder=str(tmp_path)).tokens() == ['a', 'b']
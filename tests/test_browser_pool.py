@@ -0,0 +1,107 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Browser Pool Module
+"""
+from time import monotonic, sleep
+
+import pytest
+
+from core.utils.browsers.classes import BaseBrowser, BrowserPool
+
+
+class FakeSelenium:
+    """
+    Selenium driver stand-in that records the calls of the pool.
+    """
+
+    def __init__(self):
+        self.urls = []
+        self.closed = False
+
+    def set_script_timeout(self, value):
+        pass
+
+    def execute_async_script(self, script):
+        return True
+
+    def delete_all_cookies(self):
+        pass
+
+    def get(self, url):
+        self.urls.append(url)
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeBrowser(BaseBrowser):
+    """
+    Browser launched without a real driver.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._browser = FakeSelenium()
+
+
+@pytest.fixture
+def browser_pool():
+    """
+    Start a pool of two fake browsers.
+    :return: BrowserPool.
+    """
+    pool = BrowserPool().start(size=2, refill_interval=0.5, max_uses=2, launcher=FakeBrowser)
+    yield pool
+    pool.stop()
+
+
+def wait_idle(pool, count, timeout=5.0):
+    """
+    Wait until the pool has the number of idle browsers.
+    :param pool: BrowserPool.
+    :param count: Expected idle browsers.
+    :param timeout: Seconds.
+    :return: Bool.
+    """
+    limit = monotonic() + timeout
+    while pool.idle != count and monotonic() < limit:
+        sleep(0.01)
+    return pool.idle == count
+
+
+def test_pool_hands_out_and_refills(browser_pool):
+    """
+    Acquired browsers are bound to the token and the pool launches replacements.
+    :param browser_pool: Pool fixture.
+    :return: None.
+    """
+    assert wait_idle(browser_pool, 2)
+    driver = browser_pool.acquire(token='test_pool')
+    assert driver.cookies_file.endswith('cookies_test_pool.pkl')
+    assert browser_pool.acquire(token='test_pool', no_headless=True) is None
+    assert wait_idle(browser_pool, 2)
+
+
+def test_pool_recycles_until_max_uses(browser_pool):
+    """
+    A released browser goes back to the pool until it served "max_uses" sessions.
+    :param browser_pool: Pool fixture.
+    :return: None.
+    """
+    assert wait_idle(browser_pool, 2)
+    first, second = browser_pool.acquire(token='a'), browser_pool.acquire(token='b')
+    browser_pool.release(first)
+    assert not first.browser.closed and first.browser.urls[-1] == BrowserPool.WARM_URL
+
+    drivers = [browser_pool.acquire(token='c') for _ in range(2)]
+    again = next(driver for driver in drivers if driver is first)
+    selenium = again.browser
+    browser_pool.release(again)
+    assert selenium.closed and again.browser is None
+    browser_pool.release(second)
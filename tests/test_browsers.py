@@ -0,0 +1,109 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Browsers Module
+"""
+import subprocess
+import sys
+
+import pytest
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+
+from core import settings
+from core.utils.browsers import classes
+from core.utils.browsers.classes import BaseBrowser, DenseFirefoxProfile
+from core.utils.processes import ProcessTree
+from server.adapters.the_first.classes import WhatsApp
+
+
+class FakeService:
+    """
+    Driver service stand-in running a child process.
+    """
+
+    def __init__(self, process):
+        self.process = process
+
+
+class FakeSelenium:
+    """
+    Selenium driver stand-in with a service.
+    """
+
+    def __init__(self, process=None, options=None):
+        self.service = FakeService(process)
+        self.options = options
+        self.scripts = []
+
+    def set_window_size(self, width, height):
+        pass
+
+    def get(self, url):
+        pass
+
+    def execute_script(self, script, *args):
+        self.scripts.append(script)
+        return {}
+
+    def quit(self):
+        pass
+
+
+def test_dense_profile_sets_the_preferences():
+    """
+    The dense profile limits the content processes and blocks images.
+    :return: None.
+    """
+    preferences = DenseFirefoxProfile.apply(FirefoxOptions()).preferences
+    assert preferences['dom.ipc.processCount'] == 1
+    assert preferences['permissions.default.image'] == 2
+    assert preferences['toolkit.telemetry.enabled'] is False
+
+
+@pytest.mark.skipif(not ProcessTree.available(), reason='Memory is read from /proc.')
+def test_memory_usage_sums_the_process_tree():
+    """
+    The report covers the driver and the processes it started.
+    :return: None.
+    """
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(10)'])
+    try:
+        browser = BaseBrowser()
+        browser._browser = FakeSelenium(process)
+        usage = browser.memory_usage()
+        assert usage['processes'] == 1 and usage['rss_mb'] > 0 and usage['dense'] is False
+        browser._browser = FakeSelenium(None)
+        assert browser.memory_usage() is None
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_persistent_profile_skips_the_storage_replay(tmp_path, monkeypatch):
+    """
+    A token gets its own profile directory; the Local Storage is only replayed when the profile is new.
+    :param tmp_path: Pytest fixture.
+    :param monkeypatch: Pytest fixture.
+    :return: None.
+    """
+    launched = []
+
+    def firefox(options):
+        launched.append(FakeSelenium(options=options))
+        return launched[-1]
+
+    monkeypatch.setattr(classes.webdriver, 'Firefox', firefox)
+    monkeypatch.setattr(classes, 'BROWSER_PROFILES_DIR', str(tmp_path))
+    monkeypatch.setattr(settings, 'BROWSER_PROFILES', True)
+
+    for _ in range(2):
+        whatsapp = WhatsApp(wait=10, token='abc')
+        assert whatsapp.connect() and whatsapp.quit()
+    profile = str(tmp_path / 'profile_abc')
+    assert launched[0].options.arguments[-2:] == ['-profile', profile]
+    assert launched[0].scripts and not launched[1].scripts
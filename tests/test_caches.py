@@ -0,0 +1,32 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Caches Module
+"""
+from core.utils.caches import TtlCache
+
+
+def test_values_expire_after_the_ttl():
+    """
+    Values are read until their TTL is over; a zero TTL keeps nothing.
+    :return: None.
+    """
+    now = [100.0]
+    cache = TtlCache(ttl=10, clock=lambda: now[0])
+    cache.set('group', ('Ana', 'Bia'))
+    now[0] += 9
+    assert cache.get('group') == ('Ana', 'Bia') and 'group' in cache and len(cache) == 1
+    now[0] += 1
+    assert cache.get('group') is None and len(cache) == 0
+    cache.set('group', ('Ana',))
+    cache.pop('group')
+    assert cache.get('group', ()) == ()
+
+    disabled = TtlCache(ttl=0)
+    disabled.set('group', ('Ana',))
+    assert 'group' not in disabled
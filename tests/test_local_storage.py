@@ -0,0 +1,102 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Local Storage Module
+"""
+import pickle
+from threading import Event
+from time import sleep
+
+from core.utils.browsers.local_storage import LocalStorage, StorageWriter
+
+
+class FakeSelenium:
+    """
+    Selenium driver stand-in keeping a Local Storage.
+    """
+
+    def __init__(self, items=None):
+        self.items = dict(items or {})
+        self.calls = 0
+
+    def execute_script(self, script, *args):
+        self.calls += 1
+        if 'setItem' in script:
+            self.items.update(args[0])
+        elif 'forEach' in script:
+            return {key: self.items[key] for key in args[0] if key in self.items}
+        return dict(self.items)
+
+
+def new_writer():
+    """
+    Writer outside of the process singleton.
+    :return: StorageWriter.
+    """
+    writer = StorageWriter.__new__(StorageWriter)
+    writer.__init__()
+    return writer
+
+
+def test_many_items_in_one_call():
+    """
+    Bulk reads and writes use one script call each.
+    :return: None.
+    """
+    driver = FakeSelenium({'a': '1'})
+    storage = LocalStorage(driver=driver, token='abc')
+    storage.set_many({'b': '2', 'c': '3'})
+    assert storage.get_many(['a', 'c', 'missing']) == {'a': '1', 'c': '3'}
+    assert driver.calls == 2
+
+
+def test_writer_skips_unchanged_snapshots(tmp_path):
+    """
+    Snapshots are compressed, equal snapshots are not written again and legacy pickles are still read.
+    :param tmp_path: Pytest fixture.
+    :return: None.
+    """
+    file_name = str(tmp_path / 'abc.profile')
+    with open(file_name, 'wb') as file:
+        pickle.dump({'a': '1'}, file)
+    writer = new_writer()
+    assert not writer.write(file_name, {'a': '1'})
+    assert writer.write(file_name, {'a': '2'})
+    assert StorageWriter.read(file_name) == {'a': '2'}
+    with open(file_name, 'rb') as file:
+        assert file.read(2) == b'\x1f\x8b'
+
+    for value in range(20):
+        writer.submit(file_name, {'a': str(value)})
+    assert writer.flush(timeout=5)
+    assert StorageWriter.read(file_name) == {'a': '19'} and writer.writes <= 21
+
+
+def test_load_sees_the_snapshots_waiting_for_the_writer(tmp_path, monkeypatch):
+    """
+    A session revived before its snapshot was written loads the queued snapshot, not the old file.
+    :param tmp_path: Pytest fixture.
+    :param monkeypatch: Pytest fixture.
+    :return: None.
+    """
+    storage = LocalStorage(driver=FakeSelenium({'a': 'new'}), token='abc')
+    monkeypatch.setattr(storage, '_file_name', str(tmp_path / 'abc.profile'))
+    writer = new_writer()
+    monkeypatch.setitem(StorageWriter._instances, StorageWriter, writer)
+    writer.write(storage._file_name, {'a': 'old'})
+    busy = Event()
+    write = writer.write
+    monkeypatch.setattr(writer, 'write', lambda name, data, store=None: busy.wait(5) and write(name, data, store))
+    writer.submit(str(tmp_path / 'other.profile'), {'b': '1'})
+    while writer._writing is None:
+        sleep(0.01)
+    storage.save()
+    assert storage.load() == ({'a': 'new'}, True)
+    busy.set()
+    assert writer.flush(timeout=5)
+    assert storage.load() == ({'a': 'new'}, True)
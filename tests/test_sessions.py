@@ -0,0 +1,77 @@
+# coding=utf-8
+"""
+GNU AFFERO GENERAL PUBLIC LICENSE
+Version 3, 19 November 2007
+https://github.com/marvinbraga/zap_server
+Marcus Vinicius Braga, marcus@marvinbraga.com.br
+Aug 2021
+
+Test Session Store Module
+"""
+import os
+import pickle
+
+import pytest
+
+from core.utils.browsers.local_storage import StorageWriter
+from core.utils.browsers.sessions import SessionStore, SessionStoreMigrator
+
+
+@pytest.fixture
+def store(tmp_path):
+    """
+    Store outside of the process singleton.
+    :param tmp_path: Pytest fixture.
+    :return: SessionStore.
+    """
+    store = SessionStore.__new__(SessionStore)
+    store.__init__(str(tmp_path / 'sessions.db'))
+    yield store
+    store.close()
+
+
+def test_store_reads_and_writes_in_batches(store):
+    """
+    Fields not informed are kept, the metadata is merged and recent sessions are listed first.
+    :param store: Fixture.
+    :return: None.
+    """
+    assert store.put_many([
+        {'token': 'a', 'storage': {'k': 'v'}, 'last_activity': 1000.0, 'metadata': {'dense': True}},
+        {'token': 'b', 'cookies': [{'name': 'c'}], 'last_activity': 5000.0},
+        {'token': 'c', 'last_activity': 100.0},
+    ]) == 3
+    store.touch('a', {'persistent': False}, when=6000.0)
+    sessions = store.get_many(['a', 'b', 'unknown'])
+    assert set(sessions) == {'a', 'b'}
+    assert sessions['a']['storage'] == {'k': 'v'}
+    assert sessions['a']['metadata'] == {'dense': True, 'persistent': False}
+    assert store.get_cookies('b') == [{'name': 'c'}] and store.get_storage('b') is None
+    assert store.active(hours=1, now=6000.0) == ['a', 'b']
+    assert len(store.delete('c')) == 2
+
+
+def test_migrator_and_writer_use_the_store(store, tmp_path):
+    """
+    The pickles are copied with their modification time; unchanged snapshots are not written again.
+    :param store: Fixture.
+    :param tmp_path: Pytest fixture.
+    :return: None.
+    """
+    folder = tmp_path / 'temp'
+    folder.mkdir()
+    with open(folder / 'abc.profile', 'wb') as file:
+        pickle.dump({'k': 'v'}, file)
+    with open(folder / 'cookies_abc.pkl', 'wb') as file:
+        pickle.dump([{'name': 'c'}], file)
+    os.utime(folder / 'abc.profile', (7200.0, 7200.0))
+    assert SessionStoreMigrator(store, str(folder)).migrate() == 1
+    session = store.get('abc')
+    assert session['storage'] == {'k': 'v'} and session['cookies'] == [{'name': 'c'}]
+    assert session['last_activity'] >= 7200.0
+
+    writer = StorageWriter.__new__(StorageWriter)
+    writer.__init__()
+    assert writer.write('abc', {'k': 'w'}, store)
+    assert not writer.write('abc', {'k': 'w'}, store)
+    assert store.get_storage('abc') == {'k': 'w'} and store.storage_digest('abc') == StorageWriter.digest({'k': 'w'})